@@ -25,6 +25,8 @@ DEBUG = env('DEBUG')
 # ==================== CONFIGURACIÓN DE EMAIL ====================
 EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='no-reply@graficagyg.com')
+# Destinatario de los mensajes del formulario de contacto
+CONTACT_EMAIL = env('CONTACT_EMAIL', default=DEFAULT_FROM_EMAIL)
 
 # Configuración adicional para SMTP (si se usa)
 EMAIL_HOST = env('EMAIL_HOST', default='')
@@ -68,6 +70,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.core.middleware.RegistroVisitasMiddleware',
 ]
 
 ROOT_URLCONF = 'GraficaGyG_backend.urls'
@@ -93,6 +96,9 @@ WSGI_APPLICATION = 'GraficaGyG_backend.wsgi.application'
 DATABASES = {
     'default': env.db( ),
 }
+# Lookups de búsqueda (trigram_similar) para apps/core/busqueda.py
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    INSTALLED_APPS.append('django.contrib.postgres')
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.postgresql_psycopg2',
@@ -104,6 +110,13 @@ DATABASES = {
 #     }
 # }
 
+# Caché (locmem por defecto; en producción usar un backend compartido, ej. CACHE_URL=redis://...)
+# El catálogo y otras cachés se invalidan por versión, por lo que todos los workers
+# deben compartir el mismo backend para ver las invalidaciones.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -151,6 +164,21 @@ else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'mediafiles')
 
+# Tamaño máximo de los archivos de diseño de pedidos (subida en bloques)
+ARCHIVO_PEDIDO_MAX_MB = env.int('ARCHIVO_PEDIDO_MAX_MB', default=200)
+
+# Pagina con cursor aunque la petición no traiga ?cursor= ni ?page_size=
+PAGINACION_CURSOR_OBLIGATORIA = env.bool('PAGINACION_CURSOR_OBLIGATORIA', default=False)
+
+TESTING = sys.argv[1:2] == ['test']
+
+# Registro de visitas (apps/core/visitas.py). Desactivado al correr los tests:
+# el hilo de vaciado escribiría con su propia conexión fuera de la transacción del test
+REGISTRO_VISITAS = env.bool('REGISTRO_VISITAS', default=not TESTING)
+
+# Días que se conservan las visitas crudas (python manage.py compactar_visitas)
+VISITAS_RETENCION_DIAS = env.int('VISITAS_RETENCION_DIAS', default=90)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -211,6 +239,8 @@ SIMPLE_JWT = {
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # Agrega los claims de usuario (perfil, roles) al access token renovado
+    'TOKEN_REFRESH_SERIALIZER': 'apps.authentication.serializers.RefrescarTokenSerializer',
 }
 
 # ==================== CONFIGURACIÓN DE EMAIL ====================
@@ -2,6 +2,9 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from apps.core.models import UserProfile, Persona, UserRol, Rol
 from apps.core.models import Cliente
+from apps.core.roles import CODIGOS_ADMIN, roles_de_usuario, tiene_rol
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from .tokens import TokenRefrescoConClaims
 from django.db import transaction
 import secrets
 
@@ -111,12 +114,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
                   'mail_verified', 'roles', 'es_admin']
     
     def get_roles(self, obj):
-        return list(obj.roles.values_list('rol__nombre_rol', flat=True))
+        return [nombre for _, nombre in roles_de_usuario(obj.user)]
     
     def get_es_admin(self, obj):
-        return obj.roles.filter(
-            rol__codigo_rol__in=['ADMIN', 'SUPERADMIN']
-        ).exists()
+        return tiene_rol(obj.user, CODIGOS_ADMIN)
+
+class RefrescarTokenSerializer(TokenRefreshSerializer):
+    """token/refresh/ con los claims de usuario actualizados en el nuevo access token"""
+    token_class = TokenRefrescoConClaims
 
 class LoginResponseSerializer(serializers.Serializer):
     access = serializers.CharField()
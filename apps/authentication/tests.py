@@ -1,3 +1,79 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.core.models import Persona, Rol, UserProfile, UserRol
+from .tokens import TokenRefrescoConClaims, UsuarioToken
 
-# Create your tests here.
+
+class RolesEnTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='clave-segura')
+        self.perfil = UserProfile.objects.create(user=self.usuario)
+        UserRol.objects.create(
+            user_profile=self.perfil, rol=Rol.objects.create(nombre_rol='Administrador', codigo_rol='ADMIN')
+        )
+
+    def test_login_y_refresh_llevan_los_roles_vigentes(self):
+        respuesta = self.client.post(reverse('login'), {'username': 'ana', 'password': 'clave-segura'})
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(AccessToken(datos['access'])['roles'], ['ADMIN'])
+        self.assertEqual(datos['user']['roles'], ['Administrador'])
+        self.assertTrue(datos['user']['es_admin'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserRol.objects.create(
+                user_profile=self.perfil,
+                rol=Rol.objects.create(nombre_rol='Super Administrador', codigo_rol='SUPERADMIN')
+            )
+        refrescado = self.client.post(reverse('token_refresh'), {'refresh': datos['refresh']}).json()
+        self.assertEqual(AccessToken(refrescado['access'])['roles'], ['ADMIN', 'SUPERADMIN'])
+
+    def test_verificar_admin(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        self.assertEqual(cliente.get(reverse('verificar_admin')).json(), {'es_admin': True, 'roles': ['ADMIN']})
+
+        cliente.force_authenticate(User.objects.create_user('sin-perfil'))
+        self.assertEqual(cliente.get(reverse('verificar_admin')).status_code, 404)
+
+
+class AutenticacionSinConsultaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', email='ana@example.com')
+        self.perfil = UserProfile.objects.create(
+            user=self.usuario,
+            persona=Persona.objects.create(primer_nombre='Ana', apellido_paterno='Rojas', mail='ana@example.com'),
+        )
+
+    def cliente_con_token(self, acceso):
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {acceso}')
+        return cliente
+
+    def test_perfil_actual_con_una_sola_consulta(self):
+        acceso = TokenRefrescoConClaims.for_user(self.usuario).access_token
+        self.assertEqual(acceso['user_profile_id'], self.perfil.pk)
+        self.assertEqual(acceso['persona_id'], self.perfil.persona_id)
+        cliente = self.cliente_con_token(acceso)
+
+        with self.assertNumQueries(1):
+            datos = cliente.get(reverse('perfil_actual')).json()
+        self.assertEqual((datos['username'], datos['email']), ('ana', 'ana@example.com'))
+        self.assertEqual(datos['user_profile_id'], self.perfil.pk)
+
+    def test_token_sin_claims_de_perfil_y_atributos_del_modelo(self):
+        # Token emitido antes de agregar los claims: el perfil se busca por usuario
+        cliente = self.cliente_con_token(AccessToken.for_user(self.usuario))
+        self.assertEqual(cliente.get(reverse('perfil_actual')).json()['user_profile_id'], self.perfil.pk)
+
+        usuario = UsuarioToken(AccessToken.for_user(self.usuario))
+        with self.assertNumQueries(0):
+            self.assertEqual(usuario.pk, self.usuario.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual((usuario.email, usuario.date_joined), (self.usuario.email, self.usuario.date_joined))
@@ -0,0 +1,96 @@
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from apps.core.models import UserProfile
+from apps.core.roles import roles_por_usuario_id
+
+
+def claims_usuario(user_id):
+    """Claims de identidad del access token (una consulta al emitirlo)."""
+    datos = User.objects.filter(pk=user_id).values(
+        'username', 'is_staff', 'is_superuser', 'perfil__user_profile_id', 'perfil__persona_id'
+    ).first() or {}
+    return {
+        'username': datos.get('username', ''),
+        'is_staff': datos.get('is_staff', False),
+        'is_superuser': datos.get('is_superuser', False),
+        'user_profile_id': datos.get('perfil__user_profile_id'),
+        'persona_id': datos.get('perfil__persona_id'),
+        'roles': [codigo for codigo, _ in roles_por_usuario_id(user_id)],
+    }
+
+
+class TokenRefrescoConClaims(RefreshToken):
+    """
+    Refresh token cuyos access tokens llevan los claims de claims_usuario(),
+    vigentes al emitirse (login y token/refresh/). Con ellos el frontend no
+    necesita llamar a verificar-admin y JWTAutenticacionSinConsulta arma el
+    usuario sin leer la tabla auth_user.
+
+    El claim 'roles' es informativo: los permisos siempre consultan
+    apps.core.roles, así que quitar un rol rige de inmediato.
+    """
+
+    @property
+    def access_token(self):
+        acceso = super().access_token
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            for claim, valor in claims_usuario(int(user_id)).items():
+                acceso[claim] = valor
+        return acceso
+
+
+class UsuarioToken(TokenUser):
+    """
+    Usuario construido desde los claims del access token. Sólo va a la base de
+    datos si la vista usa algo que el token no trae: `perfil` carga el
+    UserProfile (con user y persona en la misma consulta) y cualquier otro
+    atributo del modelo User carga la fila completa.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def user_profile_id(self):
+        return self.token.get('user_profile_id')
+
+    @cached_property
+    def persona_id(self):
+        return self.token.get('persona_id')
+
+    @cached_property
+    def perfil(self):
+        filtro = {'user_id': self.id}
+        if self.user_profile_id:
+            filtro['pk'] = self.user_profile_id
+        return UserProfile.objects.select_related('user', 'persona').get(**filtro)
+
+    @cached_property
+    def usuario(self):
+        return User.objects.get(pk=self.id)
+
+    def __getattr__(self, nombre):
+        # Sólo se llama para atributos que TokenUser no define (email, first_name, ...)
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return getattr(self.usuario, nombre)
+
+
+class JWTAutenticacionSinConsulta(JWTStatelessUserAuthentication):
+    """
+    Autenticación JWT sin leer el usuario de la base de datos. Es opcional y se
+    activa por vista con authentication_classes: un usuario desactivado o
+    degradado conserva sus claims hasta que vence el access token.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('El token no identifica a un usuario')
+        return UsuarioToken(validated_token)
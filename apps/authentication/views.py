@@ -1,5 +1,5 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -9,7 +9,9 @@ from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from apps.core.models import UserProfile
+from apps.core.roles import CODIGOS_ADMIN, roles_de_usuario
 from .serializers import RegistroSerializer, UserProfileSerializer, LoginResponseSerializer
+from .tokens import JWTAutenticacionSinConsulta, TokenRefrescoConClaims
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -101,7 +103,7 @@ def login(request):
         }, status=status.HTTP_404_NOT_FOUND)
     
     # Generar tokens
-    refresh = RefreshToken.for_user(user)
+    refresh = TokenRefrescoConClaims.for_user(user)
     
     return Response({
         'access': str(refresh.access_token),
@@ -140,7 +142,7 @@ def validar_email(request):
         user_profile.save()
         
         # Generar tokens para login automático
-        refresh = RefreshToken.for_user(user_profile.user)
+        refresh = TokenRefrescoConClaims.for_user(user_profile.user)
         
         return Response({
             'message': 'Email verificado exitosamente',
@@ -155,10 +157,12 @@ def validar_email(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
+@authentication_classes([JWTAutenticacionSinConsulta])
 @permission_classes([IsAuthenticated])
 def perfil_actual(request):
     """
-    Retorna el perfil del usuario autenticado
+    Retorna el perfil del usuario autenticado. El usuario sale del token:
+    la única consulta es el perfil, con user y persona en el mismo SELECT.
     """
     try:
         user_profile = request.user.perfil
@@ -174,21 +178,17 @@ def verificar_admin(request):
     """
     Verifica si el usuario autenticado es administrador
     """
-    try:
-        user_profile = request.user.perfil
-        es_admin = user_profile.roles.filter(
-            rol__codigo_rol__in=['ADMIN', 'SUPERADMIN']
-        ).exists()
-        
-        return Response({
-            'es_admin': es_admin,
-            'roles': list(user_profile.roles.values_list('rol__codigo_rol', flat=True))
-        })
-    except UserProfile.DoesNotExist:
+    if not UserProfile.objects.filter(user=request.user).exists():
         return Response({
             'es_admin': False,
             'error': 'Perfil no encontrado'
         }, status=status.HTTP_404_NOT_FOUND)
+    
+    codigos = [codigo for codigo, _ in roles_de_usuario(request.user)]
+    return Response({
+        'es_admin': any(codigo in CODIGOS_ADMIN for codigo in codigos),
+        'roles': codigos
+    })
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
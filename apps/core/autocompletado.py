@@ -0,0 +1,168 @@
+# core/autocompletado.py
+"""
+Índice en memoria para las sugerencias del buscador (typeahead).
+
+Las claves normalizadas se guardan en una lista ordenada y una consulta es un
+bisect al primer prefijo más un recorrido corto, sin tocar la base de datos.
+Cada texto se indexa desde cada inicio de palabra, así que 'roll' encuentra
+'Pendón Roller'.
+
+El índice se construye en el primer uso del proceso y las señales de Producto,
+Marca y Subcategoria lo actualizan en forma incremental. Una versión compartida
+en la caché avisa a los demás procesos que deben reconstruir el suyo.
+"""
+import re
+import threading
+from bisect import bisect_left, insort
+from .busqueda import normalizar
+from .models import Producto, Marca, Subcategoria
+from . import versiones
+
+CLAVE_VERSION_AUTOCOMPLETADO = 'autocompletado:version'
+LIMITE_SUGERENCIAS = 8
+LIMITE_SUGERENCIAS_MAXIMO = 20
+# Entradas que se revisan como máximo por consulta antes de ordenar
+MAX_CANDIDATOS = 200
+# Orden de los tipos cuando dos sugerencias coinciden igual de bien
+PRIORIDAD_TIPOS = {'producto': 0, 'subcategoria': 1, 'marca': 2, 'sku': 3}
+
+
+def normalizar_clave(texto):
+    """'Pendón Roller-80' -> 'pendon roller 80'"""
+    return re.sub(r'[\W_]+', ' ', normalizar(texto or '')).strip()
+
+
+def claves_texto(texto):
+    """La clave completa y una por cada palabra siguiente: 'a b c' -> ['a b c', 'b c', 'c']."""
+    clave = normalizar_clave(texto)
+    if not clave:
+        return []
+    return [clave] + [clave[m.end():] for m in re.finditer(' ', clave)]
+
+
+class IndiceAutocompletado:
+    def __init__(self):
+        # (clave, tipo, id) ordenadas; el bisect se hace sobre la tupla completa
+        self.claves = []
+        # (tipo, id) -> (texto a mostrar, claves indexadas)
+        self.sugerencias = {}
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """Construye el índice ordenando una sola vez. `filas`: iterable de (tipo, id, texto)."""
+        indice = cls()
+        for tipo, id_objeto, texto in filas:
+            claves = claves_texto(texto)
+            if claves:
+                indice.sugerencias[(tipo, id_objeto)] = (texto, claves)
+                indice.claves.extend((clave, tipo, id_objeto) for clave in claves)
+        indice.claves.sort()
+        return indice
+
+    @classmethod
+    def desde_base_de_datos(cls):
+        return cls.desde_filas(filas_base_de_datos())
+
+    def agregar(self, tipo, id_objeto, texto):
+        """Inserta o reemplaza una sugerencia."""
+        self.eliminar(tipo, id_objeto)
+        claves = claves_texto(texto)
+        if not claves:
+            return
+        self.sugerencias[(tipo, id_objeto)] = (texto, claves)
+        for clave in claves:
+            insort(self.claves, (clave, tipo, id_objeto))
+
+    def eliminar(self, tipo, id_objeto):
+        anterior = self.sugerencias.pop((tipo, id_objeto), None)
+        if anterior is None:
+            return
+        for clave in anterior[1]:
+            posicion = bisect_left(self.claves, (clave, tipo, id_objeto))
+            if posicion < len(self.claves) and self.claves[posicion] == (clave, tipo, id_objeto):
+                del self.claves[posicion]
+
+    def sugerir(self, texto, limite=LIMITE_SUGERENCIAS):
+        prefijo = normalizar_clave(texto)
+        if not prefijo:
+            return []
+        mejores = {}
+        posicion = bisect_left(self.claves, (prefijo,))
+        # Copia del tramo: una señal puede estar modificando la lista en otro hilo
+        for clave, tipo, id_objeto in self.claves[posicion:posicion + MAX_CANDIDATOS]:
+            if not clave.startswith(prefijo):
+                break
+            datos = self.sugerencias.get((tipo, id_objeto))
+            if datos is None:
+                continue
+            texto_sugerencia, claves = datos
+            # Coincidir con el comienzo del texto pesa más que con una palabra interior
+            puntaje = (clave != claves[0], PRIORIDAD_TIPOS[tipo], len(texto_sugerencia), texto_sugerencia)
+            if (tipo, id_objeto) not in mejores or puntaje < mejores[(tipo, id_objeto)]:
+                mejores[(tipo, id_objeto)] = puntaje
+        ordenadas = sorted(mejores.items(), key=lambda item: item[1])[:limite]
+        return [
+            {'texto': puntaje[3], 'tipo': tipo, 'id': id_objeto}
+            for (tipo, id_objeto), puntaje in ordenadas
+        ]
+
+    def __len__(self):
+        return len(self.sugerencias)
+
+
+def filas_producto(producto_id, nombre_producto, sku):
+    yield 'producto', producto_id, nombre_producto
+    if sku:
+        yield 'sku', producto_id, sku
+
+
+def filas_base_de_datos():
+    productos = Producto.objects.filter(activo=True).values_list('producto_id', 'nombre_producto', 'sku')
+    for fila in productos.iterator(chunk_size=2000):
+        yield from filas_producto(*fila)
+    for marca_id, nombre in Marca.objects.filter(activo=True).values_list('marca_id', 'nombre_marca'):
+        yield 'marca', marca_id, nombre
+    subcategorias = Subcategoria.objects.filter(activo=True).values_list('subcategoria_id', 'nombre_subcategoria')
+    for subcategoria_id, nombre in subcategorias:
+        yield 'subcategoria', subcategoria_id, nombre
+
+
+# ===== ÍNDICE DEL PROCESO =====
+
+_indice = {'version': None, 'indice': None}
+_lock_indice = threading.Lock()
+
+
+def _version_compartida():
+    return versiones.version(CLAVE_VERSION_AUTOCOMPLETADO)
+
+
+def obtener_indice_autocompletado():
+    """Índice del proceso; se reconstruye si otro proceso registró cambios."""
+    version = _version_compartida()
+    if _indice['version'] != version:
+        with _lock_indice:
+            if _indice['version'] != version:
+                _indice['indice'] = IndiceAutocompletado.desde_base_de_datos()
+                _indice['version'] = version
+    return _indice['indice']
+
+
+def aplicar_cambio(cambio):
+    """
+    Aplica un cambio al índice local (si ya está construido) y avanza la versión
+    compartida. Si la versión avanzó más de un paso, otro proceso también hizo
+    cambios y el índice local se reconstruirá en la próxima consulta.
+    """
+    with _lock_indice:
+        indice = _indice['indice']
+        if indice is not None:
+            cambio(indice)
+        anterior = _version_compartida()
+        nueva = versiones.incrementar_version(CLAVE_VERSION_AUTOCOMPLETADO)
+        al_dia = indice is not None and _indice['version'] == anterior and nueva == anterior + 1
+        _indice['version'] = nueva if al_dia else None
+
+
+def sugerir(texto, limite=LIMITE_SUGERENCIAS):
+    return obtener_indice_autocompletado().sugerir(texto, limite)
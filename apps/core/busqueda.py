@@ -0,0 +1,260 @@
+# core/busqueda.py
+"""
+Búsqueda de productos por texto.
+
+En PostgreSQL usa búsqueda de texto completo (configuración `gyg_es`: español
+con stemming y sin acentos) sobre un índice GIN de expresión, con rango por
+peso de columna y fragmentos resaltados; si no hay coincidencias exactas cae a
+similitud por trigramas sobre el nombre, para tolerar errores de tipeo.
+Los índices, extensiones y la configuración se crean en la migración
+0009_busqueda_productos.
+
+En otros motores (SQLite en desarrollo) mantiene en memoria un índice invertido
+equivalente, reconstruido cuando cambia la versión del catálogo.
+"""
+import difflib
+import html
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from django.db import connections
+from django.db.models import Q
+from .catalogo import obtener_version_catalogo
+from .models import Producto
+
+CONFIGURACION_BUSQUEDA = 'gyg_es'
+# Mismos pesos que ts_rank por defecto para A, B y C
+CAMPOS_BUSQUEDA = (
+    ('nombre_producto', 'A', 1.0),
+    ('sku', 'A', 1.0),
+    ('descripcion_corta', 'B', 0.4),
+    ('detalle_producto', 'C', 0.2),
+)
+CAMPOS_RESALTADOS = ('nombre_producto', 'descripcion_corta')
+SIMILITUD_MINIMA_TIPEO = 0.75
+LIMITE_BUSQUEDA = 20
+LIMITE_BUSQUEDA_MAXIMO = 50
+PALABRAS_VACIAS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'sin', 'un', 'una', 'y',
+}
+
+
+def usa_postgres(alias='default'):
+    return connections[alias].vendor == 'postgresql'
+
+
+# ===== POSTGRESQL =====
+
+def documento_busqueda():
+    """
+    tsvector ponderado de un producto. La migración 0009 indexa una copia de
+    esta expresión, así que cualquier cambio aquí requiere una migración que
+    recree el índice.
+    """
+    from django.contrib.postgres.search import SearchVector
+    vectores = [
+        SearchVector(campo, weight=peso, config=CONFIGURACION_BUSQUEDA)
+        for campo, peso, _ in CAMPOS_BUSQUEDA
+    ]
+    documento = vectores[0]
+    for vector in vectores[1:]:
+        documento = documento + vector
+    return documento
+
+
+def _consulta_postgres(texto):
+    from django.contrib.postgres.search import SearchQuery
+    return SearchQuery(texto, config=CONFIGURACION_BUSQUEDA, search_type='websearch')
+
+
+def _buscar_postgres(queryset, texto, limite):
+    from django.contrib.postgres.search import SearchHeadline, SearchRank, TrigramSimilarity
+    consulta = _consulta_postgres(texto)
+    resaltados = {
+        f'resaltado_{campo}': SearchHeadline(
+            campo, consulta, config=CONFIGURACION_BUSQUEDA,
+            start_sel='<mark>', stop_sel='</mark>', highlight_all=True
+        )
+        for campo in CAMPOS_RESALTADOS
+    }
+    productos = list(
+        queryset.alias(documento=documento_busqueda())
+        .filter(documento=consulta)
+        .annotate(rango_busqueda=SearchRank(documento_busqueda(), consulta), **resaltados)
+        .order_by('-rango_busqueda', 'pk')[:limite]
+    )
+    if not productos:
+        # Sin coincidencias por palabras: probablemente un error de tipeo
+        productos = list(
+            queryset.filter(nombre_producto__trigram_similar=texto)
+            .annotate(rango_busqueda=TrigramSimilarity('nombre_producto', texto))
+            .order_by('-rango_busqueda', 'pk')[:limite]
+        )
+    for producto in productos:
+        producto.resaltado = {
+            campo: getattr(producto, f'resaltado_{campo}', None) or html.escape(getattr(producto, campo) or '')
+            for campo in CAMPOS_RESALTADOS
+        }
+    return productos
+
+
+# ===== ÍNDICE INVERTIDO EN MEMORIA =====
+
+def normalizar(texto):
+    """Minúsculas y sin acentos: 'Pendón' -> 'pendon'."""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def raiz(palabra):
+    """Stemming liviano de plurales en español: lápices -> lapiz, pendones -> pendon, lonas -> lona."""
+    if len(palabra) > 4 and palabra.endswith('ces'):
+        return palabra[:-3] + 'z'
+    if len(palabra) > 4 and palabra.endswith('es') and palabra[-3] in 'lrndj':
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith('s') and not palabra.endswith('ss'):
+        return palabra[:-1]
+    return palabra
+
+
+def terminos(texto):
+    return [
+        raiz(palabra) for palabra in re.findall(r'\w+', normalizar(texto or ''))
+        if palabra not in PALABRAS_VACIAS
+    ]
+
+
+def resaltar(texto, raices):
+    """Envuelve en <mark> las palabras de `texto` cuya raíz está en `raices`; escapa el resto."""
+    partes, inicio = [], 0
+    for coincidencia in re.finditer(r'\w+', texto or ''):
+        if raiz(normalizar(coincidencia.group())) in raices:
+            partes.append(html.escape(texto[inicio:coincidencia.start()]))
+            partes.append(f'<mark>{html.escape(coincidencia.group())}</mark>')
+            inicio = coincidencia.end()
+    partes.append(html.escape((texto or '')[inicio:]))
+    return ''.join(partes)
+
+
+class IndiceInvertido:
+    """Índice término -> {producto_id: peso} sobre los mismos campos y pesos que el tsvector."""
+
+    def __init__(self, filas):
+        self.postings = defaultdict(dict)
+        self.activos = set()
+        total = 0
+        for fila in filas:
+            total += 1
+            producto_id = fila['producto_id']
+            if fila['activo']:
+                self.activos.add(producto_id)
+            for campo, _, peso in CAMPOS_BUSQUEDA:
+                for termino in terminos(fila[campo]):
+                    pesos = self.postings[termino]
+                    pesos[producto_id] = pesos.get(producto_id, 0.0) + peso
+        self.total = total
+        self.vocabulario = sorted(self.postings)
+
+    @classmethod
+    def desde_base_de_datos(cls):
+        campos = ['producto_id', 'activo'] + [campo for campo, _, _ in CAMPOS_BUSQUEDA]
+        return cls(Producto.objects.values(*campos).iterator(chunk_size=2000))
+
+    def buscar(self, texto, solo_activos=True):
+        """
+        Retorna ([(producto_id, rango), ...] ordenado por rango, raíces coincidentes).
+        Como websearch_to_tsquery, exige que aparezcan todos los términos;
+        un término desconocido se reemplaza por los más parecidos del vocabulario.
+        """
+        buscados = list(dict.fromkeys(terminos(texto)))
+        puntajes = defaultdict(float)
+        encontrados = defaultdict(set)
+        raices = set()
+        for termino in buscados:
+            if termino in self.postings:
+                candidatos = [(termino, 1.0)]
+            else:
+                candidatos = [
+                    (parecido, 0.5) for parecido in
+                    difflib.get_close_matches(termino, self.vocabulario, n=3, cutoff=SIMILITUD_MINIMA_TIPEO)
+                ]
+            for candidato, factor in candidatos:
+                raices.add(candidato)
+                pesos = self.postings[candidato]
+                idf = math.log(1 + self.total / len(pesos))
+                for producto_id, peso in pesos.items():
+                    puntajes[producto_id] += peso * idf * factor
+                    encontrados[producto_id].add(termino)
+
+        resultados = [
+            (producto_id, puntaje) for producto_id, puntaje in puntajes.items()
+            if len(encontrados[producto_id]) == len(buscados)
+            and (not solo_activos or producto_id in self.activos)
+        ]
+        resultados.sort(key=lambda resultado: (-resultado[1], resultado[0]))
+        return resultados, raices
+
+
+_indice_local = {'version': None, 'indice': None}
+_lock_indice = threading.Lock()
+
+
+def obtener_indice_local():
+    """Índice del proceso; se reconstruye cuando cambia la versión del catálogo."""
+    version = obtener_version_catalogo()
+    if _indice_local['version'] != version:
+        with _lock_indice:
+            if _indice_local['version'] != version:
+                _indice_local['indice'] = IndiceInvertido.desde_base_de_datos()
+                _indice_local['version'] = version
+    return _indice_local['indice']
+
+
+def _buscar_local(queryset, texto, limite):
+    resultados, raices = obtener_indice_local().buscar(texto)
+    rangos = dict(resultados[:limite])
+    productos = queryset.in_bulk(list(rangos))
+    ordenados = []
+    for producto_id, rango in rangos.items():
+        producto = productos.get(producto_id)
+        if producto is None:
+            continue
+        producto.rango_busqueda = rango
+        producto.resaltado = {campo: resaltar(getattr(producto, campo), raices) for campo in CAMPOS_RESALTADOS}
+        ordenados.append(producto)
+    return ordenados
+
+
+# ===== API =====
+
+def buscar_productos(texto, queryset=None, limite=LIMITE_BUSQUEDA):
+    """
+    Productos que coinciden con `texto`, ordenados por relevancia. Cada uno
+    trae `rango_busqueda` y `resaltado` ({campo: html con <mark>}).
+    """
+    if queryset is None:
+        queryset = Producto.objects.filter(activo=True)
+    if not terminos(texto):
+        return []
+    if usa_postgres(queryset.db):
+        return _buscar_postgres(queryset, texto, limite)
+    return _buscar_local(queryset, texto, limite)
+
+
+def filtrar_por_busqueda(queryset, texto):
+    """
+    Filtra un queryset por `texto` sin imponer orden (listado del admin, que
+    conserva su orden y paginación). Los SKU también coinciden por prefijo.
+    """
+    por_sku = Q(sku__istartswith=texto.strip())
+    if not terminos(texto):
+        return queryset.filter(por_sku)
+    if usa_postgres(queryset.db):
+        return queryset.alias(documento=documento_busqueda()).filter(
+            Q(documento=_consulta_postgres(texto)) | Q(nombre_producto__trigram_similar=texto) | por_sku
+        )
+    resultados, _ = obtener_indice_local().buscar(texto, solo_activos=False)
+    return queryset.filter(Q(pk__in=[producto_id for producto_id, _ in resultados]) | por_sku)
@@ -0,0 +1,115 @@
+# core/catalogo.py
+import hashlib
+import json
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from .models import Categoria, Subcategoria, Producto, ImagenProducto
+from .versiones import incrementar_version, version
+
+CLAVE_VERSION_CATALOGO = 'catalogo:version'
+CATALOGO_CACHE_TTL = 60 * 60 * 24  # Las versiones antiguas expiran solas
+
+
+def formatear_precio(precio):
+    """Formatea un precio en pesos chilenos: 15000 -> '$15.000'"""
+    return f"${precio:,}".replace(',', '.') if precio else '$0'
+
+
+def prefetch_imagen_portada():
+    """
+    Precarga de la imagen principal de cada producto (o la primera, si ninguna está
+    marcada) en producto.imagen_portada: una sola consulta para todo el listado.
+    """
+    imagenes = ImagenProducto.objects.order_by('-es_principal', 'orden')[:1]
+    return Prefetch('imagenes', queryset=imagenes, to_attr='imagen_portada')
+
+
+def obtener_imagen_portada(producto):
+    """Imagen principal del producto, usando la precarga si existe."""
+    if hasattr(producto, 'imagen_portada'):
+        return producto.imagen_portada[0] if producto.imagen_portada else None
+    return producto.imagenes.filter(es_principal=True).first() or producto.imagenes.first()
+
+
+def consultar_arbol_catalogo():
+    """
+    Queryset de categorías activas con subcategorías, productos e imagen principal
+    precargados. Se resuelve siempre en 4 consultas, sin importar el tamaño del catálogo.
+    """
+    productos = Producto.objects.filter(activo=True).order_by('nombre_producto').prefetch_related(
+        prefetch_imagen_portada()
+    )
+    subcategorias = Subcategoria.objects.filter(activo=True).prefetch_related(
+        Prefetch('productos', queryset=productos, to_attr='productos_activos')
+    )
+    return Categoria.objects.filter(activo=True).prefetch_related(
+        Prefetch('subcategorias', queryset=subcategorias, to_attr='subcategorias_activas')
+    )
+
+
+def construir_arbol_catalogo(request):
+    """Arma en una sola pasada la estructura categoría > subcategoría > productos del menú."""
+    datos_categorias = []
+
+    for categoria in consultar_arbol_catalogo():
+        subcategorias_data = []
+
+        for subcategoria in categoria.subcategorias_activas:
+            productos_data = []
+
+            for producto in subcategoria.productos_activos:
+                imagen = obtener_imagen_portada(producto)
+                productos_data.append({
+                    'id': producto.producto_id,
+                    'name': producto.nombre_producto,
+                    'price': formatear_precio(producto.precio_venta),
+                    'image': request.build_absolute_uri(imagen.imagen.url) if imagen and imagen.imagen else '',
+                    'description': producto.detalle_producto or '',
+                    'characteristics': producto.caracteristicas or ''
+                })
+
+            subcategorias_data.append({
+                'id': subcategoria.subcategoria_id,
+                'name': subcategoria.nombre_subcategoria,
+                'products': productos_data
+            })
+
+        datos_categorias.append({
+            'id': categoria.categoria_id,
+            'name': categoria.nombre_categoria,
+            'subcategories': subcategorias_data
+        })
+
+    return datos_categorias
+
+
+# ===== CACHÉ VERSIONADA DEL CATÁLOGO =====
+
+def obtener_version_catalogo():
+    """Versión vigente del catálogo (core/versiones.py)."""
+    return version(CLAVE_VERSION_CATALOGO)
+
+
+def invalidar_catalogo():
+    """Incrementa la versión del catálogo; las entradas anteriores quedan huérfanas."""
+    incrementar_version(CLAVE_VERSION_CATALOGO)
+
+
+def etag_catalogo(request):
+    """
+    ETag del catálogo para este host. Las URLs de imágenes son absolutas,
+    por lo que el host forma parte de la clave.
+    """
+    huella_host = hashlib.md5(request.build_absolute_uri('/').encode()).hexdigest()[:12]
+    return f'"catalogo-{obtener_version_catalogo()}-{huella_host}"'
+
+
+def obtener_catalogo_serializado(request, etag):
+    """Retorna el JSON del catálogo en bytes, construyéndolo solo si no está en caché."""
+    clave = 'catalogo:arbol:' + etag.strip('"')
+    contenido = cache.get(clave)
+    if contenido is None:
+        contenido = json.dumps(construir_arbol_catalogo(request), cls=DjangoJSONEncoder).encode()
+        cache.set(clave, contenido, CATALOGO_CACHE_TTL)
+    return contenido
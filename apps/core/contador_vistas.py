@@ -0,0 +1,113 @@
+# core/contador_vistas.py
+"""
+Contador de vistas de productos con escritura diferida.
+
+Cada vista suma en memoria del proceso; los acumulados se escriben juntos con
+un UPDATE ... SET vistas = vistas + CASE producto_id WHEN ... END por cada
+TAMANO_LOTE productos. El vaciado ocurre en la vista que encuentra el búfer
+con más de MAX_PENDIENTES vistas o con más de INTERVALO_VACIADO segundos desde
+el último, y al terminar el proceso (atexit: un worker de gunicorn que sale
+normalmente lo ejecuta). Un corte abrupto del proceso pierde a lo sumo lo
+acumulado en ese intervalo.
+
+Como se suma sobre el valor de la base de datos, no se pierden incrementos
+entre procesos ni hilos, a diferencia de leer, sumar y guardar la instancia.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+from .models import Producto
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_VACIADO = 5.0
+MAX_PENDIENTES = 1000
+TAMANO_LOTE = 500
+
+
+class ContadorVistas:
+    def __init__(self, intervalo=INTERVALO_VACIADO, max_pendientes=MAX_PENDIENTES):
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self._pendientes = Counter()
+        self._total_pendiente = 0
+        self._ultimo_vaciado = time.monotonic()
+        self._lock = threading.Lock()
+        # Base de datos en la que se registraron las vistas pendientes
+        self._base_de_datos = None
+
+    def registrar(self, producto_id, cantidad=1):
+        """Suma `cantidad` vistas al producto; vacía el búfer si corresponde."""
+        with self._lock:
+            if not self._pendientes:
+                self._base_de_datos = connection.settings_dict['NAME']
+            self._pendientes[producto_id] += cantidad
+            self._total_pendiente += cantidad
+            vaciar = (
+                self._total_pendiente >= self.max_pendientes
+                or time.monotonic() - self._ultimo_vaciado >= self.intervalo
+            )
+        if vaciar:
+            self.vaciar()
+
+    def pendientes(self, producto_id):
+        with self._lock:
+            return self._pendientes.get(producto_id, 0)
+
+    def _tomar_pendientes(self):
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, Counter()
+            self._total_pendiente = 0
+            self._ultimo_vaciado = time.monotonic()
+        return pendientes
+
+    def _devolver(self, pendientes):
+        with self._lock:
+            self._pendientes.update(pendientes)
+            self._total_pendiente += sum(pendientes.values())
+
+    def vaciar(self):
+        """Escribe los acumulados en la base de datos. Retorna la cantidad de UPDATE ejecutados."""
+        base_de_datos = self._base_de_datos
+        pendientes = self._tomar_pendientes()
+        if not pendientes or base_de_datos != connection.settings_dict['NAME']:
+            # Vistas registradas contra otra base de datos (p. ej. la de tests, ya eliminada)
+            return 0
+        ids = sorted(pendientes)
+        lotes = 0
+        for inicio in range(0, len(ids), TAMANO_LOTE):
+            lote = ids[inicio:inicio + TAMANO_LOTE]
+            try:
+                escribir_vistas({producto_id: pendientes[producto_id] for producto_id in lote})
+            except Exception as e:
+                # Lo no escrito vuelve al búfer para el próximo vaciado
+                logger.error(f"Error escribiendo vistas de productos: {e}")
+                self._devolver(Counter({producto_id: pendientes[producto_id] for producto_id in ids[inicio:]}))
+                break
+            lotes += 1
+        return lotes
+
+
+def escribir_vistas(incrementos):
+    """Un solo UPDATE que suma {producto_id: vistas} sobre el valor actual de cada fila."""
+    suma = Case(
+        *[When(producto_id=producto_id, then=Value(cantidad)) for producto_id, cantidad in incrementos.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    return Producto.objects.filter(producto_id__in=list(incrementos)).update(
+        vistas=Coalesce(F('vistas'), 0) + suma
+    )
+
+
+contador_vistas = ContadorVistas()
+atexit.register(contador_vistas.vaciar)
+
+
+def registrar_vista(producto_id):
+    contador_vistas.registrar(producto_id)
@@ -0,0 +1,160 @@
+# core/correos.py
+"""
+Bandeja de salida de correos transaccionales.
+
+Las vistas sólo llaman a encolar_correo(), dentro de la misma transacción que
+la escritura que origina el correo: si esa transacción se revierte el correo
+no existe, y si se confirma queda pendiente aunque el servidor SMTP no responda.
+
+El comando enviar_correos reclama lotes de pendientes, los renderiza desde
+templates/emails/<plantilla>.txt (y .html si existe) y los envía por una sola
+conexión. Los fallidos se reintentan con espera exponencial hasta MAX_INTENTOS.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.template import TemplateDoesNotExist
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import CorreoSalida, EstadoCorreo
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 6
+# Esperas entre intentos: 1, 2, 4, 8 y 16 minutos
+ESPERA_BASE_REINTENTO = timedelta(minutes=1)
+ESPERA_MAXIMA_REINTENTO = timedelta(hours=1)
+# Un correo que lleva más que esto en ENVIANDO se considera abandonado (worker caído)
+TIEMPO_MAXIMO_ENVIO = timedelta(minutes=10)
+
+
+def nuevo_correo(plantilla, destinatarios, asunto, contexto=None):
+    """CorreoSalida sin guardar, o None si no hay destinatarios (ver encolar_correos)."""
+    if isinstance(destinatarios, str):
+        destinatarios = [destinatarios]
+    destinatarios = [destinatario for destinatario in destinatarios if destinatario]
+    if not destinatarios:
+        return None
+    return CorreoSalida(
+        plantilla=plantilla,
+        destinatarios=destinatarios,
+        asunto=asunto,
+        contexto=contexto or {},
+    )
+
+
+def encolar_correo(plantilla, destinatarios, asunto, contexto=None):
+    """
+    Deja un correo pendiente en la bandeja de salida. Debe llamarse dentro de la
+    transacción de la escritura que lo origina. Retorna el CorreoSalida, o None
+    si no hay destinatarios.
+    """
+    correo = nuevo_correo(plantilla, destinatarios, asunto, contexto)
+    if correo is not None:
+        correo.save()
+    return correo
+
+
+def encolar_correos(correos):
+    """Encola varios correos de nuevo_correo() con un solo INSERT."""
+    return CorreoSalida.objects.bulk_create([correo for correo in correos if correo is not None])
+
+
+def espera_reintento(intentos):
+    """Espera antes del siguiente intento tras `intentos` fallidos."""
+    return min(ESPERA_BASE_REINTENTO * 2 ** (intentos - 1), ESPERA_MAXIMA_REINTENTO)
+
+
+def reclamar_pendientes(limite):
+    """
+    Marca como ENVIANDO hasta 'limite' correos listos para enviarse (o abandonados)
+    y retorna sus IDs. Con varios workers sobre PostgreSQL, SKIP LOCKED evita que
+    dos reclamen el mismo correo.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        pendientes = CorreoSalida.objects.filter(
+            Q(estado=EstadoCorreo.PENDIENTE, proximo_intento__lte=ahora) |
+            Q(estado=EstadoCorreo.ENVIANDO, fecha_inicio_envio__lt=ahora - TIEMPO_MAXIMO_ENVIO)
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            pendientes = pendientes.select_for_update(skip_locked=True)
+        ids = list(pendientes.order_by('correo_id').values_list('correo_id', flat=True)[:limite])
+        if ids:
+            CorreoSalida.objects.filter(correo_id__in=ids).update(
+                estado=EstadoCorreo.ENVIANDO,
+                fecha_inicio_envio=ahora
+            )
+    return ids
+
+
+def renderizar(correo):
+    """EmailMultiAlternatives del correo, con la versión HTML si la plantilla la tiene."""
+    texto = render_to_string(f'{correo.plantilla}.txt', correo.contexto)
+    mensaje = EmailMultiAlternatives(
+        correo.asunto, texto, settings.DEFAULT_FROM_EMAIL, correo.destinatarios
+    )
+    try:
+        mensaje.attach_alternative(render_to_string(f'{correo.plantilla}.html', correo.contexto), 'text/html')
+    except TemplateDoesNotExist:
+        pass
+    return mensaje
+
+
+def _registrar_fallo(correo, error):
+    correo.intentos += 1
+    correo.ultimo_error = str(error)
+    if correo.intentos >= MAX_INTENTOS:
+        correo.estado = EstadoCorreo.ERROR
+    else:
+        correo.estado = EstadoCorreo.PENDIENTE
+        correo.proximo_intento = timezone.now() + espera_reintento(correo.intentos)
+    correo.save(update_fields=['intentos', 'ultimo_error', 'estado', 'proximo_intento', 'fecha_modificacion'])
+
+
+def enviar_lote(ids):
+    """
+    Envía los correos reclamados reutilizando una sola conexión SMTP para todo
+    el lote, y los marca como enviados con un solo UPDATE. Retorna (enviados, fallidos).
+    """
+    enviados, fallidos = [], 0
+    conexion = get_connection()
+    try:
+        for correo in CorreoSalida.objects.filter(correo_id__in=ids):
+            try:
+                mensaje = renderizar(correo)
+                # No hace nada si la conexión ya está abierta
+                conexion.open()
+                mensaje.connection = conexion
+                mensaje.send()
+            except Exception as e:
+                logger.warning(f"Error enviando correo {correo.correo_id} (intento {correo.intentos + 1}): {e}")
+                # La conexión puede haber quedado inutilizable: el siguiente correo abre otra
+                conexion.close()
+                _registrar_fallo(correo, e)
+                fallidos += 1
+                continue
+            enviados.append(correo.correo_id)
+    finally:
+        conexion.close()
+        if enviados:
+            ahora = timezone.now()
+            CorreoSalida.objects.filter(correo_id__in=enviados).update(
+                estado=EstadoCorreo.ENVIADO,
+                intentos=F('intentos') + 1,
+                fecha_envio=ahora,
+                fecha_modificacion=ahora,
+                ultimo_error=None
+            )
+    return len(enviados), fallidos
+
+
+def enviar_pendientes(limite=50):
+    """Reclama y envía un lote. Retorna (enviados, fallidos)."""
+    ids = reclamar_pendientes(limite)
+    if not ids:
+        return 0, 0
+    return enviar_lote(ids)
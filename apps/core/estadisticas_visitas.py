@@ -0,0 +1,132 @@
+# core/estadisticas_visitas.py
+"""
+Estadísticas de visitas.
+
+visitas_pagina guarda una fila por petición. consolidar() la resume en
+VisitaRutaHora y VisitaRutaDia (visitas e IPs distintas por ruta), recalculando
+los días del rango completos, así que puede ejecutarse las veces que haga falta:
+el comando consolidar_visitas lo hace sobre ayer y hoy y se programa (cron)
+cada pocos minutos.
+
+compactar() consolida los días que van a salir de la retención y elimina las
+visitas crudas anteriores a VISITAS_RETENCION_DIAS días, por lotes para no
+bloquear la tabla. Lo eliminado queda sólo en los rollups, por eso consolidar()
+nunca recalcula días anteriores a la visita cruda más antigua.
+
+El panel lee sólo de los rollups (rutas_principales, curva_trafico).
+"""
+import datetime
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+from .models import VisitaPagina, VisitaRutaHora, VisitaRutaDia
+
+TAMANO_LOTE_ELIMINACION = 5000
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def _primer_dia_crudo():
+    primera = VisitaPagina.objects.aggregate(primera=Min('fecha'))['primera']
+    return timezone.localdate(primera) if primera else None
+
+
+def _agrupar(visitas, **periodo):
+    return visitas.values('ruta', **periodo).annotate(
+        total=Count('pk'), distintos=Count('ip', distinct=True)
+    )
+
+
+# ===== CONSOLIDACIÓN =====
+
+def consolidar(desde=None, hasta=None):
+    """
+    Reemplaza los rollups de los días [desde, hasta] (por defecto ayer y hoy) con
+    lo que dice visitas_pagina. Retorna (filas por hora, filas por día).
+    """
+    hoy = timezone.localdate()
+    desde = desde or hoy - datetime.timedelta(days=1)
+    hasta = hasta or hoy
+    primer_dia = _primer_dia_crudo()
+    if primer_dia is None:
+        return 0, 0
+    # Los días compactados ya no tienen visitas crudas: se conservan sus rollups
+    desde = max(desde, primer_dia)
+    if desde > hasta:
+        return 0, 0
+
+    inicio, fin = _inicio_dia(desde), _inicio_dia(hasta + datetime.timedelta(days=1))
+    visitas = VisitaPagina.objects.filter(fecha__gte=inicio, fecha__lt=fin).order_by()
+    horas = [
+        VisitaRutaHora(hora=grupo['hora'], ruta=grupo['ruta'], visitas=grupo['total'], visitantes=grupo['distintos'])
+        for grupo in _agrupar(visitas, hora=TruncHour('fecha'))
+    ]
+    dias = [
+        VisitaRutaDia(fecha=grupo['dia'], ruta=grupo['ruta'], visitas=grupo['total'], visitantes=grupo['distintos'])
+        for grupo in _agrupar(visitas, dia=TruncDate('fecha'))
+    ]
+    with transaction.atomic():
+        VisitaRutaHora.objects.filter(hora__gte=inicio, hora__lt=fin).delete()
+        VisitaRutaHora.objects.bulk_create(horas, batch_size=1000)
+        VisitaRutaDia.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+        VisitaRutaDia.objects.bulk_create(dias, batch_size=1000)
+    return len(horas), len(dias)
+
+
+def compactar(dias=None):
+    """
+    Consolida y elimina las visitas crudas de más de `dias` días (por defecto
+    VISITAS_RETENCION_DIAS). Retorna las visitas eliminadas.
+    """
+    dias = settings.VISITAS_RETENCION_DIAS if dias is None else dias
+    limite = timezone.localdate() - datetime.timedelta(days=dias)
+    primer_dia = _primer_dia_crudo()
+    if primer_dia is None or primer_dia >= limite:
+        return 0
+    consolidar(primer_dia, limite - datetime.timedelta(days=1))
+
+    viejas = VisitaPagina.objects.filter(fecha__lt=_inicio_dia(limite))
+    eliminadas = 0
+    while True:
+        ids = list(viejas.order_by('pk').values_list('pk', flat=True)[:TAMANO_LOTE_ELIMINACION])
+        if not ids:
+            break
+        eliminadas += VisitaPagina.objects.filter(pk__in=ids).delete()[0]
+    return eliminadas
+
+
+# ===== CONSULTA =====
+
+def rutas_principales(desde, hasta, limite=10):
+    """[{'ruta', 'visitas'}, ...] más visitadas en los días [desde, hasta]."""
+    return list(
+        VisitaRutaDia.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+        .values('ruta')
+        .annotate(visitas=Sum('visitas'))
+        .order_by('-visitas', 'ruta')[:limite]
+    )
+
+
+def curva_trafico(desde, hasta, por_hora=False, ruta=None):
+    """
+    [{'fecha' u 'hora', 'visitas'}, ...] de los días [desde, hasta], de todas las
+    rutas o de una (en ese caso también 'visitantes').
+    """
+    if por_hora:
+        filas = VisitaRutaHora.objects.filter(
+            hora__gte=_inicio_dia(desde), hora__lt=_inicio_dia(hasta + datetime.timedelta(days=1))
+        )
+        periodo = 'hora'
+    else:
+        filas = VisitaRutaDia.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+        periodo = 'fecha'
+    agregados = {'visitas': Sum('visitas')}
+    if ruta:
+        filas = filas.filter(ruta=ruta)
+        # Con una sola ruta hay una fila por periodo: las IPs distintas no se suman entre rutas
+        agregados['visitantes'] = Sum('visitantes')
+    return list(filas.order_by(periodo).values(periodo).annotate(**agregados))
@@ -0,0 +1,70 @@
+# core/imagenes.py
+import logging
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import ImagenProducto, EstadoProcesamientoImagen
+
+logger = logging.getLogger(__name__)
+
+# Una imagen que lleva más que esto en PROCESANDO se considera abandonada
+# (worker caído) y vuelve a reclamarse
+TIEMPO_MAXIMO_PROCESAMIENTO = timedelta(minutes=10)
+
+
+def reclamar_pendientes(limite):
+    """
+    Marca como PROCESANDO hasta 'limite' imágenes pendientes (o abandonadas) y retorna
+    sus IDs. Con varios workers sobre PostgreSQL, SKIP LOCKED evita que dos reclamen
+    la misma imagen.
+    """
+    abandonadas_desde = timezone.now() - TIEMPO_MAXIMO_PROCESAMIENTO
+    with transaction.atomic():
+        pendientes = ImagenProducto.objects.filter(
+            Q(estado_procesamiento=EstadoProcesamientoImagen.PENDIENTE) |
+            Q(estado_procesamiento=EstadoProcesamientoImagen.PROCESANDO,
+              fecha_inicio_procesamiento__lt=abandonadas_desde)
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            pendientes = pendientes.select_for_update(skip_locked=True)
+        ids = list(
+            pendientes.order_by('imagen_producto_id').values_list('imagen_producto_id', flat=True)[:limite]
+        )
+        if ids:
+            ImagenProducto.objects.filter(imagen_producto_id__in=ids).update(
+                estado_procesamiento=EstadoProcesamientoImagen.PROCESANDO,
+                fecha_inicio_procesamiento=timezone.now()
+            )
+    return ids
+
+
+def procesar_imagen(imagen_producto_id):
+    """Procesa una imagen reclamada y registra el resultado. Retorna True si quedó LISTO."""
+    imagen = ImagenProducto.objects.select_related('producto').filter(
+        imagen_producto_id=imagen_producto_id
+    ).first()
+    if imagen is None:
+        return False
+    try:
+        imagen.procesar()
+    except Exception as e:
+        logger.error(f"Error procesando imagen {imagen_producto_id}: {e}")
+        imagen.estado_procesamiento = EstadoProcesamientoImagen.ERROR
+        imagen.error_procesamiento = str(e)
+        imagen.save(update_fields=['estado_procesamiento', 'error_procesamiento'])
+        return False
+    imagen.estado_procesamiento = EstadoProcesamientoImagen.LISTO
+    imagen.error_procesamiento = None
+    # post_save invalida el catálogo: la URL de la imagen cambió
+    imagen.save(update_fields=['imagen', 'variantes', 'estado_procesamiento', 'error_procesamiento'])
+    return True
+
+
+def inicializar_proceso():
+    """
+    Inicializador de los procesos del pool (necesario con 'spawn'). El proceso padre
+    cierra sus conexiones antes de crear el pool, así ningún hijo hereda un socket abierto.
+    """
+    import django
+    django.setup()
@@ -0,0 +1,246 @@
+# core/interacciones.py
+"""
+Historial de interacciones y perfiles de comportamiento.
+
+El frontend envía sus interacciones en lotes (POST /api/interacciones/) y
+guardar_interacciones() las inserta con un solo INSERT en historial_navegacion;
+las compras las registra el pedido (registrar_compra). El historial sólo crece.
+
+actualizar_perfiles() toma las interacciones posteriores al cursor
+'perfiles_comportamiento' (último historial_id procesado) y las suma al
+PerfilComportamiento de cada usuario: contadores, categorías, productos
+recientes, rango de precios y actividad por hora y día. Cada lote usa un número
+fijo de consultas, sin importar cuántos usuarios traiga, y nunca relee el
+historial completo. El cursor avanza en la misma transacción que los perfiles.
+
+Los IDs se asignan al insertar pero las filas se ven al confirmarse su
+transacción: para no saltarse una fila con ID menor confirmada más tarde, no se
+procesan las registradas hace menos de MARGEN_REGISTRO.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import (
+    Categoria, CursorProcesamiento, HistorialNavegacion, PerfilComportamiento, Producto, TipoInteraccion
+)
+from .visitas import agente_usuario_id
+
+# La compra no la informa el cliente: la registra el pedido
+TIPOS_CLIENTE = [tipo for tipo in TipoInteraccion if tipo != TipoInteraccion.PURCHASE]
+TIPOS_CON_PRODUCTO = {
+    TipoInteraccion.PRODUCT_VIEW, TipoInteraccion.ADD_TO_CART,
+    TipoInteraccion.REMOVE_FROM_CART, TipoInteraccion.WISHLIST_ADD,
+}
+MAX_EVENTOS_LOTE = 100
+# Un timestamp del cliente fuera de [ahora - MAX_ANTIGUEDAD_EVENTO, ahora] se reemplaza por ahora
+MAX_ANTIGUEDAD_EVENTO = timedelta(hours=24)
+
+CURSOR_PERFILES = 'perfiles_comportamiento'
+LOTE_ACTUALIZACION = 5000
+MARGEN_REGISTRO = timedelta(seconds=30)
+MAX_PRODUCTOS_RECIENTES = 50
+
+CAMPOS_EVENTO = [
+    'historial_id', 'user_profile_id', 'tipo_interaccion', 'producto_id', 'categoria_id',
+    'timestamp', 'fecha_registro', 'duracion_segundos',
+]
+CAMPOS_PERFIL = [
+    'categorias_favoritas', 'productos_vistos_recientes',
+    'precio_minimo_promedio', 'precio_maximo_promedio', 'precio_promedio_productos_vistos',
+    'precio_minimo_visto', 'precio_maximo_visto', 'suma_precios_vistos', 'cantidad_precios_vistos',
+    'hora_preferida_navegacion', 'dia_semana_preferido', 'actividad_por_hora', 'actividad_por_dia',
+    'total_productos_vistos', 'total_busquedas', 'total_items_carrito', 'total_compras',
+    'tiempo_total_navegacion_segundos', 'ultima_visita', 'productos_comprados_ids', 'score_actividad',
+    'fecha_modificacion',
+]
+
+
+# ===== REGISTRO =====
+
+def _acotar_timestamp(timestamp, ahora):
+    if timestamp is None or not ahora - MAX_ANTIGUEDAD_EVENTO <= timestamp <= ahora:
+        return ahora
+    return timestamp
+
+
+def guardar_interacciones(eventos, sesion_id, user_profile_id=None, ip=None, user_agent=''):
+    """
+    Guarda con un solo INSERT los eventos ya validados (LoteInteraccionesSerializer).
+    Los que referencian productos o categorías inexistentes se rechazan.
+    Retorna (guardados, rechazados).
+    """
+    producto_ids = {evento['producto_id'] for evento in eventos if evento.get('producto_id')}
+    categoria_ids = {evento['categoria_id'] for evento in eventos if evento.get('categoria_id')}
+    # producto_id -> categoria_id: la vista de un producto cuenta para su categoría
+    productos = dict(
+        Producto.objects.filter(producto_id__in=producto_ids)
+        .values_list('producto_id', 'subcategoria__categoria_id')
+    ) if producto_ids else {}
+    categorias = set(
+        Categoria.objects.filter(categoria_id__in=categoria_ids).values_list('categoria_id', flat=True)
+    ) if categoria_ids else set()
+
+    ahora = timezone.now()
+    agente_id = agente_usuario_id(user_agent)
+    filas, rechazados = [], 0
+    for evento in eventos:
+        producto_id, categoria_id = evento.get('producto_id'), evento.get('categoria_id')
+        if (producto_id and producto_id not in productos) or (categoria_id and categoria_id not in categorias):
+            rechazados += 1
+            continue
+        filas.append(HistorialNavegacion(
+            user_profile_id=user_profile_id,
+            sesion_id=sesion_id,
+            tipo_interaccion=evento['tipo'],
+            datos_interaccion=evento.get('datos') or None,
+            producto_id=producto_id,
+            categoria_id=categoria_id or productos.get(producto_id),
+            timestamp=_acotar_timestamp(evento.get('timestamp'), ahora),
+            ip_address=ip,
+            agente_usuario_id=agente_id,
+            duracion_segundos=evento.get('duracion_segundos'),
+        ))
+    HistorialNavegacion.objects.bulk_create(filas)
+    return len(filas), rechazados
+
+
+def registrar_compra(pedido, producto_ids):
+    """Una interacción 'purchase' por producto del pedido, si tiene usuario. Va en la transacción del pedido."""
+    if not pedido.user_profile_id:
+        return []
+    return HistorialNavegacion.objects.bulk_create([
+        HistorialNavegacion(
+            user_profile_id=pedido.user_profile_id,
+            sesion_id='',
+            tipo_interaccion=TipoInteraccion.PURCHASE,
+            producto_id=producto_id,
+            datos_interaccion={'pedido_id': pedido.pedido_id},
+        )
+        for producto_id in sorted(set(producto_ids))
+    ])
+
+
+# ===== PERFILES =====
+
+def _indice_maximo(valores):
+    return max(range(len(valores)), key=valores.__getitem__) if any(valores) else None
+
+
+def plegar_eventos(perfil, eventos, precios):
+    """
+    Suma al perfil (sin guardarlo) los eventos, en orden de historial_id.
+    `precios` es {producto_id: precio_venta} de los productos vistos.
+    """
+    categorias = Counter(perfil.categorias_favoritas)
+    recientes = list(perfil.productos_vistos_recientes)
+    comprados = list(perfil.productos_comprados_ids)
+    por_hora = list(perfil.actividad_por_hora) or [0] * 24
+    por_dia = list(perfil.actividad_por_dia) or [0] * 7
+
+    for evento in eventos:
+        tipo, producto_id = evento['tipo_interaccion'], evento['producto_id']
+        momento = timezone.localtime(evento['timestamp'])
+        por_hora[momento.hour] += 1
+        por_dia[momento.weekday()] += 1
+        if perfil.ultima_visita is None or evento['timestamp'] > perfil.ultima_visita:
+            perfil.ultima_visita = evento['timestamp']
+        if evento['categoria_id']:
+            # Claves de texto, como quedan al guardarse en JSON
+            categorias[str(evento['categoria_id'])] += 1
+        if evento['duracion_segundos']:
+            perfil.tiempo_total_navegacion_segundos += evento['duracion_segundos']
+
+        if tipo == TipoInteraccion.PRODUCT_VIEW:
+            perfil.total_productos_vistos += 1
+            if producto_id:
+                recientes = [producto_id] + [p for p in recientes if p != producto_id]
+                precio = precios.get(producto_id)
+                if precio:
+                    perfil.suma_precios_vistos += precio
+                    perfil.cantidad_precios_vistos += 1
+                    perfil.precio_minimo_visto = min(precio, perfil.precio_minimo_visto or precio)
+                    perfil.precio_maximo_visto = max(precio, perfil.precio_maximo_visto or precio)
+        elif tipo == TipoInteraccion.SEARCH:
+            perfil.total_busquedas += 1
+        elif tipo == TipoInteraccion.ADD_TO_CART:
+            perfil.total_items_carrito += 1
+        elif tipo == TipoInteraccion.PURCHASE:
+            perfil.total_compras += 1
+            if producto_id and producto_id not in comprados:
+                comprados.append(producto_id)
+
+    perfil.categorias_favoritas = dict(categorias)
+    perfil.productos_vistos_recientes = recientes[:MAX_PRODUCTOS_RECIENTES]
+    perfil.productos_comprados_ids = comprados
+    perfil.actividad_por_hora = por_hora
+    perfil.actividad_por_dia = por_dia
+    perfil.hora_preferida_navegacion = _indice_maximo(por_hora)
+    perfil.dia_semana_preferido = _indice_maximo(por_dia)
+
+    if perfil.cantidad_precios_vistos:
+        perfil.precio_minimo_promedio = int(perfil.precio_minimo_visto * 0.8)
+        perfil.precio_maximo_promedio = int(perfil.precio_maximo_visto * 1.2)
+        perfil.precio_promedio_productos_vistos = int(perfil.suma_precios_vistos / perfil.cantidad_precios_vistos)
+
+    perfil.score_actividad = min(100, (
+        (perfil.total_productos_vistos * 2) +
+        (perfil.total_busquedas * 3) +
+        (perfil.total_items_carrito * 5) +
+        (perfil.total_compras * 10)
+    ))
+    return perfil
+
+
+def actualizar_perfiles(limite=LOTE_ACTUALIZACION):
+    """Suma a los perfiles un lote de interacciones nuevas. Retorna las interacciones procesadas."""
+    with transaction.atomic():
+        # El bloqueo del cursor evita que dos procesos sumen el mismo lote
+        cursor, _ = CursorProcesamiento.objects.select_for_update().get_or_create(nombre=CURSOR_PERFILES)
+        eventos = list(
+            HistorialNavegacion.objects.filter(historial_id__gt=cursor.ultimo_id)
+            .order_by('historial_id').values(*CAMPOS_EVENTO)[:limite]
+        )
+        registrados_hasta = timezone.now() - MARGEN_REGISTRO
+        for posicion, evento in enumerate(eventos):
+            if evento['fecha_registro'] > registrados_hasta:
+                eventos = eventos[:posicion]
+                break
+        if not eventos:
+            return 0
+
+        # Las interacciones anónimas sólo avanzan el cursor
+        por_perfil = defaultdict(list)
+        for evento in eventos:
+            if evento['user_profile_id']:
+                por_perfil[evento['user_profile_id']].append(evento)
+
+        if por_perfil:
+            vistos = {
+                evento['producto_id'] for evento in eventos
+                if evento['tipo_interaccion'] == TipoInteraccion.PRODUCT_VIEW and evento['producto_id']
+            }
+            precios = dict(
+                Producto.objects.filter(producto_id__in=vistos).values_list('producto_id', 'precio_venta')
+            ) if vistos else {}
+            existentes = {
+                perfil.user_profile_id: perfil
+                for perfil in PerfilComportamiento.objects.filter(user_profile_id__in=list(por_perfil))
+            }
+            nuevos = []
+            ahora = timezone.now()
+            for user_profile_id, eventos_perfil in por_perfil.items():
+                perfil = existentes.get(user_profile_id)
+                if perfil is None:
+                    perfil = PerfilComportamiento(user_profile_id=user_profile_id)
+                    nuevos.append(perfil)
+                plegar_eventos(perfil, eventos_perfil, precios)
+                # bulk_update no pasa por auto_now
+                perfil.fecha_modificacion = ahora
+            PerfilComportamiento.objects.bulk_create(nuevos)
+            if existentes:
+                PerfilComportamiento.objects.bulk_update(list(existentes.values()), CAMPOS_PERFIL)
+
+        cursor.ultimo_id = eventos[-1]['historial_id']
+        cursor.save(update_fields=['ultimo_id', 'fecha_modificacion'])
+    return len(eventos)
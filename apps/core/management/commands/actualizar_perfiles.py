@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.core.interacciones import LOTE_ACTUALIZACION, actualizar_perfiles
+
+# Ejecutar el comando python manage.py actualizar_perfiles [--continuo] [--lote 5000]
+
+class Command(BaseCommand):
+    help = 'Suma las interacciones nuevas del historial a los perfiles de comportamiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_ACTUALIZACION, help='Interacciones por transacción')
+        parser.add_argument('--continuo', action='store_true', help='Seguir esperando interacciones nuevas')
+        parser.add_argument('--intervalo', type=float, default=30.0, help='Segundos de espera sin trabajo (modo continuo)')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                procesadas = actualizar_perfiles(options['lote'])
+                if not procesadas:
+                    if not options['continuo']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+                total += procesadas
+                self.stdout.write(f'Interacciones procesadas: {total}')
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} interacciones sumadas a los perfiles'))
@@ -0,0 +1,57 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from apps.core.autocompletado import IndiceAutocompletado, filas_producto
+
+# Ejecutar el comando python manage.py benchmark_autocompletado [--productos 10000 100000] [--consultas 20000]
+
+PALABRAS = [
+    'pendon', 'roller', 'lona', 'vinilo', 'adhesivo', 'tarjeta', 'presentacion', 'afiche', 'folleto',
+    'diptico', 'triptico', 'carpeta', 'sticker', 'troquelado', 'imantado', 'letrero', 'acrilico',
+    'pvc', 'foam', 'banner', 'bandera', 'taza', 'polera', 'gorro', 'lapiz', 'libreta', 'calendario',
+    'mate', 'brillante', 'laminado', 'impreso', 'corporativo', 'doble', 'faz', 'grande', 'mini',
+]
+
+
+class Command(BaseCommand):
+    help = 'Mide construcción y latencia de consulta del índice de autocompletado con catálogos sintéticos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, nargs='+', default=[10000, 100000],
+                            help='Tamaños de catálogo a medir')
+        parser.add_argument('--consultas', type=int, default=20000, help='Consultas por tamaño')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'productos':>10} {'claves':>10} {'construir':>10} {'p50':>8} {'p99':>8} {'máx':>8}"
+        )
+        for cantidad in options['productos']:
+            generador = random.Random(cantidad)
+            filas = []
+            for producto_id in range(1, cantidad + 1):
+                nombre = ' '.join(generador.sample(PALABRAS, generador.randint(2, 4)))
+                nombre = f'{nombre.title()} {generador.randint(10, 300)}x{generador.randint(10, 300)}'
+                filas.extend(filas_producto(producto_id, nombre, f'SKU-{producto_id:07d}'))
+
+            inicio = time.perf_counter()
+            indice = IndiceAutocompletado.desde_filas(filas)
+            construccion = time.perf_counter() - inicio
+
+            # Prefijos de 1 a 6 letras como los que se tipean en la caja de búsqueda
+            prefijos = []
+            for _ in range(options['consultas']):
+                palabra = generador.choice(PALABRAS)
+                prefijos.append(palabra[:generador.randint(1, min(6, len(palabra)))])
+
+            tiempos = []
+            for prefijo in prefijos:
+                inicio = time.perf_counter()
+                indice.sugerir(prefijo)
+                tiempos.append((time.perf_counter() - inicio) * 1e6)
+            tiempos.sort()
+            p99 = tiempos[int(len(tiempos) * 0.99) - 1]
+            self.stdout.write(
+                f'{cantidad:>10} {len(indice.claves):>10} {construccion:>9.2f}s '
+                f'{statistics.median(tiempos):>6.0f}µs {p99:>6.0f}µs {tiempos[-1]:>6.0f}µs'
+            )
@@ -0,0 +1,78 @@
+import io
+import os
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.core.models import Producto, VARIANTES_IMAGEN, formatos_variantes
+
+# Ejecutar el comando python manage.py benchmark_imagenes [--pagina 20] [--sinteticas]
+
+class Command(BaseCommand):
+    help = 'Compara los bytes de imágenes por página de catálogo: PNG 800x600 vs variantes WebP/AVIF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pagina', type=int, default=20, help='Productos por página de listado')
+        parser.add_argument('--sinteticas', action='store_true',
+                            help='Usar fotos sintéticas en memoria en vez de las imágenes procesadas de la BD')
+
+    def handle(self, *args, **options):
+        pagina = options['pagina']
+        totales = None if options['sinteticas'] else self.medir_bd(pagina)
+        if not totales:
+            self.stdout.write('Usando fotos sintéticas (2000x1500)')
+            totales = self.medir_sinteticas(pagina)
+
+        png = totales['png']
+        self.stdout.write(f"{'formato':<18} {'bytes/página':>14} {'vs PNG':>8}")
+        for nombre, total in totales.items():
+            self.stdout.write(f"{nombre:<18} {total:>14,} {total / png:>8.1%}".replace(',', '.'))
+
+    def medir_bd(self, pagina):
+        """Tamaño en disco de la imagen principal de la primera página de productos"""
+        totales = {}
+        productos = Producto.objects.filter(activo=True).prefetch_related('imagenes')[:pagina]
+        for producto in productos:
+            imagenes = list(producto.imagenes.all())
+            imagen = next((i for i in imagenes if i.es_principal), imagenes[0] if imagenes else None)
+            if not imagen or not imagen.variantes.get('card'):
+                continue
+            self.sumar(totales, 'png', os.path.getsize(imagen.imagen.path))
+            for formato, nombre in imagen.variantes['card'].items():
+                if formato not in ('ancho', 'alto'):
+                    self.sumar(totales, f'card.{formato}', os.path.getsize(os.path.join(settings.MEDIA_ROOT, nombre)))
+        return totales
+
+    def medir_sinteticas(self, pagina):
+        """Codifica fotos sintéticas con los mismos parámetros que ImagenProducto.procesar()"""
+        generador = np.random.default_rng(0)
+        totales = {}
+        for _ in range(pagina):
+            # Degradados y ondas con algo de ruido: se comprime como una foto, no como un color plano
+            y, x = np.mgrid[0:1500, 0:2000]
+            fase = generador.uniform(0, np.pi, 3)
+            base = np.stack([
+                127 + 100 * np.sin(x / (90 + 40 * k) + y / (130 - 30 * k) + fase[k]) for k in range(3)
+            ], axis=-1)
+            ruido = generador.normal(0, 4, base.shape)
+            foto = Image.fromarray(np.clip(base + ruido, 0, 255).astype(np.uint8), 'RGB')
+
+            respaldo = foto.copy()
+            respaldo.thumbnail((800, 600), Image.Resampling.LANCZOS)
+            self.sumar(totales, 'png', self.tamano(respaldo, 'PNG', {'optimize': True}))
+
+            card = foto.copy()
+            card.thumbnail((VARIANTES_IMAGEN['card'], VARIANTES_IMAGEN['card'] * 4), Image.Resampling.LANCZOS)
+            for formato, opciones in formatos_variantes().items():
+                self.sumar(totales, f'card.{formato}', self.tamano(card, formato.upper(), opciones))
+        return totales
+
+    @staticmethod
+    def tamano(imagen, formato, opciones):
+        buffer = io.BytesIO()
+        imagen.save(buffer, formato, **opciones)
+        return buffer.tell()
+
+    @staticmethod
+    def sumar(totales, clave, valor):
+        totales[clave] = totales.get(clave, 0) + valor
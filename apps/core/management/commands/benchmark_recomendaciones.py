@@ -0,0 +1,100 @@
+import random
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from apps.core.recomendaciones import K_VECINOS, TAMANO_BLOQUE, MatrizDispersa, vecinos_coseno
+
+# Ejecutar el comando python manage.py benchmark_recomendaciones [--usuarios 10000] [--productos 5000]
+
+
+def similitud_por_pares(perfil_a, perfil_b):
+    """El cálculo de a dos usuarios del SimilitudUsuarios.calcular_similitud original (conjuntos de Python)."""
+    score = 0
+    categorias_comunes = len(perfil_a['categorias'] & perfil_b['categorias'])
+    if categorias_comunes > 0:
+        score += min(categorias_comunes * 10, 40)
+    productos_comunes = len(perfil_a['productos'] & perfil_b['productos'])
+    if productos_comunes > 0:
+        score += min(productos_comunes * 5, 30)
+    if perfil_a['precio'] > 0 and perfil_b['precio'] > 0:
+        diferencia = abs(perfil_a['precio'] - perfil_b['precio'])
+        promedio = (perfil_a['precio'] + perfil_b['precio']) / 2
+        score += max(0, 1 - (diferencia / promedio)) * 20
+    score += max(0, 1 - (abs(perfil_a['actividad'] - perfil_b['actividad']) / 100)) * 10
+    return round(score, 2)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la construcción de vecinos por coseno (matriz dispersa, por bloques) con interacciones '
+        'sintéticas, y la estima del cálculo por pares original sobre los mismos usuarios (sin base de datos)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=10000)
+        parser.add_argument('--productos', type=int, default=5000)
+        parser.add_argument('--interacciones', type=int, default=30, help='Productos por usuario (promedio)')
+        parser.add_argument('--k', type=int, default=K_VECINOS)
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE)
+        parser.add_argument('--pares', type=int, default=200000, help='Pares medidos para estimar el cálculo por pares')
+
+    def handle(self, *args, **options):
+        usuarios, productos = options['usuarios'], options['productos']
+        generador = np.random.default_rng(0)
+
+        # Popularidad de productos tipo Zipf: pocos productos concentran muchas interacciones
+        popularidad = 1 / np.arange(1, productos + 1) ** 0.8
+        popularidad /= popularidad.sum()
+        por_usuario = generador.poisson(options['interacciones'], usuarios) + 1
+        filas = np.repeat(np.arange(usuarios), por_usuario)
+        columnas = generador.choice(productos, size=len(filas), p=popularidad)
+        pesos = np.log1p(generador.choice([1, 2, 3, 5], size=len(filas), p=[0.7, 0.1, 0.15, 0.05]))
+
+        inicio = time.perf_counter()
+        matriz = MatrizDispersa.desde_coordenadas(filas, columnas, pesos, (usuarios, productos))
+        construccion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        vecinos_usuarios = vecinos_coseno(matriz, options['k'], options['bloque'])
+        tiempo_usuarios = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        vecinos_productos = vecinos_coseno(matriz.transpuesta(), options['k'], options['bloque'])
+        tiempo_productos = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f'{usuarios} usuarios x {productos} productos, {len(matriz.data)} interacciones distintas, '
+            f'k={options["k"]}, bloque={options["bloque"]}'
+        )
+        self.stdout.write(f"{'etapa':<34} {'seg':>8} {'filas guardadas':>16}")
+        self.stdout.write(f"{'matriz CSR':<34} {construccion:>8.2f}")
+        self.stdout.write(
+            f"{'top-k usuarios (coseno)':<34} {tiempo_usuarios:>8.2f} {int((vecinos_usuarios[0] >= 0).sum()):>16}"
+        )
+        self.stdout.write(
+            f"{'top-k productos (coseno)':<34} {tiempo_productos:>8.2f} {int((vecinos_productos[0] >= 0).sum()):>16}"
+        )
+
+        # Cálculo por pares: se mide una muestra y se extrapola a todos los pares
+        perfiles = []
+        for fila in range(usuarios):
+            vistos = matriz.indices[matriz.indptr[fila]:matriz.indptr[fila + 1]]
+            perfiles.append({
+                'categorias': set((vistos % 50).tolist()),
+                'productos': set(vistos[-50:].tolist()),
+                'precio': int(generador.integers(1000, 50000)),
+                'actividad': int(generador.integers(0, 100)),
+            })
+        azar = random.Random(0)
+        muestra = [(azar.randrange(usuarios), azar.randrange(usuarios)) for _ in range(options['pares'])]
+        inicio = time.perf_counter()
+        for a, b in muestra:
+            similitud_por_pares(perfiles[a], perfiles[b])
+        por_par = (time.perf_counter() - inicio) / len(muestra)
+        pares = usuarios * (usuarios - 1) // 2
+        self.stdout.write(
+            f"{'por pares (estimado)':<34} {por_par * pares:>8.0f} {pares:>16}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {por_par * pares / (construccion + tiempo_usuarios):.0f}x más rápido el top-k de usuarios'
+        ))
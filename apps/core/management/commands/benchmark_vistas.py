@@ -0,0 +1,97 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.core.models import Categoria, Subcategoria, Producto
+from apps.core.contador_vistas import ContadorVistas
+
+# Ejecutar el comando python manage.py benchmark_vistas [--hilos 8] [--vistas 4000] [--productos 20]
+
+
+class ContadorMedido(ContadorVistas):
+    """ContadorVistas que cuenta los UPDATE que ejecuta."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.escrituras = 0
+
+    def vaciar(self):
+        lotes = super().vaciar()
+        self.escrituras += lotes
+        return lotes
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara, con hilos concurrentes, el contador de vistas anterior (leer, sumar y guardar) '
+        'con el contador diferido: incrementos perdidos y escrituras a la base de datos (borra sus datos al terminar)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--vistas', type=int, default=4000, help='Vistas totales a registrar')
+        parser.add_argument('--productos', type=int, default=20)
+
+    def handle(self, *args, **options):
+        categoria = Categoria.objects.create(nombre_categoria='Benchmark vistas')
+        subcategoria = Subcategoria.objects.create(nombre_subcategoria='Benchmark vistas', categoria=categoria)
+        ids = [
+            Producto.objects.create(nombre_producto=f'Benchmark vistas {i}', subcategoria=subcategoria).pk
+            for i in range(options['productos'])
+        ]
+        try:
+            self.stdout.write(
+                f"{'modo':>10} {'vistas':>8} {'perdidas':>9} {'errores':>8} {'UPDATE':>8} {'seg':>7} {'UPDATE/1000 vistas':>19}"
+            )
+            self.medir('directo', ids, options, self.vista_directa)
+            contador = ContadorMedido()
+            self.medir('diferido', ids, options, lambda producto_id: contador.registrar(producto_id),
+                       al_terminar=contador.vaciar, escrituras=lambda: contador.escrituras)
+        finally:
+            Producto.objects.filter(pk__in=ids).delete()
+            subcategoria.delete()
+            categoria.delete()
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark terminado (datos eliminados)'))
+
+    @staticmethod
+    def vista_directa(producto_id):
+        # Implementación anterior de Producto.incrementar_vistas
+        producto = Producto.objects.get(pk=producto_id)
+        producto.vistas += 1
+        producto.save(update_fields=['vistas'])
+
+    def medir(self, modo, ids, options, registrar, al_terminar=None, escrituras=None):
+        Producto.objects.filter(pk__in=ids).update(vistas=0)
+        hilos = options['hilos']
+        por_hilo = options['vistas'] // hilos
+        errores = []
+        barrera = threading.Barrier(hilos)
+
+        def trabajar(numero):
+            try:
+                barrera.wait()
+                for i in range(por_hilo):
+                    try:
+                        registrar(ids[(numero + i) % len(ids)])
+                    except Exception as e:
+                        errores.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trabajar, args=(n,)) for n in range(hilos)]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if al_terminar:
+            al_terminar()
+        duracion = time.perf_counter() - inicio
+
+        total = por_hilo * hilos
+        guardadas = sum(Producto.objects.filter(pk__in=ids).values_list('vistas', flat=True))
+        updates = escrituras() if escrituras else total - len(errores)
+        self.stdout.write(
+            f"{modo:>10} {total:>8} {total - guardadas:>9} {len(errores):>8} {updates:>8} "
+            f"{duracion:>7.2f} {updates * 1000 / total:>19.1f}"
+        )
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.core.recomendaciones import DIAS_HISTORIAL, K_VECINOS, TAMANO_BLOQUE, calcular_similitudes
+
+# Ejecutar el comando python manage.py calcular_similitudes [--k 20] [--dias 180]
+
+class Command(BaseCommand):
+    help = 'Recalcula los vecinos más parecidos de cada usuario y de cada producto (recomendaciones)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=K_VECINOS, help='Vecinos que se guardan por usuario/producto')
+        parser.add_argument('--dias', type=int, default=DIAS_HISTORIAL, help='Días de historial considerados')
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help='Filas por bloque de multiplicación')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        usuarios, productos = calcular_similitudes(options['k'], options['dias'], options['bloque'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {usuarios} similitudes de usuarios y {productos} de productos en {time.perf_counter() - inicio:.1f}s'
+        ))
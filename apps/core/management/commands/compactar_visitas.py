@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.estadisticas_visitas import compactar
+
+# Ejecutar el comando python manage.py compactar_visitas [--dias 90]
+
+class Command(BaseCommand):
+    help = 'Consolida y elimina las visitas crudas más antiguas que la retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=settings.VISITAS_RETENCION_DIAS,
+            help='Días de visitas crudas que se conservan (VISITAS_RETENCION_DIAS)'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1:
+            raise CommandError('--dias debe ser al menos 1')
+        eliminadas = compactar(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {eliminadas} visitas crudas eliminadas'))
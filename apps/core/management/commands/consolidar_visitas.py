@@ -0,0 +1,16 @@
+import datetime
+from django.core.management.base import BaseCommand
+from apps.core.estadisticas_visitas import consolidar
+
+# Ejecutar el comando python manage.py consolidar_visitas [--desde 2025-01-01] [--hasta 2025-01-31]
+
+class Command(BaseCommand):
+    help = 'Recalcula las visitas por ruta y hora/día desde las visitas crudas (por defecto ayer y hoy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=datetime.date.fromisoformat, help='Primer día a consolidar (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=datetime.date.fromisoformat, help='Último día a consolidar (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        horas, dias = consolidar(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {horas} filas por hora y {dias} filas por día consolidadas'))
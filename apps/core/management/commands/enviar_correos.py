@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.core.correos import enviar_pendientes
+
+# Ejecutar el comando python manage.py enviar_correos [--continuo] [--lote 50]
+
+class Command(BaseCommand):
+    help = 'Envía los correos pendientes de la bandeja de salida, reintentando los fallidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=50, help='Correos que se reclaman por vuelta')
+        parser.add_argument('--continuo', action='store_true', help='Seguir esperando correos nuevos')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos de espera sin trabajo (modo continuo)')
+
+    def handle(self, *args, **options):
+        total_enviados = total_fallidos = 0
+        try:
+            while True:
+                enviados, fallidos = enviar_pendientes(options['lote'])
+                if not enviados and not fallidos:
+                    if not options['continuo']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+                total_enviados += enviados
+                total_fallidos += fallidos
+                self.stdout.write(f'Enviados: {total_enviados} | Con error: {total_fallidos}')
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {total_enviados} correos enviados, {total_fallidos} con error'))
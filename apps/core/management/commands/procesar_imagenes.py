@@ -0,0 +1,58 @@
+import multiprocessing
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from apps.core.models import ImagenProducto, EstadoProcesamientoImagen
+from apps.core.imagenes import reclamar_pendientes, procesar_imagen, inicializar_proceso
+
+# Ejecutar el comando python manage.py procesar_imagenes --procesos 4 [--continuo] [--reencolar]
+
+class Command(BaseCommand):
+    help = 'Procesa en segundo plano las imágenes de productos pendientes (redimensiona y convierte)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1, help='Cantidad de procesos de trabajo')
+        parser.add_argument('--lote', type=int, default=20, help='Imágenes que se reclaman por vuelta')
+        parser.add_argument('--continuo', action='store_true', help='Seguir esperando imágenes nuevas')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera sin trabajo (modo continuo)')
+        parser.add_argument('--reencolar', action='store_true',
+                            help='Volver a encolar las imágenes listas que aún no tienen variantes')
+
+    def handle(self, *args, **options):
+        if options['reencolar']:
+            reencoladas = ImagenProducto.objects.filter(
+                estado_procesamiento=EstadoProcesamientoImagen.LISTO, variantes={}
+            ).update(estado_procesamiento=EstadoProcesamientoImagen.PENDIENTE)
+            self.stdout.write(f'Reencoladas: {reencoladas}')
+        
+        procesos = max(1, options['procesos'])
+        pool = None
+        if procesos > 1:
+            # Los hijos no deben heredar las conexiones abiertas del padre
+            connections.close_all()
+            pool = multiprocessing.Pool(procesos, initializer=inicializar_proceso)
+        procesar = pool.imap_unordered if pool else map
+
+        listas = errores = 0
+        try:
+            while True:
+                ids = reclamar_pendientes(options['lote'] * procesos)
+                if not ids:
+                    if not options['continuo']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+                for ok in procesar(procesar_imagen, ids):
+                    if ok:
+                        listas += 1
+                    else:
+                        errores += 1
+                self.stdout.write(f'Procesadas: {listas} | Con error: {errores}')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {listas} imágenes procesadas, {errores} con error'))
@@ -0,0 +1,89 @@
+# core/metricas.py
+"""
+Métricas del panel de administración.
+
+Cada grupo de métricas ('productos', ...) se calcula con agregaciones
+condicionales (una consulta para todos los contadores del grupo) y se guarda en
+la caché con un TTL corto, bajo una versión propia del grupo. Las señales
+llaman a invalidar_metricas() al confirmarse las escrituras que lo afectan; el
+TTL cubre las que no pasan por señales (queryset.update()).
+"""
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Producto
+from .versiones import incrementar_version, version
+
+METRICAS_CACHE_TTL = 60
+
+
+def contadores(**filtros):
+    """{'nombre': Q(...)} -> agregados Count(filter=...) para un solo aggregate()/annotate()."""
+    return {nombre: Count('pk', filter=filtro) for nombre, filtro in filtros.items()}
+
+
+def _clave_version(grupo):
+    return f'metricas:{grupo}:version'
+
+
+def obtener_metricas(grupo, calcular, ttl=METRICAS_CACHE_TTL):
+    """Métricas del grupo desde la caché, o calculadas con `calcular()` y guardadas."""
+    clave = f'metricas:{grupo}:{version(_clave_version(grupo))}'
+    metricas = cache.get(clave)
+    if metricas is None:
+        metricas = calcular()
+        cache.set(clave, metricas, ttl)
+    return metricas
+
+
+def invalidar_metricas(grupo):
+    incrementar_version(_clave_version(grupo))
+
+
+# ===== PRODUCTOS =====
+
+def _filtros_productos():
+    return {
+        'total_productos': Q(),
+        'productos_activos': Q(activo=True),
+        'productos_sin_stock': Q(stock=0),
+        'productos_stock_bajo': Q(stock__lt=F('stock_minimo')),
+        'productos_destacados': Q(es_destacado=True),
+        'productos_en_oferta': Q(es_oferta=True),
+        'productos_novedades': Q(es_novedad=True),
+    }
+
+
+def _valor(expresion, filtro=None):
+    return Coalesce(Sum(expresion, filter=filtro), Value(0))
+
+
+def calcular_metricas_productos():
+    """Contadores y valores de inventario en una consulta y el desglose por categoría en otra."""
+    stock_bajo = Q(stock__lt=F('stock_minimo'))
+    metricas = Producto.objects.aggregate(
+        **contadores(**_filtros_productos()),
+        # Valor del stock a precio neto
+        valor_inventario=_valor(F('stock') * F('precio_neto')),
+        # Costo (a precio neto) de reponer hasta el stock mínimo los productos bajo él
+        valor_reposicion=_valor((F('stock_minimo') - F('stock')) * F('precio_neto'), stock_bajo),
+    )
+    metricas['por_categoria'] = list(
+        Producto.objects.order_by()
+        .values(
+            categoria_id=F('subcategoria__categoria_id'),
+            nombre_categoria=F('subcategoria__categoria__nombre_categoria'),
+        )
+        .annotate(**contadores(
+            total_productos=Q(),
+            productos_activos=Q(activo=True),
+            productos_sin_stock=Q(stock=0),
+            productos_stock_bajo=stock_bajo,
+        ))
+        .order_by('nombre_categoria')
+    )
+    return metricas
+
+
+def metricas_productos():
+    return obtener_metricas('productos', calcular_metricas_productos)
@@ -0,0 +1,25 @@
+# core/middleware.py
+from django.conf import settings
+from . import visitas
+
+
+class RegistroVisitasMiddleware:
+    """Registra cada petición en VisitaPagina a través del búfer de core/visitas.py."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rutas_excluidas = tuple(ruta for ruta in (settings.STATIC_URL, settings.MEDIA_URL) if ruta)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            settings.REGISTRO_VISITAS
+            and request.method != 'OPTIONS'
+            and not request.path.startswith(self.rutas_excluidas)
+        ):
+            visitas.registro_visitas.registrar(
+                request.META.get('REMOTE_ADDR') or '0.0.0.0',
+                request.META.get('HTTP_USER_AGENT', ''),
+                request.path
+            )
+        return response
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_producto_precio_por_mayor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='error_procesamiento',
+            field=models.TextField(blank=True, null=True),
+        ),
+        # Las imágenes existentes ya se están sirviendo: quedan como LISTO
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('LISTO', 'Listo'), ('ERROR', 'Error')], db_index=True, default='LISTO', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='imagenproducto',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('LISTO', 'Listo'), ('ERROR', 'Error')], db_index=True, default='PENDIENTE', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='fecha_inicio_procesamiento',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
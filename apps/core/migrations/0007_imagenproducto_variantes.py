@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_imagenproducto_estado_procesamiento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
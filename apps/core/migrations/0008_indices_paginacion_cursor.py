@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_imagenproducto_variantes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['fecha_creacion', 'cliente_id'], name='clientes_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre_producto', 'producto_id'], name='productos_nombre_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_creacion', 'producto_id'], name='productos_fecha_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# Copia de apps/core/busqueda.py al crear esta migración: la migración no debe
+# cambiar si ese módulo cambia. Un documento distinto requiere una migración nueva.
+CONFIGURACION_BUSQUEDA = 'gyg_es'
+CAMPOS_BUSQUEDA = (
+    ('nombre_producto', 'A'),
+    ('sku', 'A'),
+    ('descripcion_corta', 'B'),
+    ('detalle_producto', 'C'),
+)
+
+# Sólo PostgreSQL: en otros motores apps/core/busqueda.py usa un índice en memoria.
+# Crear las extensiones requiere un rol con permiso CREATE en la base de datos.
+CREAR_CONFIGURACION = f"""
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{CONFIGURACION_BUSQUEDA}') THEN
+        CREATE TEXT SEARCH CONFIGURATION {CONFIGURACION_BUSQUEDA} (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION {CONFIGURACION_BUSQUEDA}
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+"""
+
+
+def documento_busqueda():
+    from django.contrib.postgres.search import SearchVector
+    vectores = [
+        SearchVector(campo, weight=peso, config=CONFIGURACION_BUSQUEDA)
+        for campo, peso in CAMPOS_BUSQUEDA
+    ]
+    documento = vectores[0]
+    for vector in vectores[1:]:
+        documento = documento + vector
+    return documento
+
+
+def indices_busqueda():
+    from django.contrib.postgres.indexes import GinIndex
+    return [
+        GinIndex(documento_busqueda(), name='productos_busqueda_idx'),
+        GinIndex(fields=['nombre_producto'], opclasses=['gin_trgm_ops'], name='productos_nombre_trgm_idx'),
+    ]
+
+
+def crear_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Producto = apps.get_model('core', 'Producto')
+    schema_editor.execute(CREAR_CONFIGURACION)
+    for indice in indices_busqueda():
+        schema_editor.add_index(Producto, indice)
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Producto = apps.get_model('core', 'Producto')
+    for indice in indices_busqueda():
+        schema_editor.remove_index(Producto, indice)
+    schema_editor.execute(f'DROP TEXT SEARCH CONFIGURATION IF EXISTS {CONFIGURACION_BUSQUEDA}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_indices_paginacion_cursor'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:31
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSalida',
+            fields=[
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True)),
+                ('correo_id', models.AutoField(primary_key=True, serialize=False)),
+                ('plantilla', models.CharField(max_length=100)),
+                ('contexto', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('asunto', models.CharField(max_length=255)),
+                ('destinatarios', models.JSONField(default=list)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIANDO', 'Enviando'), ('ENVIADO', 'Enviado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=10)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fecha_inicio_envio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_error', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'correos_salida',
+                'ordering': ['correo_id'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='correo_estado_proximo_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:42
+
+import hashlib
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mover_user_agents(apps, schema_editor):
+    """Pasa el user agent de cada visita existente a la tabla agentes_usuario."""
+    AgenteUsuario = apps.get_model('core', 'AgenteUsuario')
+    VisitaPagina = apps.get_model('core', 'VisitaPagina')
+    for user_agent in VisitaPagina.objects.order_by().values_list('user_agent', flat=True).distinct().iterator():
+        agente, _ = AgenteUsuario.objects.get_or_create(
+            hash_user_agent=hashlib.sha256(user_agent.encode()).hexdigest(),
+            defaults={'user_agent': user_agent}
+        )
+        VisitaPagina.objects.filter(user_agent=user_agent).update(agente_usuario=agente)
+
+
+def restaurar_user_agents(apps, schema_editor):
+    AgenteUsuario = apps.get_model('core', 'AgenteUsuario')
+    VisitaPagina = apps.get_model('core', 'VisitaPagina')
+    for agente in AgenteUsuario.objects.iterator():
+        VisitaPagina.objects.filter(agente_usuario=agente).update(user_agent=agente.user_agent)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_correos_salida'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgenteUsuario',
+            fields=[
+                ('agente_usuario_id', models.AutoField(primary_key=True, serialize=False)),
+                ('hash_user_agent', models.CharField(max_length=64, unique=True)),
+                ('user_agent', models.TextField()),
+            ],
+            options={
+                'db_table': 'agentes_usuario',
+            },
+        ),
+        migrations.AddField(
+            model_name='visitapagina',
+            name='agente_usuario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.agenteusuario'),
+        ),
+        migrations.AlterField(
+            model_name='visitapagina',
+            name='user_agent',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(mover_user_agents, restaurar_user_agents),
+        migrations.RemoveField(
+            model_name='visitapagina',
+            name='user_agent',
+        ),
+        migrations.AlterField(
+            model_name='visitapagina',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_agentes_usuario_visitas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitaRutaDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('ruta', models.CharField(max_length=200)),
+                ('visitas', models.IntegerField(default=0)),
+                ('visitantes', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'visitas_ruta_dia',
+                'ordering': ['fecha', 'ruta'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitaRutaHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField()),
+                ('ruta', models.CharField(max_length=200)),
+                ('visitas', models.IntegerField(default=0)),
+                ('visitantes', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'visitas_ruta_hora',
+                'ordering': ['hora', 'ruta'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='visitapagina',
+            index=models.Index(fields=['fecha'], name='visita_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitapagina',
+            index=models.Index(fields=['ruta', 'fecha'], name='visita_ruta_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitarutadia',
+            constraint=models.UniqueConstraint(fields=('fecha', 'ruta'), name='visita_ruta_dia_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitarutahora',
+            constraint=models.UniqueConstraint(fields=('hora', 'ruta'), name='visita_ruta_hora_unica'),
+        ),
+    ]
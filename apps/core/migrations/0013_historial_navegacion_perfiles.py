@@ -0,0 +1,86 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_visitas_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CursorProcesamiento',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'cursores_procesamiento',
+            },
+        ),
+        migrations.CreateModel(
+            name='PerfilComportamiento',
+            fields=[
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True)),
+                ('perfil_id', models.AutoField(primary_key=True, serialize=False)),
+                ('categorias_favoritas', models.JSONField(default=dict, help_text="{'categoria_id': count, ...}")),
+                ('productos_vistos_recientes', models.JSONField(default=list, help_text='[producto_id1, producto_id2, ...] últimos 50, el más reciente primero')),
+                ('precio_minimo_promedio', models.IntegerField(default=0)),
+                ('precio_maximo_promedio', models.IntegerField(default=999999)),
+                ('precio_promedio_productos_vistos', models.IntegerField(default=0)),
+                ('precio_minimo_visto', models.IntegerField(blank=True, null=True)),
+                ('precio_maximo_visto', models.IntegerField(blank=True, null=True)),
+                ('suma_precios_vistos', models.BigIntegerField(default=0)),
+                ('cantidad_precios_vistos', models.IntegerField(default=0)),
+                ('hora_preferida_navegacion', models.IntegerField(blank=True, help_text='Hora del día (0-23) con más actividad', null=True)),
+                ('dia_semana_preferido', models.IntegerField(blank=True, help_text='Día de la semana (0=Lunes, 6=Domingo)', null=True)),
+                ('actividad_por_hora', models.JSONField(default=list, help_text='Interacciones por hora del día (24)')),
+                ('actividad_por_dia', models.JSONField(default=list, help_text='Interacciones por día de la semana (7)')),
+                ('total_productos_vistos', models.IntegerField(default=0)),
+                ('total_busquedas', models.IntegerField(default=0)),
+                ('total_items_carrito', models.IntegerField(default=0)),
+                ('total_compras', models.IntegerField(default=0)),
+                ('tiempo_total_navegacion_segundos', models.IntegerField(default=0)),
+                ('ultima_visita', models.DateTimeField(blank=True, null=True)),
+                ('productos_comprados_ids', models.JSONField(default=list, help_text='IDs de productos que ha comprado')),
+                ('score_actividad', models.IntegerField(default=0, help_text='Score calculado basado en interacciones')),
+                ('user_profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='perfil_comportamiento', to='core.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Perfil de Comportamiento',
+                'verbose_name_plural': 'Perfiles de Comportamiento',
+                'db_table': 'perfiles_comportamiento',
+            },
+        ),
+        migrations.CreateModel(
+            name='HistorialNavegacion',
+            fields=[
+                ('historial_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('sesion_id', models.CharField(help_text='ID de sesión para usuarios no autenticados', max_length=100)),
+                ('tipo_interaccion', models.CharField(choices=[('product_view', 'Vista de producto'), ('category_visit', 'Visita a categoría'), ('search', 'Búsqueda'), ('add_to_cart', 'Agregar al carrito'), ('remove_from_cart', 'Quitar del carrito'), ('purchase', 'Compra'), ('wishlist_add', 'Agregar a favoritos'), ('scroll', 'Scroll en página'), ('time_on_page', 'Tiempo en página')], max_length=30)),
+                ('datos_interaccion', models.JSONField(blank=True, help_text='Datos específicos: query, origen, etc.', null=True)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('duracion_segundos', models.IntegerField(blank=True, help_text='Duración de la interacción en segundos', null=True)),
+                ('agente_usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.agenteusuario')),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historial_visitas', to='core.categoria')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historial_vistas', to='core.producto')),
+                ('user_profile', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='historial_navegacion', to='core.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Historial de Navegación',
+                'verbose_name_plural': 'Historial de Navegación',
+                'db_table': 'historial_navegacion',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['user_profile', '-timestamp'], name='historial_perfil_idx'), models.Index(fields=['sesion_id', '-timestamp'], name='historial_sesion_idx'), models.Index(fields=['tipo_interaccion', '-timestamp'], name='historial_tipo_idx'), models.Index(fields=['producto', '-timestamp'], name='historial_producto_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_historial_navegacion_perfiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilitudProductos',
+            fields=[
+                ('similitud_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('score_similitud', models.FloatField(default=0, help_text='Coseno x 100')),
+                ('usuarios_comunes', models.IntegerField(default=0)),
+                ('fecha_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similitudes_como_a', to='core.producto')),
+                ('producto_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similitudes_como_b', to='core.producto')),
+            ],
+            options={
+                'db_table': 'similitudes_productos',
+                'indexes': [models.Index(fields=['producto_a', '-score_similitud'], name='similitud_producto_idx')],
+                'unique_together': {('producto_a', 'producto_b')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilitudUsuarios',
+            fields=[
+                ('similitud_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('score_similitud', models.FloatField(default=0, help_text='Coseno entre las interacciones de ambos usuarios x 100')),
+                ('productos_comunes', models.IntegerField(default=0)),
+                ('fecha_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user_profile_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similitudes_como_a', to='core.userprofile')),
+                ('user_profile_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similitudes_como_b', to='core.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Similitud entre Usuarios',
+                'verbose_name_plural': 'Similitudes entre Usuarios',
+                'db_table': 'similitudes_usuarios',
+                'indexes': [models.Index(fields=['user_profile_a', '-score_similitud'], name='similitud_usuario_idx')],
+                'unique_together': {('user_profile_a', 'user_profile_b')},
+            },
+        ),
+    ]
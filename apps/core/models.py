@@ -2,11 +2,12 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.urls import reverse
-from PIL import Image
+from PIL import Image, features
 import os
 from django.conf import settings
 import io
 from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 class BaseModel(models.Model):
@@ -241,18 +242,77 @@ class RegistroPendiente(models.Model):
     class Meta:
         db_table = 'registros_pendiente'
     
+class AgenteUsuario(models.Model):
+    """User agents distintos: cada visita guarda sólo la referencia."""
+    agente_usuario_id = models.AutoField(primary_key=True)
+    # sha256 del texto: un índice único sobre el TextField no es práctico
+    hash_user_agent = models.CharField(max_length=64, unique=True)
+    user_agent = models.TextField()
+
+    def __str__(self):
+        return self.user_agent[:80]
+
+    class Meta:
+        db_table = 'agentes_usuario'
+
 class VisitaPagina(models.Model):
+    """
+    Se registran en lote desde core/visitas.py (RegistroVisitasMiddleware). Se
+    conservan VISITAS_RETENCION_DIAS días: las estadísticas se leen de
+    VisitaRutaHora/VisitaRutaDia (ver core/estadisticas_visitas.py).
+    """
     visita_pagina_id = models.AutoField(primary_key=True)
     ip = models.GenericIPAddressField()
-    user_agent = models.TextField()
+    agente_usuario = models.ForeignKey(AgenteUsuario, on_delete=models.PROTECT, null=True, blank=True)
     ruta = models.CharField(max_length=200)
-    fecha = models.DateTimeField(auto_now_add=True)
+    # Momento de la petición, no del guardado en lote
+    fecha = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.ruta} - {self.fecha}"
     
     class Meta:
         db_table = 'visitas_pagina'
+        indexes = [
+            models.Index(fields=['fecha'], name='visita_fecha_idx'),
+            models.Index(fields=['ruta', 'fecha'], name='visita_ruta_fecha_idx'),
+        ]
+
+class VisitaRutaHora(models.Model):
+    """Visitas por ruta y hora, consolidadas desde visitas_pagina."""
+    hora = models.DateTimeField()
+    ruta = models.CharField(max_length=200)
+    visitas = models.IntegerField(default=0)
+    # IPs distintas en la hora
+    visitantes = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'visitas_ruta_hora'
+        ordering = ['hora', 'ruta']
+        constraints = [
+            models.UniqueConstraint(fields=['hora', 'ruta'], name='visita_ruta_hora_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.hora} {self.ruta}: {self.visitas}"
+
+class VisitaRutaDia(models.Model):
+    """Visitas por ruta y día, consolidadas desde visitas_pagina."""
+    fecha = models.DateField()
+    ruta = models.CharField(max_length=200)
+    visitas = models.IntegerField(default=0)
+    # IPs distintas en el día (no es la suma de las horas)
+    visitantes = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'visitas_ruta_dia'
+        ordering = ['fecha', 'ruta']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'ruta'], name='visita_ruta_dia_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.ruta}: {self.visitas}"
 
 class Cargo(BaseModel):
     cargo_id = models.AutoField(primary_key=True)
@@ -342,6 +402,9 @@ class Cliente(BaseModel):
     ultima_interaccion = models.DateTimeField(auto_now=True)
     class Meta:
         db_table = 'clientes'
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'cliente_id'], name='clientes_cursor_idx'),
+        ]
 
     def __str__(self):
         return f'Cliente: {self.nombre_cliente or self.telefono}'
@@ -633,6 +696,11 @@ class Producto(BaseModel):
     class Meta:
         db_table = 'productos'
         ordering = ['-es_destacado', '-es_novedad', 'nombre_producto']
+        indexes = [
+            # Paginación por cursor: (nombre_producto, pk) y (-fecha_creacion, -pk)
+            models.Index(fields=['nombre_producto', 'producto_id'], name='productos_nombre_cursor_idx'),
+            models.Index(fields=['fecha_creacion', 'producto_id'], name='productos_fecha_cursor_idx'),
+        ]
 
     def __str__(self):
         return self.nombre_producto
@@ -651,9 +719,13 @@ class Producto(BaseModel):
         return self.stock >= cantidad
 
     def incrementar_vistas(self):
-        """Incrementa el contador de vistas"""
-        self.vistas += 1
-        self.save(update_fields=['vistas'])
+        """
+        Registra una vista. Se escribe en forma diferida y en lote (ver
+        core/contador_vistas.py); aquí sólo se actualiza el valor en memoria.
+        """
+        from .contador_vistas import registrar_vista
+        registrar_vista(self.pk)
+        self.vistas = (self.vistas or 0) + 1
     
     # ===== MÉTODOS PARA TERMINACIONES =====
     
@@ -732,135 +804,12 @@ class Producto(BaseModel):
         Returns:
             dict con desglose de precios y validaciones
         """
-        try:
-            # Obtener terminación (material con precio por 100cm)
-            try:
-                terminacion = self.terminaciones.get(
-                    terminacion_id=terminacion_id,
-                    activo=True
-                )
-            except Terminacion.DoesNotExist:
-                return {
-                    'error': True,
-                    'mensaje': f'Terminación con ID {terminacion_id} no encontrada o inactiva'
-                }
-            
-            # Obtener tiempo de producción (factor multiplicador)
-            try:
-                tiempo = self.tiempos_produccion.get(
-                    tiempo_produccion_id=tiempo_produccion_id,
-                    activo=True
-                )
-            except TiempoProduccion.DoesNotExist:
-                return {
-                    'error': True,
-                    'mensaje': f'Tiempo de producción con ID {tiempo_produccion_id} no encontrado o inactivo'
-                }
-            
-            # Validar dimensiones
-            if ancho_cm <= 0 or alto_cm <= 0:
-                return {
-                    'error': True,
-                    'mensaje': 'Las dimensiones deben ser mayores a 0'
-                }
-            
-            # Validar cantidad
-            if cantidad <= 0:
-                return {
-                    'error': True,
-                    'mensaje': 'La cantidad debe ser mayor a 0'
-                }
-            
-            # Validar stock
-            if not self.tiene_stock(cantidad):
-                return {
-                    'error': True,
-                    'mensaje': f'Stock insuficiente. Disponibles: {self.stock}'
-                }
-            
-            # FÓRMULA: (ancho × alto × precio_material × precio_tiempo) / 10000
-            # donde precio_material es por 100cm (no por m²)
-            # precio_unitario = (ancho_cm * alto_cm * terminacion.precio * tiempo.precio) // 10000
-            
-            # # Si el resultado es 0 (porque es muy pequeño), al menos cobrar 1000 (ajustable)
-            # if precio_unitario < 1000:
-            #     precio_unitario = 1000
-            
-            # # Precio total por cantidad
-            # precio_total = precio_unitario * cantidad
-            
-            # # Validar acabados si se proporcionan
-            # costo_acabados = 0
-            # acabados_info = []
-            # Calcular costo de acabados (multiplicador acumulado)
-            costo_acabados = 1  # Factor neutro si no hay acabados
-            acabados_info = []
-
-            if acabado_ids:
-                acabados_disponibles = self.producto_acabados.filter(
-                    acabado_id__in=acabado_ids,
-                    acabado__activo=True
-                ).select_related('acabado')
-                
-                if acabados_disponibles.count() != len(acabado_ids):
-                    return {
-                        'error': True,
-                        'mensaje': 'Uno o más acabados no válidos o inactivos'
-                    }
-                
-                for pa in acabados_disponibles:
-                    # Multiplicar el costo adicional del acabado
-                    costo_acabados *= pa.acabado.costo_adicional
-                    acabados_info.append({
-                        'acabado_id': pa.acabado.acabado_id,
-                        'nombre_acabado': pa.acabado.nombre_acabado,
-                        'costo_adicional': pa.acabado.costo_adicional
-                    })
-            
-            # FÓRMULA CORRECTA: ((alto × ancho × acabado × terminacion) / 10000) + tiempo_produccion
-            precio_base = int((ancho_cm * alto_cm * costo_acabados * terminacion.precio) / 10000)
-            precio_unitario = precio_base + tiempo.precio
-            
-            # Precio total por cantidad
-            precio_total = precio_unitario * cantidad
-            
-            return {
-                'error': False,
-                'precio_unitario': precio_unitario,
-                'precio_total': precio_total,
-                'cantidad': cantidad,
-                'ancho_cm': ancho_cm,
-                'alto_cm': alto_cm,
-                'terminacion': {
-                    'terminacion_id': terminacion.terminacion_id,
-                    'nombre_terminacion': terminacion.nombre_terminacion,
-                    'precio_por_100cm': terminacion.precio
-                },
-                'tiempo_produccion': {
-                    'tiempo_produccion_id': tiempo.tiempo_produccion_id,
-                    'nombre_tiempo': tiempo.nombre_tiempo,
-                    'dias_estimados': tiempo.dias_estimados,
-                    'factor_precio': float(tiempo.precio)
-                },
-                'acabados': acabados_info,
-                'desglose': {
-                    'base_calculo': f'(({ancho_cm} × {alto_cm} × {costo_acabados} × {terminacion.precio}) / 10000) + {tiempo.precio} = {precio_unitario}',
-                    'total': f'{precio_unitario} × {cantidad} = {precio_total}',
-                    'componentes': {
-                        'area_cm2': ancho_cm * alto_cm,
-                        'multiplicador_acabados': costo_acabados,
-                        'precio_terminacion': terminacion.precio,
-                        'precio_base': precio_base,
-                        'costo_tiempo': tiempo.precio
-                    }
-                }
-            }
-        
-        except Exception as e:
-            return {
-                'error': True,
-                'mensaje': f'Error al calcular precio: {str(e)}'
-            }
+        # La fórmula vive en HojaPrecios (core/precios.py), compartida con la cotización en caché
+        from .precios import HojaPrecios
+        return HojaPrecios.desde_producto(self).calcular(
+            ancho_cm, alto_cm, terminacion_id, tiempo_produccion_id,
+            cantidad=cantidad, acabado_ids=acabado_ids
+        )
     
     def tiene_personalizaciones(self):
         """Verifica si el producto tiene opciones de personalización."""
@@ -885,6 +834,22 @@ def producto_imagen_path(instance, filename):
     # Se renombrará en el método save()
     return f'productos/{producto_id}/temp_{filename}'
 
+# Anchos máximos de las variantes de imagen (thumb: miniaturas, card: listados, detail: ficha)
+VARIANTES_IMAGEN = {'thumb': 240, 'card': 480, 'detail': 1200}
+
+def formatos_variantes():
+    """Formatos en que se codifica cada variante; AVIF solo si Pillow tiene soporte."""
+    formatos = {'webp': {'quality': 80, 'method': 4}}
+    if features.check('avif'):
+        formatos['avif'] = {'quality': 55}
+    return formatos
+
+class EstadoProcesamientoImagen(models.TextChoices):
+    PENDIENTE = 'PENDIENTE', 'Pendiente'
+    PROCESANDO = 'PROCESANDO', 'Procesando'
+    LISTO = 'LISTO', 'Listo'
+    ERROR = 'ERROR', 'Error'
+
 class ImagenProducto(BaseModel):
     imagen_producto_id = models.AutoField(primary_key=True)
     imagen = models.ImageField(upload_to=producto_imagen_path)
@@ -892,6 +857,17 @@ class ImagenProducto(BaseModel):
     es_principal = models.BooleanField(default=False)
     orden = models.PositiveIntegerField(default=0)
     alt_text = models.CharField(max_length=200, null=True, blank=True)
+    # Procesamiento en segundo plano (python manage.py procesar_imagenes)
+    estado_procesamiento = models.CharField(
+        max_length=12,
+        choices=EstadoProcesamientoImagen.choices,
+        default=EstadoProcesamientoImagen.PENDIENTE,
+        db_index=True
+    )
+    fecha_inicio_procesamiento = models.DateTimeField(null=True, blank=True)
+    error_procesamiento = models.TextField(null=True, blank=True)
+    # {'thumb': {'ancho': 240, 'alto': 180, 'webp': 'productos/1/5_thumb.webp', 'avif': ...}, ...}
+    variantes = models.JSONField(default=dict, blank=True)
     
     class Meta:
         db_table = 'imagenes_productos'
@@ -900,343 +876,335 @@ class ImagenProducto(BaseModel):
     def __str__(self):
         return f"Imagen de {self.producto.nombre_producto}"
 
-    def save(self, *args, **kwargs):
-        es_nueva = self.pk is None
-        
-        # Guardar primero para obtener el PK
-        super(ImagenProducto, self).save(*args, **kwargs)
-        
-        # Si es nueva imagen y tiene archivo
-        if es_nueva and self.imagen:
-            try:
-                # Obtener ruta actual del archivo temporal
-                old_path = self.imagen.path
-                
-                if os.path.exists(old_path):
-                    # Procesar la imagen
-                    img = Image.open(old_path)
-                    
-                    # Convertir a RGB si es necesario
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                        img = background
-                    
-                    # Redimensionar
-                    max_size = (800, 600)
-                    img.thumbnail(max_size, Image.Lanczos)
-                    
-                    # Crear nueva ruta con el ID de la imagen
-                    producto_id = self.producto.producto_id
-                    new_filename = f'{self.pk}.png'
-                    new_path = os.path.join(settings.MEDIA_ROOT, f'productos/{producto_id}/{new_filename}')
-                    
-                    # Crear directorio si no existe
-                    os.makedirs(os.path.dirname(new_path), exist_ok=True)
-                    
-                    # Guardar imagen procesada con nuevo nombre
-                    img.save(new_path, 'PNG', optimize=True, quality=85)
-                    
-                    # Eliminar archivo temporal si tiene nombre diferente
-                    if old_path != new_path and os.path.exists(old_path):
-                        os.remove(old_path)
-                    
-                    # Actualizar el campo imagen con la nueva ruta
-                    self.imagen.name = f'productos/{producto_id}/{new_filename}'
-                    super(ImagenProducto, self).save(update_fields=['imagen'])
-                    
-            except Exception as e:
-                print(f"Error procesando imagen {self.pk}: {e}")
-
-# ============= MODELOS WEB 3.0+ (SISTEMA INTELIGENTE) =============
-
-# class HistorialNavegacion(BaseModel):
-#     """Registra cada interacción del usuario con el sitio."""
-#     historial_id = models.AutoField(primary_key=True)
-#     user_profile = models.ForeignKey(
-#         UserProfile, 
-#         on_delete=models.CASCADE, 
-#         related_name='historial_navegacion',
-#         null=True,
-#         blank=True
-#     )
-#     sesion_id = models.CharField(
-#         max_length=100, 
-#         help_text="ID de sesión para usuarios no autenticados"
-#     )
-    
-#     # Tipo de interacción
-#     TIPOS_INTERACCION = [
-#         ('product_view', 'Vista de producto'),
-#         ('category_visit', 'Visita a categoría'),
-#         ('search', 'Búsqueda'),
-#         ('add_to_cart', 'Agregar al carrito'),
-#         ('remove_from_cart', 'Quitar del carrito'),
-#         ('purchase', 'Compra'),
-#         ('wishlist_add', 'Agregar a favoritos'),
-#         ('scroll', 'Scroll en página'),
-#         ('time_on_page', 'Tiempo en página'),
-#     ]
-#     tipo_interaccion = models.CharField(max_length=30, choices=TIPOS_INTERACCION)
-    
-#     # Datos de la interacción (JSON flexible)
-#     datos_interaccion = models.JSONField(
-#         null=True,
-#         blank=True,
-#         help_text="Datos específicos: producto_id, categoria, query, tiempo, etc."
-#     )
-    
-#     # Producto relacionado (si aplica)
-#     producto = models.ForeignKey(
-#         Producto,
-#         on_delete=models.SET_NULL,
-#         null=True,
-#         blank=True,
-#         related_name='historial_vistas'
-#     )
-    
-#     # Categoría relacionada (si aplica)
-#     categoria = models.ForeignKey(
-#         Categoria,
-#         on_delete=models.SET_NULL,
-#         null=True,
-#         blank=True,
-#         related_name='historial_visitas'
-#     )
-    
-#     # Metadata
-#     timestamp = models.DateTimeField(auto_now_add=True)
-#     ip_address = models.GenericIPAddressField(null=True, blank=True)
-#     user_agent = models.TextField(null=True, blank=True)
-#     duracion_segundos = models.IntegerField(
-#         null=True, 
-#         blank=True,
-#         help_text="Duración de la interacción en segundos"
-#     )
-    
-#     class Meta:
-#         db_table = 'historial_navegacion'
-#         verbose_name = 'Historial de Navegación'
-#         verbose_name_plural = 'Historial de Navegación'
-#         ordering = ['-timestamp']
-#         indexes = [
-#             models.Index(fields=['user_profile', '-timestamp']),
-#             models.Index(fields=['sesion_id', '-timestamp']),
-#             models.Index(fields=['tipo_interaccion', '-timestamp']),
-#             models.Index(fields=['producto', '-timestamp']),
-#         ]
-
-#     def __str__(self):
-#         user_str = str(self.user_profile) if self.user_profile else f"Sesión: {self.sesion_id[:8]}"
-#         return f"{user_str} - {self.get_tipo_interaccion_display()} - {self.timestamp}"
-
-# class PerfilComportamiento(BaseModel):
-#     """Almacena el perfil de comportamiento agregado del usuario."""
-#     perfil_id = models.AutoField(primary_key=True)
-#     user_profile = models.OneToOneField(
-#         UserProfile,
-#         on_delete=models.CASCADE,
-#         related_name='perfil_comportamiento'
-#     )
-    
-#     # Categorías favoritas (JSON con contadores)
-#     categorias_favoritas = models.JSONField(
-#         default=dict,
-#         help_text="{'categoria_id': count, ...}"
-#     )
-    
-#     # Productos vistos recientemente (lista de IDs)
-#     productos_vistos_recientes = models.JSONField(
-#         default=list,
-#         help_text="[producto_id1, producto_id2, ...] últimos 50"
-#     )
-    
-#     # Rango de precios preferido
-#     precio_minimo_promedio = models.IntegerField(default=0)
-#     precio_maximo_promedio = models.IntegerField(default=999999)
-#     precio_promedio_productos_vistos = models.IntegerField(default=0)
-    
-#     # Patrones temporales
-#     hora_preferida_navegacion = models.IntegerField(
-#         null=True,
-#         blank=True,
-#         help_text="Hora del día (0-23) con más actividad"
-#     )
-#     dia_semana_preferido = models.IntegerField(
-#         null=True,
-#         blank=True,
-#         help_text="Día de la semana (0=Lunes, 6=Domingo)"
-#     )
-    
-#     # Métricas de engagement
-#     total_productos_vistos = models.IntegerField(default=0)
-#     total_busquedas = models.IntegerField(default=0)
-#     total_items_carrito = models.IntegerField(default=0)
-#     total_compras = models.IntegerField(default=0)
-#     tiempo_total_navegacion_segundos = models.IntegerField(default=0)
-    
-#     # Últimas interacciones
-#     ultima_visita = models.DateTimeField(auto_now=True)
-#     productos_comprados_ids = models.JSONField(
-#         default=list,
-#         help_text="IDs de productos que ha comprado"
-#     )
-    
-#     # Score de actividad (0-100)
-#     score_actividad = models.IntegerField(
-#         default=0,
-#         help_text="Score calculado basado en interacciones"
-#     )
-    
-#     class Meta:
-#         db_table = 'perfiles_comportamiento'
-#         verbose_name = 'Perfil de Comportamiento'
-#         verbose_name_plural = 'Perfiles de Comportamiento'
-
-#     def __str__(self):
-#         return f"Perfil de {self.user_profile}"
-    
-#     def actualizar_perfil(self):
-#         """
-#         Recalcula el perfil basado en el historial.
-#         Este método se debe llamar periódicamente o después de interacciones importantes.
-#         """
-#         from django.db.models import Count, Avg, Sum
-#         from collections import Counter
-        
-#         historial = HistorialNavegacion.objects.filter(
-#             user_profile=self.user_profile
-#         ).select_related('producto', 'categoria')
-        
-#         # Actualizar categorías favoritas
-#         categorias_counter = Counter()
-#         for item in historial.filter(categoria__isnull=False):
-#             categorias_counter[item.categoria.categoria_id] += 1
-#         self.categorias_favoritas = dict(categorias_counter.most_common(10))
-        
-#         # Productos vistos recientes (últimos 50)
-#         productos_recientes = historial.filter(
-#             tipo_interaccion='product_view',
-#             producto__isnull=False
-#         ).values_list('producto_id', flat=True)[:50]
-#         self.productos_vistos_recientes = list(productos_recientes)
-        
-#         # Calcular rango de precios
-#         productos_vistos = historial.filter(
-#             tipo_interaccion='product_view',
-#             producto__isnull=False
-#         ).values_list('producto__precio_venta', flat=True)
-        
-#         if productos_vistos:
-#             precios = [p for p in productos_vistos if p]
-#             if precios:
-#                 self.precio_minimo_promedio = int(min(precios) * 0.8)
-#                 self.precio_maximo_promedio = int(max(precios) * 1.2)
-#                 self.precio_promedio_productos_vistos = int(sum(precios) / len(precios))
-        
-#         # Métricas de engagement
-#         self.total_productos_vistos = historial.filter(tipo_interaccion='product_view').count()
-#         self.total_busquedas = historial.filter(tipo_interaccion='search').count()
-#         self.total_items_carrito = historial.filter(tipo_interaccion='add_to_cart').count()
+    def procesar(self):
+        """
+        Convierte a RGB y genera:
+        - productos/{producto_id}/{imagen_id}.png, máximo 800x600 (respaldo, campo 'imagen')
+        - una variante WebP (y AVIF si Pillow lo soporta) por cada ancho de VARIANTES_IMAGEN,
+          registradas en 'variantes'
+        Lo ejecuta el worker de imágenes (core/imagenes.py), no la solicitud que sube el archivo.
+        """
+        # Obtener ruta actual del archivo temporal
+        old_path = self.imagen.path
         
-#         # Calcular tiempo total
-#         tiempo_total = historial.aggregate(
-#             total=Sum('duracion_segundos')
-#         )['total'] or 0
-#         self.tiempo_total_navegacion_segundos = tiempo_total
+        img = Image.open(old_path)
         
-#         # Calcular score de actividad (algoritmo simple)
-#         self.score_actividad = min(100, (
-#             (self.total_productos_vistos * 2) +
-#             (self.total_busquedas * 3) +
-#             (self.total_items_carrito * 5) +
-#             (self.total_compras * 10)
-#         ))
+        # Convertir a RGB si es necesario
+        if img.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
         
-#         self.save()
-
-# class SimilitudUsuarios(BaseModel):
-#     """Almacena similitudes entre usuarios para collaborative filtering."""
-#     similitud_id = models.AutoField(primary_key=True)
-#     user_profile_a = models.ForeignKey(
-#         UserProfile,
-#         on_delete=models.CASCADE,
-#         related_name='similitudes_como_a'
-#     )
-#     user_profile_b = models.ForeignKey(
-#         UserProfile,
-#         on_delete=models.CASCADE,
-#         related_name='similitudes_como_b'
-#     )
-    
-#     # Score de similitud (0-100)
-#     score_similitud = models.FloatField(
-#         default=0,
-#         help_text="Score de similitud calculado (0-100)"
-#     )
-    
-#     # Factores de similitud
-#     categorias_comunes = models.IntegerField(default=0)
-#     productos_comunes_vistos = models.IntegerField(default=0)
-#     rango_precio_similar = models.BooleanField(default=False)
-    
-#     # Timestamp de cálculo
-#     fecha_calculo = models.DateTimeField(auto_now=True)
-    
-#     class Meta:
-#         db_table = 'similitudes_usuarios'
-#         verbose_name = 'Similitud entre Usuarios'
-#         verbose_name_plural = 'Similitudes entre Usuarios'
-#         unique_together = ['user_profile_a', 'user_profile_b']
-#         indexes = [
-#             models.Index(fields=['user_profile_a', '-score_similitud']),
-#             models.Index(fields=['score_similitud']),
-#         ]
-
-#     def __str__(self):
-#         return f"{self.user_profile_a} ↔ {self.user_profile_b} (Score: {self.score_similitud:.1f})"
-    
-#     @classmethod
-#     def calcular_similitud(cls, user_a, user_b):
-#         """
-#         Calcula la similitud entre dos usuarios basado en sus perfiles de comportamiento.
-#         """
-#         try:
-#             perfil_a = user_a.perfil_comportamiento
-#             perfil_b = user_b.perfil_comportamiento
-#         except PerfilComportamiento.DoesNotExist:
-#             return 0
+        producto_id = self.producto_id
+        carpeta = f'productos/{producto_id}'
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, carpeta), exist_ok=True)
         
-#         score = 0
+        # Variantes por ancho (nunca se amplía la imagen original)
+        variantes = {}
+        for nombre_variante, ancho_maximo in VARIANTES_IMAGEN.items():
+            variante = img.copy()
+            variante.thumbnail((ancho_maximo, ancho_maximo * 4), Image.Resampling.LANCZOS)
+            variantes[nombre_variante] = {'ancho': variante.width, 'alto': variante.height}
+            for formato, opciones in formatos_variantes().items():
+                nombre_archivo = f'{carpeta}/{self.pk}_{nombre_variante}.{formato}'
+                variante.save(os.path.join(settings.MEDIA_ROOT, nombre_archivo), formato.upper(), **opciones)
+                variantes[nombre_variante][formato] = nombre_archivo
         
-#         # 1. Categorías comunes (peso: 40 puntos)
-#         cats_a = set(perfil_a.categorias_favoritas.keys())
-#         cats_b = set(perfil_b.categorias_favoritas.keys())
-#         categorias_comunes = len(cats_a & cats_b)
-#         if categorias_comunes > 0:
-#             score += min(categorias_comunes * 10, 40)
+        # Redimensionar
+        max_size = (800, 600)
+        img.thumbnail(max_size, Image.Resampling.LANCZOS)
         
-#         # 2. Productos vistos en común (peso: 30 puntos)
-#         prods_a = set(perfil_a.productos_vistos_recientes)
-#         prods_b = set(perfil_b.productos_vistos_recientes)
-#         productos_comunes = len(prods_a & prods_b)
-#         if productos_comunes > 0:
-#             score += min(productos_comunes * 5, 30)
+        # Crear nueva ruta con el ID de la imagen
+        new_filename = f'{self.pk}.png'
+        new_path = os.path.join(settings.MEDIA_ROOT, f'{carpeta}/{new_filename}')
         
-#         # 3. Rango de precio similar (peso: 20 puntos)
-#         if perfil_a.precio_promedio_productos_vistos > 0 and perfil_b.precio_promedio_productos_vistos > 0:
-#             diff_precio = abs(perfil_a.precio_promedio_productos_vistos - perfil_b.precio_promedio_productos_vistos)
-#             precio_promedio = (perfil_a.precio_promedio_productos_vistos + perfil_b.precio_promedio_productos_vistos) / 2
-#             if precio_promedio > 0:
-#                 similitud_precio = max(0, 1 - (diff_precio / precio_promedio))
-#                 score += similitud_precio * 20
+        # Guardar imagen procesada con nuevo nombre
+        img.save(new_path, 'PNG', optimize=True)
         
-#         # 4. Nivel de actividad similar (peso: 10 puntos)
-#         diff_actividad = abs(perfil_a.score_actividad - perfil_b.score_actividad)
-#         similitud_actividad = max(0, 1 - (diff_actividad / 100))
-#         score += similitud_actividad * 10
+        # Eliminar archivo temporal si tiene nombre diferente
+        if old_path != new_path and os.path.exists(old_path):
+            os.remove(old_path)
         
-#         return round(score, 2)
+        # Actualizar el campo imagen con la nueva ruta
+        self.imagen.name = f'{carpeta}/{new_filename}'
+        self.variantes = variantes
+    
+    def url_variante(self, variante, formato='webp'):
+        """URL relativa de una variante, o la del PNG de respaldo si aún no existe."""
+        nombre = (self.variantes or {}).get(variante, {}).get(formato)
+        if nombre:
+            return self.imagen.storage.url(nombre)
+        return self.imagen.url if self.imagen else None
+
+# ============= CORREOS =============
+class EstadoCorreo(models.TextChoices):
+    PENDIENTE = 'PENDIENTE', 'Pendiente'
+    ENVIANDO = 'ENVIANDO', 'Enviando'
+    ENVIADO = 'ENVIADO', 'Enviado'
+    ERROR = 'ERROR', 'Error'
+
+class CorreoSalida(BaseModel):
+    """
+    Bandeja de salida: las vistas encolan el correo en su misma transacción y el
+    comando enviar_correos lo renderiza y envía (python manage.py enviar_correos).
+    """
+    correo_id = models.AutoField(primary_key=True)
+    # Nombre base de la plantilla: 'emails/pedido_confirmacion' -> .txt (y .html si existe)
+    plantilla = models.CharField(max_length=100)
+    contexto = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    asunto = models.CharField(max_length=255)
+    destinatarios = models.JSONField(default=list)
+    estado = models.CharField(max_length=10, choices=EstadoCorreo.choices, default=EstadoCorreo.PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    fecha_inicio_envio = models.DateTimeField(null=True, blank=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'correos_salida'
+        ordering = ['correo_id']
+        indexes = [
+            # Reclamo del worker: pendientes cuyo próximo intento ya venció
+            models.Index(fields=['estado', 'proximo_intento'], name='correo_estado_proximo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} -> {', '.join(self.destinatarios)} ({self.estado})"
+
+# ============= MODELOS WEB 3.0+ (SISTEMA INTELIGENTE) =============
+
+class CursorProcesamiento(models.Model):
+    """Último ID procesado por un proceso incremental (p. ej. 'perfiles_comportamiento')."""
+    nombre = models.CharField(max_length=50, primary_key=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    fecha_modificacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'cursores_procesamiento'
+
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo_id}"
+
+class TipoInteraccion(models.TextChoices):
+    PRODUCT_VIEW = 'product_view', 'Vista de producto'
+    CATEGORY_VISIT = 'category_visit', 'Visita a categoría'
+    SEARCH = 'search', 'Búsqueda'
+    ADD_TO_CART = 'add_to_cart', 'Agregar al carrito'
+    REMOVE_FROM_CART = 'remove_from_cart', 'Quitar del carrito'
+    PURCHASE = 'purchase', 'Compra'
+    WISHLIST_ADD = 'wishlist_add', 'Agregar a favoritos'
+    SCROLL = 'scroll', 'Scroll en página'
+    TIME_ON_PAGE = 'time_on_page', 'Tiempo en página'
+
+class HistorialNavegacion(models.Model):
+    """
+    Registra cada interacción del usuario con el sitio. Sólo se agregan filas
+    (core/interacciones.py): PerfilComportamiento las acumula en forma incremental.
+    """
+    historial_id = models.BigAutoField(primary_key=True)
+    user_profile = models.ForeignKey(
+        UserProfile, 
+        on_delete=models.CASCADE, 
+        related_name='historial_navegacion',
+        null=True,
+        blank=True
+    )
+    sesion_id = models.CharField(
+        max_length=100, 
+        help_text="ID de sesión para usuarios no autenticados"
+    )
+    tipo_interaccion = models.CharField(max_length=30, choices=TipoInteraccion.choices)
+    
+    # Datos de la interacción (JSON flexible)
+    datos_interaccion = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Datos específicos: query, origen, etc."
+    )
+    
+    # Producto relacionado (si aplica)
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='historial_vistas'
+    )
+    
+    # Categoría relacionada (la del producto si no se informa)
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='historial_visitas'
+    )
+    
+    # Metadata
+    # Momento informado por el cliente (acotado al recibirlo)
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Llegada al servidor: el actualizador de perfiles no lee las filas más recientes
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    agente_usuario = models.ForeignKey(AgenteUsuario, on_delete=models.PROTECT, null=True, blank=True)
+    duracion_segundos = models.IntegerField(
+        null=True, 
+        blank=True,
+        help_text="Duración de la interacción en segundos"
+    )
+    
+    class Meta:
+        db_table = 'historial_navegacion'
+        verbose_name = 'Historial de Navegación'
+        verbose_name_plural = 'Historial de Navegación'
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user_profile', '-timestamp'], name='historial_perfil_idx'),
+            models.Index(fields=['sesion_id', '-timestamp'], name='historial_sesion_idx'),
+            models.Index(fields=['tipo_interaccion', '-timestamp'], name='historial_tipo_idx'),
+            models.Index(fields=['producto', '-timestamp'], name='historial_producto_idx'),
+        ]
+
+    def __str__(self):
+        user_str = str(self.user_profile) if self.user_profile else f"Sesión: {self.sesion_id[:8]}"
+        return f"{user_str} - {self.get_tipo_interaccion_display()} - {self.timestamp}"
+
+class PerfilComportamiento(BaseModel):
+    """
+    Perfil de comportamiento agregado del usuario. Se actualiza sumando sólo las
+    interacciones nuevas (python manage.py actualizar_perfiles), sin releer el historial.
+    """
+    perfil_id = models.AutoField(primary_key=True)
+    user_profile = models.OneToOneField(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='perfil_comportamiento'
+    )
+    
+    # Categorías (JSON con contadores)
+    categorias_favoritas = models.JSONField(
+        default=dict,
+        help_text="{'categoria_id': count, ...}"
+    )
+    
+    # Productos vistos recientemente (lista de IDs)
+    productos_vistos_recientes = models.JSONField(
+        default=list,
+        help_text="[producto_id1, producto_id2, ...] últimos 50, el más reciente primero"
+    )
     
+    # Rango de precios preferido
+    precio_minimo_promedio = models.IntegerField(default=0)
+    precio_maximo_promedio = models.IntegerField(default=999999)
+    precio_promedio_productos_vistos = models.IntegerField(default=0)
+    # Acumulados para actualizar el rango sin releer el historial
+    precio_minimo_visto = models.IntegerField(null=True, blank=True)
+    precio_maximo_visto = models.IntegerField(null=True, blank=True)
+    suma_precios_vistos = models.BigIntegerField(default=0)
+    cantidad_precios_vistos = models.IntegerField(default=0)
+    
+    # Patrones temporales
+    hora_preferida_navegacion = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Hora del día (0-23) con más actividad"
+    )
+    dia_semana_preferido = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Día de la semana (0=Lunes, 6=Domingo)"
+    )
+    actividad_por_hora = models.JSONField(default=list, help_text="Interacciones por hora del día (24)")
+    actividad_por_dia = models.JSONField(default=list, help_text="Interacciones por día de la semana (7)")
+    
+    # Métricas de engagement
+    total_productos_vistos = models.IntegerField(default=0)
+    total_busquedas = models.IntegerField(default=0)
+    total_items_carrito = models.IntegerField(default=0)
+    total_compras = models.IntegerField(default=0)
+    tiempo_total_navegacion_segundos = models.IntegerField(default=0)
+    
+    # Últimas interacciones
+    ultima_visita = models.DateTimeField(null=True, blank=True)
+    productos_comprados_ids = models.JSONField(
+        default=list,
+        help_text="IDs de productos que ha comprado"
+    )
+    
+    # Score de actividad (0-100)
+    score_actividad = models.IntegerField(
+        default=0,
+        help_text="Score calculado basado en interacciones"
+    )
+    
+    class Meta:
+        db_table = 'perfiles_comportamiento'
+        verbose_name = 'Perfil de Comportamiento'
+        verbose_name_plural = 'Perfiles de Comportamiento'
+
+    def __str__(self):
+        return f"Perfil de {self.user_profile}"
+
+class SimilitudUsuarios(models.Model):
+    """
+    Los k vecinos más parecidos de cada usuario (coseno de sus interacciones con
+    productos). Se recalcula completa con python manage.py calcular_similitudes
+    (core/recomendaciones.py); no se guardan los pares fuera del top-k.
+    """
+    similitud_id = models.BigAutoField(primary_key=True)
+    user_profile_a = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='similitudes_como_a'
+    )
+    user_profile_b = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='similitudes_como_b'
+    )
+    
+    # Score de similitud (0-100)
+    score_similitud = models.FloatField(
+        default=0,
+        help_text="Coseno entre las interacciones de ambos usuarios x 100"
+    )
+    productos_comunes = models.IntegerField(default=0)
+    
+    # Timestamp de cálculo
+    fecha_calculo = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'similitudes_usuarios'
+        verbose_name = 'Similitud entre Usuarios'
+        verbose_name_plural = 'Similitudes entre Usuarios'
+        unique_together = ['user_profile_a', 'user_profile_b']
+        indexes = [
+            models.Index(fields=['user_profile_a', '-score_similitud'], name='similitud_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_profile_a} ↔ {self.user_profile_b} (Score: {self.score_similitud:.1f})"
+
+class SimilitudProductos(models.Model):
+    """Los k productos más parecidos a cada uno según quiénes interactúan con ellos (ver SimilitudUsuarios)."""
+    similitud_id = models.BigAutoField(primary_key=True)
+    producto_a = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='similitudes_como_a')
+    producto_b = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='similitudes_como_b')
+    score_similitud = models.FloatField(default=0, help_text="Coseno x 100")
+    usuarios_comunes = models.IntegerField(default=0)
+    fecha_calculo = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'similitudes_productos'
+        unique_together = ['producto_a', 'producto_b']
+        indexes = [
+            models.Index(fields=['producto_a', '-score_similitud'], name='similitud_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_a_id} ↔ {self.producto_b_id} (Score: {self.score_similitud:.1f})"
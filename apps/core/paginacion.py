@@ -0,0 +1,135 @@
+# core/paginacion.py
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+TAMANO_PAGINA = 20
+TAMANO_PAGINA_MAXIMO = 100
+
+
+def _valor_cursor(valor):
+    """Convierte el valor de una columna a algo serializable sin perder precisión."""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+class PaginacionCursor(BasePagination):
+    """
+    Paginación por keyset: el cursor guarda los valores de la última fila
+    entregada y la página siguiente se obtiene con un WHERE sobre esas columnas,
+    así que cualquier página cuesta lo mismo que la primera.
+
+    Cada ViewSet la activa con `pagination_class` y declara su orden estable en
+    `ordenamiento_cursor`, que debe terminar en 'pk' (o '-pk') y usar columnas
+    NOT NULL del modelo, idealmente cubiertas por un índice.
+
+    Mientras el frontend no la use, sólo se pagina si la petición trae
+    `cursor` o `page_size` (o si PAGINACION_CURSOR_OBLIGATORIA está activo);
+    en otro caso la respuesta sigue siendo la lista completa de siempre.
+    Con `total=1` se incluye el conteo total (una consulta COUNT extra).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    total_query_param = 'total'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        parametros = request.query_params
+        solicitada = self.cursor_query_param in parametros or self.page_size_query_param in parametros
+        if not (solicitada or getattr(settings, 'PAGINACION_CURSOR_OBLIGATORIA', False)):
+            return None
+
+        self.request = request
+        self.ordenamiento = tuple(getattr(view, 'ordenamiento_cursor', ('-pk',)))
+        self.tamano = self.obtener_tamano_pagina(request)
+        valores, hacia_atras = self.decodificar_cursor(parametros.get(self.cursor_query_param))
+
+        self.total = None
+        if parametros.get(self.total_query_param, '').lower() in ('1', 'true'):
+            self.total = queryset.count()
+
+        orden = self.ordenamiento if not hacia_atras else tuple(
+            campo[1:] if campo.startswith('-') else f'-{campo}' for campo in self.ordenamiento
+        )
+        if valores is not None:
+            try:
+                queryset = queryset.filter(self.filtro_desde(orden, valores))
+            except (ValueError, TypeError, ValidationError):
+                raise NotFound('Cursor inválido')
+
+        # Una fila extra indica si existe otra página en esa dirección
+        filas = list(queryset.order_by(*orden)[:self.tamano + 1])
+        hay_mas = len(filas) > self.tamano
+        filas = filas[:self.tamano]
+
+        if hacia_atras:
+            filas.reverse()
+            self.hay_siguiente, self.hay_anterior = True, hay_mas
+        else:
+            self.hay_siguiente, self.hay_anterior = hay_mas, valores is not None
+        self.filas = filas
+        return filas
+
+    def get_paginated_response(self, data):
+        respuesta = {
+            'next': self.enlace(self.filas[-1], False) if self.filas and self.hay_siguiente else None,
+            'previous': self.enlace(self.filas[0], True) if self.filas and self.hay_anterior else None,
+            'results': data,
+        }
+        if self.total is not None:
+            respuesta['count'] = self.total
+        return Response(respuesta)
+
+    def obtener_tamano_pagina(self, request):
+        try:
+            tamano = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return TAMANO_PAGINA
+        return min(max(tamano, 1), TAMANO_PAGINA_MAXIMO)
+
+    @staticmethod
+    def filtro_desde(orden, valores):
+        """
+        Filas estrictamente posteriores a `valores` según `orden`:
+        (a > x) OR (a = x AND b > y) ..., con la cota de la primera columna
+        repetida fuera del OR para que el motor pueda recorrer el índice por rango.
+        """
+        condiciones = Q()
+        for i, campo in enumerate(orden):
+            nombre = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            iguales = {orden[j].lstrip('-'): valores[j] for j in range(i)}
+            condiciones |= Q(**iguales, **{f'{nombre}__{operador}': valores[i]})
+        primera = orden[0].lstrip('-')
+        cota = Q(**{f'{primera}__{"lte" if orden[0].startswith("-") else "gte"}': valores[0]})
+        return cota & condiciones
+
+    def enlace(self, fila, hacia_atras):
+        valores = [_valor_cursor(getattr(fila, campo.lstrip('-'))) for campo in self.ordenamiento]
+        contenido = json.dumps({'v': valores, 'a': hacia_atras}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(contenido.encode()).decode().rstrip('=')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decodificar_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            contenido = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            valores, hacia_atras = contenido['v'], bool(contenido.get('a'))
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound('Cursor inválido')
+        if not isinstance(valores, list) or len(valores) != len(self.ordenamiento):
+            raise NotFound('Cursor inválido')
+        return valores, hacia_atras
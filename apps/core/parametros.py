@@ -0,0 +1,14 @@
+# core/parametros.py
+"""Lectura de parámetros de consulta comunes a las vistas de varias apps."""
+import datetime
+
+
+def fecha_parametro(request, nombre, defecto=None):
+    """Fecha AAAA-MM-DD del parámetro `nombre`, o `defecto` si no viene. ValueError si es inválida."""
+    valor = request.query_params.get(nombre)
+    if not valor:
+        return defecto
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f'Fecha inválida en {nombre}: use AAAA-MM-DD')
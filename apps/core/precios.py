@@ -0,0 +1,309 @@
+# core/precios.py
+import numpy as np
+from django.core.cache import cache
+from .models import Producto
+
+HOJA_PRECIOS_TTL = 60 * 60 * 6
+# Máximo de filas que se cotizan en una sola solicitud por lote
+MAX_FILAS_COTIZACION = 5000
+# Mientras el numerador no supere 2**53 se convierte a float64 sin pérdida y
+# la división da exactamente lo mismo que la división entera/entera de Python
+LIMITE_NUMERADOR_EXACTO = 2 ** 53
+LIMITE_INT64 = 2 ** 63 - 1
+
+
+def clave_hoja_precios(producto_id):
+    return f'precios:hoja:{producto_id}'
+
+
+class HojaPrecios:
+    """
+    Datos de precio de un producto precompilados (terminaciones, tiempos de producción,
+    acabados y stock), para cotizar con aritmética pura y sin consultas a la BD.
+    """
+
+    def __init__(self, producto_id, stock, terminaciones, tiempos, acabados):
+        self.producto_id = producto_id
+        self.stock = stock
+        # {terminacion_id: (nombre_terminacion, precio)}
+        self.terminaciones = terminaciones
+        # {tiempo_produccion_id: (nombre_tiempo, dias_estimados, precio)}
+        self.tiempos = tiempos
+        # {acabado_id: (nombre_acabado, costo_adicional)} en el orden de ProductoAcabado
+        self.acabados = acabados
+
+    @classmethod
+    def desde_producto(cls, producto):
+        terminaciones = {
+            t.terminacion_id: (t.nombre_terminacion, t.precio)
+            for t in producto.terminaciones.filter(activo=True)
+        }
+        tiempos = {
+            t.tiempo_produccion_id: (t.nombre_tiempo, t.dias_estimados, t.precio)
+            for t in producto.tiempos_produccion.filter(activo=True)
+        }
+        acabados = {
+            pa.acabado.acabado_id: (pa.acabado.nombre_acabado, pa.acabado.costo_adicional)
+            for pa in producto.producto_acabados.filter(acabado__activo=True).select_related('acabado')
+        }
+        return cls(producto.producto_id, producto.stock, terminaciones, tiempos, acabados)
+
+    def tiene_personalizaciones(self):
+        return bool(self.terminaciones or self.tiempos or self.acabados)
+
+    def calcular(self, ancho_cm, alto_cm, terminacion_id, tiempo_produccion_id, cantidad=1, acabado_ids=None):
+        """
+        Misma fórmula y mismas validaciones que Producto.calcular_precio_personalizado:
+        precio_unitario = ((ancho × alto × acabados × terminacion) / 10000) + tiempo_produccion
+        """
+        try:
+            if terminacion_id not in self.terminaciones:
+                return {
+                    'error': True,
+                    'mensaje': f'Terminación con ID {terminacion_id} no encontrada o inactiva'
+                }
+            nombre_terminacion, precio_terminacion = self.terminaciones[terminacion_id]
+
+            if tiempo_produccion_id not in self.tiempos:
+                return {
+                    'error': True,
+                    'mensaje': f'Tiempo de producción con ID {tiempo_produccion_id} no encontrado o inactivo'
+                }
+            nombre_tiempo, dias_estimados, precio_tiempo = self.tiempos[tiempo_produccion_id]
+
+            if ancho_cm <= 0 or alto_cm <= 0:
+                return {
+                    'error': True,
+                    'mensaje': 'Las dimensiones deben ser mayores a 0'
+                }
+
+            if cantidad <= 0:
+                return {
+                    'error': True,
+                    'mensaje': 'La cantidad debe ser mayor a 0'
+                }
+
+            if self.stock < cantidad:
+                return {
+                    'error': True,
+                    'mensaje': f'Stock insuficiente. Disponibles: {self.stock}'
+                }
+
+            # Multiplicador acumulado de acabados (factor neutro si no hay)
+            costo_acabados = 1
+            acabados_info = []
+
+            if acabado_ids:
+                solicitados = set(acabado_ids)
+                if len(solicitados & self.acabados.keys()) != len(acabado_ids):
+                    return {
+                        'error': True,
+                        'mensaje': 'Uno o más acabados no válidos o inactivos'
+                    }
+
+                for acabado_id, (nombre_acabado, costo_adicional) in self.acabados.items():
+                    if acabado_id in solicitados:
+                        costo_acabados *= costo_adicional
+                        acabados_info.append({
+                            'acabado_id': acabado_id,
+                            'nombre_acabado': nombre_acabado,
+                            'costo_adicional': costo_adicional
+                        })
+
+            precio_base = int((ancho_cm * alto_cm * costo_acabados * precio_terminacion) / 10000)
+            precio_unitario = precio_base + precio_tiempo
+            precio_total = precio_unitario * cantidad
+
+            return {
+                'error': False,
+                'precio_unitario': precio_unitario,
+                'precio_total': precio_total,
+                'cantidad': cantidad,
+                'ancho_cm': ancho_cm,
+                'alto_cm': alto_cm,
+                'terminacion': {
+                    'terminacion_id': terminacion_id,
+                    'nombre_terminacion': nombre_terminacion,
+                    'precio_por_100cm': precio_terminacion
+                },
+                'tiempo_produccion': {
+                    'tiempo_produccion_id': tiempo_produccion_id,
+                    'nombre_tiempo': nombre_tiempo,
+                    'dias_estimados': dias_estimados,
+                    'factor_precio': float(precio_tiempo)
+                },
+                'acabados': acabados_info,
+                'desglose': {
+                    'base_calculo': f'(({ancho_cm} × {alto_cm} × {costo_acabados} × {precio_terminacion}) / 10000) + {precio_tiempo} = {precio_unitario}',
+                    'total': f'{precio_unitario} × {cantidad} = {precio_total}',
+                    'componentes': {
+                        'area_cm2': ancho_cm * alto_cm,
+                        'multiplicador_acabados': costo_acabados,
+                        'precio_terminacion': precio_terminacion,
+                        'precio_base': precio_base,
+                        'costo_tiempo': precio_tiempo
+                    }
+                }
+            }
+
+        except Exception as e:
+            return {
+                'error': True,
+                'mensaje': f'Error al calcular precio: {str(e)}'
+            }
+
+
+    def cotizar_lote(self, ancho_cm, alto_cm, terminacion_id, tiempo_produccion_id, cantidad, acabado_ids):
+        """
+        Evalúa la fórmula de calcular() para muchas filas a la vez con NumPy.
+        Recibe secuencias de igual largo (acabado_ids es una lista de listas) y retorna
+        (precios_unitarios, precios_totales, errores), donde errores es {fila: mensaje}
+        y las filas con error quedan en None.
+
+        Las filas que no se pueden evaluar en vectorial (opciones inexistentes, precios
+        nulos, stock insuficiente o montos fuera del rango exacto de float64) se delegan
+        a calcular(), así el resultado y los mensajes son idénticos a la ruta escalar.
+        """
+        n = len(ancho_cm)
+        unitarios = [None] * n
+        totales = [None] * n
+        errores = {}
+        if n == 0:
+            return unitarios, totales, errores
+
+        try:
+            ancho = np.asarray(ancho_cm, dtype=np.int64)
+            alto = np.asarray(alto_cm, dtype=np.int64)
+            cant = np.asarray(cantidad, dtype=np.int64)
+            terminacion = np.asarray(terminacion_id, dtype=np.int64)
+            tiempo = np.asarray(tiempo_produccion_id, dtype=np.int64)
+        except OverflowError:
+            vectorial = np.zeros(n, dtype=bool)
+        else:
+            # Combinaciones distintas de acabados: el multiplicador se calcula una vez por combinación
+            combinaciones = {}
+            indice_combinacion = np.empty(n, dtype=np.int64)
+            for fila, ids in enumerate(acabado_ids):
+                indice_combinacion[fila] = combinaciones.setdefault(tuple(ids or ()), len(combinaciones))
+            multiplicadores = np.zeros(len(combinaciones), dtype=np.int64)
+            combinacion_valida = np.zeros(len(combinaciones), dtype=bool)
+            for ids, indice in combinaciones.items():
+                multiplicador = self._multiplicador_acabados(ids)
+                if multiplicador is not None and 0 <= multiplicador <= LIMITE_INT64:
+                    multiplicadores[indice] = multiplicador
+                    combinacion_valida[indice] = True
+
+            precio_terminacion, terminacion_valida = self._buscar_precios(
+                terminacion, {k: v[1] for k, v in self.terminaciones.items()}
+            )
+            precio_tiempo, tiempo_valido = self._buscar_precios(
+                tiempo, {k: v[2] for k, v in self.tiempos.items()}
+            )
+            multiplicador = multiplicadores[indice_combinacion]
+
+            vectorial = (
+                terminacion_valida & tiempo_valido & combinacion_valida[indice_combinacion]
+                & (ancho > 0) & (alto > 0) & (cant > 0)
+            )
+            if self.stock is None:
+                vectorial[:] = False
+            else:
+                vectorial &= cant <= self.stock
+
+            if vectorial.any():
+                # Cota superior en enteros de Python (sin desbordes) antes de operar en int64
+                cota = 1
+                for factor in (ancho, alto, multiplicador, precio_terminacion):
+                    cota *= int(factor[vectorial].max())
+                cota_total = (cota // 10000 + int(precio_tiempo[vectorial].max())) * int(cant[vectorial].max())
+                if cota > LIMITE_NUMERADOR_EXACTO or cota_total > LIMITE_INT64:
+                    vectorial[:] = False
+
+            if vectorial.any():
+                numerador = ancho * alto * multiplicador * precio_terminacion
+                # int((a × b × c × p) / 10000) de Python: división real y truncamiento hacia cero
+                precio_base = np.trunc(numerador.astype(np.float64) / 10000).astype(np.int64)
+                precio_unitario = precio_base + precio_tiempo
+                precio_total = precio_unitario * cant
+                for fila in np.flatnonzero(vectorial).tolist():
+                    unitarios[fila] = int(precio_unitario[fila])
+                    totales[fila] = int(precio_total[fila])
+
+        for fila in np.flatnonzero(~vectorial).tolist():
+            resultado = self.calcular(
+                ancho_cm[fila], alto_cm[fila], terminacion_id[fila], tiempo_produccion_id[fila],
+                cantidad=cantidad[fila], acabado_ids=acabado_ids[fila]
+            )
+            if resultado.get('error'):
+                errores[fila] = resultado['mensaje']
+            else:
+                unitarios[fila] = resultado['precio_unitario']
+                totales[fila] = resultado['precio_total']
+
+        return unitarios, totales, errores
+
+    def _multiplicador_acabados(self, acabado_ids):
+        """Multiplicador de una combinación de acabados, o None si la combinación no es válida."""
+        if not acabado_ids:
+            return 1
+        solicitados = set(acabado_ids)
+        if len(solicitados & self.acabados.keys()) != len(acabado_ids):
+            return None
+        multiplicador = 1
+        for acabado_id in solicitados:
+            costo_adicional = self.acabados[acabado_id][1]
+            if costo_adicional is None:
+                return None
+            multiplicador *= costo_adicional
+        return multiplicador
+
+    @staticmethod
+    def _buscar_precios(ids, precios):
+        """Traduce un arreglo de IDs a sus precios; las opciones inexistentes o sin precio quedan inválidas."""
+        conocidos = {k: v for k, v in precios.items() if v is not None and v <= LIMITE_INT64}
+        if not conocidos:
+            return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+        claves = np.fromiter(sorted(conocidos), dtype=np.int64, count=len(conocidos))
+        valores = np.fromiter((conocidos[k] for k in claves.tolist()), dtype=np.int64, count=len(conocidos))
+        posiciones = np.minimum(np.searchsorted(claves, ids), len(claves) - 1)
+        validos = claves[posiciones] == ids
+        return np.where(validos, valores[posiciones], 0), validos
+
+
+def expandir_grilla(grilla):
+    """
+    Expande una grilla cartesiana (ya validada) a columnas de igual largo, en orden C
+    sobre sus ejes: medidas (o ancho × alto), terminación, tiempo, cantidad y acabados.
+    """
+    if 'medidas' in grilla:
+        ejes = [grilla['medidas']]
+    else:
+        ejes = [grilla['ancho_cm'], grilla['alto_cm']]
+    ejes += [grilla['terminacion_id'], grilla['tiempo_produccion_id'], grilla['cantidad'], grilla['acabado_ids']]
+    indices = np.indices([len(eje) for eje in ejes]).reshape(len(ejes), -1).tolist()
+    columnas = [[eje[i] for i in indices_eje] for eje, indices_eje in zip(ejes, indices)]
+    if 'medidas' in grilla:
+        medidas = columnas.pop(0)
+        columnas[0:0] = [[m[0] for m in medidas], [m[1] for m in medidas]]
+    return columnas
+
+
+def obtener_hoja_precios(producto_id):
+    """
+    Retorna la hoja de precios de un producto activo desde la caché, compilándola
+    si no existe. Retorna None si el producto no existe o está inactivo.
+    """
+    clave = clave_hoja_precios(producto_id)
+    hoja = cache.get(clave)
+    if hoja is None:
+        producto = Producto.objects.filter(producto_id=producto_id, activo=True).first()
+        if producto is None:
+            return None
+        hoja = HojaPrecios.desde_producto(producto)
+        cache.set(clave, hoja, HOJA_PRECIOS_TTL)
+    return hoja
+
+
+def invalidar_hojas_precios(producto_ids):
+    """Elimina de la caché las hojas de precios de los productos indicados."""
+    cache.delete_many([clave_hoja_precios(producto_id) for producto_id in set(producto_ids)])
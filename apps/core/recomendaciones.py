@@ -0,0 +1,256 @@
+# core/recomendaciones.py
+"""
+Recomendaciones por filtrado colaborativo.
+
+Las interacciones del historial (core/interacciones.py) forman una matriz
+dispersa usuarios x productos (CSR sobre arrays de NumPy), con un peso por tipo
+de interacción amortiguado con log1p.
+
+vecinos_coseno() calcula los k vecinos de cada fila por bloques de filas. El
+producto del bloque por la transpuesta se arma cruzando cada entrada del bloque
+con la columna de su producto y acumulando con np.bincount, así que el costo
+depende de las coincidencias reales y no de usuarios². Las pocas columnas muy
+pobladas (productos populares), que concentrarían la mayoría de los cruces, van
+en cambio en una multiplicación densa (BLAS). De cada bloque sólo se conserva el
+top-k (np.argpartition). Aplicada a la transpuesta da los productos parecidos.
+
+calcular_similitudes() (python manage.py calcular_similitudes) reemplaza
+SimilitudUsuarios y SimilitudProductos con esos top-k; las vistas sólo leen.
+"""
+from collections import defaultdict
+from datetime import timedelta
+import math
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, FloatField, Sum, Value, When
+from django.utils import timezone
+from .models import HistorialNavegacion, SimilitudProductos, SimilitudUsuarios, TipoInteraccion
+
+PESOS_INTERACCION = {
+    TipoInteraccion.PRODUCT_VIEW: 1,
+    TipoInteraccion.WISHLIST_ADD: 2,
+    TipoInteraccion.ADD_TO_CART: 3,
+    TipoInteraccion.PURCHASE: 5,
+}
+K_VECINOS = 20
+# Filas por bloque: la matriz densa de un bloque es TAMANO_BLOQUE x filas totales
+TAMANO_BLOQUE = 256
+# Columnas con entradas en más de esta fracción de las filas se multiplican en denso
+FRACCION_COLUMNA_DENSA = 0.02
+MAX_COLUMNAS_DENSAS = 1000
+DIAS_HISTORIAL = 180
+
+
+class MatrizDispersa:
+    """Matriz en formato CSR: la fila i son indices[indptr[i]:indptr[i + 1]] con sus data."""
+
+    def __init__(self, indptr, indices, data, forma):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.forma = forma
+
+    @classmethod
+    def desde_coordenadas(cls, filas, columnas, valores, forma):
+        """Matriz con valores[n] en (filas[n], columnas[n]); las coordenadas repetidas se suman."""
+        filas = np.asarray(filas, dtype=np.int64)
+        columnas = np.asarray(columnas, dtype=np.int64)
+        # Ordena por (fila, columna) y agrupa los repetidos en una sola pasada
+        claves, inversa = np.unique(filas * forma[1] + columnas, return_inverse=True)
+        data = np.bincount(inversa, weights=np.asarray(valores, dtype=np.float64), minlength=len(claves))
+        indptr = np.zeros(forma[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(claves // forma[1], minlength=forma[0]), out=indptr[1:])
+        return cls(indptr, claves % forma[1], data, forma)
+
+    def filas(self):
+        """Fila de cada entrada (las coordenadas que CSR no guarda)."""
+        return np.repeat(np.arange(self.forma[0]), np.diff(self.indptr))
+
+    def transpuesta(self):
+        return MatrizDispersa.desde_coordenadas(
+            self.indices, self.filas(), self.data, (self.forma[1], self.forma[0])
+        )
+
+    def normas(self):
+        return np.sqrt(np.bincount(self.filas(), weights=self.data ** 2, minlength=self.forma[0]))
+
+
+def vecinos_coseno(matriz, k=K_VECINOS, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Los k vecinos por similitud coseno de cada fila de la matriz.
+    Retorna (vecinos, similitudes, coincidencias), arrays filas x k ordenados de
+    mayor a menor; donde hay menos de k vecinos con similitud > 0 el vecino es -1.
+    """
+    n = matriz.forma[0]
+    k = max(min(k, n - 1), 0)
+    vecinos = np.full((n, k), -1, dtype=np.int64)
+    similitudes = np.zeros((n, k))
+    coincidencias = np.zeros((n, k), dtype=np.int64)
+    if not k:
+        return vecinos, similitudes, coincidencias
+
+    columnas_csr = matriz.transpuesta()
+    largo_columnas = np.diff(columnas_csr.indptr)
+    normas = matriz.normas()
+
+    # Cruzar una columna de L entradas cuesta ~L² operaciones: las más pobladas van en denso
+    densas = np.argsort(-largo_columnas)[:MAX_COLUMNAS_DENSAS]
+    densas = densas[largo_columnas[densas] > FRACCION_COLUMNA_DENSA * n]
+    es_densa = np.zeros(matriz.forma[1], dtype=bool)
+    es_densa[densas] = True
+    matriz_densa = np.zeros((n, len(densas)))
+    if len(densas):
+        posicion_densa = np.full(matriz.forma[1], -1, dtype=np.int64)
+        posicion_densa[densas] = np.arange(len(densas))
+        en_densas = es_densa[matriz.indices]
+        matriz_densa[matriz.filas()[en_densas], posicion_densa[matriz.indices[en_densas]]] = matriz.data[en_densas]
+    presencia_densa = (matriz_densa > 0).astype(np.float64)
+
+    for inicio in range(0, n, tamano_bloque):
+        fin = min(inicio + tamano_bloque, n)
+        filas_bloque = fin - inicio
+        desde, hasta = matriz.indptr[inicio], matriz.indptr[fin]
+        fila_local = np.repeat(np.arange(filas_bloque), np.diff(matriz.indptr[inicio:fin + 1]))
+        columnas = matriz.indices[desde:hasta]
+        valores = matriz.data[desde:hasta]
+        dispersas = ~es_densa[columnas]
+        fila_local, columnas, valores = fila_local[dispersas], columnas[dispersas], valores[dispersas]
+
+        # Cada entrada (fila, columna) del bloque se cruza con todas las entradas de su columna
+        repeticiones = largo_columnas[columnas]
+        total = int(repeticiones.sum())
+        entrada = np.repeat(np.arange(len(columnas)), repeticiones)
+        desplazamiento = np.arange(total) - np.repeat(np.cumsum(repeticiones) - repeticiones, repeticiones)
+        posiciones = columnas_csr.indptr[columnas][entrada] + desplazamiento
+        celdas = fila_local[entrada] * n + columnas_csr.indices[posiciones]
+
+        # Sin entradas dispersas bincount retorna enteros aunque lleve pesos
+        producto_punto = np.bincount(
+            celdas, weights=valores[entrada] * columnas_csr.data[posiciones], minlength=filas_bloque * n
+        ).astype(np.float64, copy=False).reshape(filas_bloque, n)
+        comunes = np.bincount(celdas, minlength=filas_bloque * n).reshape(filas_bloque, n)
+        if len(densas):
+            producto_punto += matriz_densa[inicio:fin] @ matriz_densa.T
+            comunes += (presencia_densa[inicio:fin] @ presencia_densa.T).astype(np.int64)
+
+        divisor = normas[inicio:fin, None] * normas[None, :]
+        coseno = np.divide(producto_punto, divisor, out=np.zeros_like(producto_punto), where=divisor > 0)
+        # Uno mismo no es vecino
+        coseno[np.arange(filas_bloque), np.arange(inicio, fin)] = 0
+
+        top = np.argpartition(-coseno, k - 1, axis=1)[:, :k] if k < n else np.argsort(-coseno, axis=1)[:, :k]
+        top_coseno = np.take_along_axis(coseno, top, axis=1)
+        orden = np.argsort(-top_coseno, axis=1, kind='stable')
+        top = np.take_along_axis(top, orden, axis=1)
+        top_coseno = np.take_along_axis(top_coseno, orden, axis=1)
+
+        validos = top_coseno > 0
+        vecinos[inicio:fin] = np.where(validos, top, -1)
+        similitudes[inicio:fin] = np.where(validos, top_coseno, 0)
+        coincidencias[inicio:fin] = np.where(validos, np.take_along_axis(comunes, top, axis=1), 0)
+    return vecinos, similitudes, coincidencias
+
+
+# ===== CÁLCULO Y PERSISTENCIA =====
+
+def _peso_interaccion():
+    return Case(
+        *[When(tipo_interaccion=tipo, then=Value(peso)) for tipo, peso in PESOS_INTERACCION.items()],
+        default=Value(0), output_field=FloatField()
+    )
+
+
+def _interacciones_ponderadas(dias, **filtros):
+    """Filas (user_profile_id, producto_id, peso) agregadas en la base de datos."""
+    return (
+        HistorialNavegacion.objects.filter(
+            user_profile__isnull=False, producto__isnull=False,
+            tipo_interaccion__in=list(PESOS_INTERACCION),
+            timestamp__gte=timezone.now() - timedelta(days=dias),
+            **filtros
+        )
+        .order_by()
+        .values('user_profile_id', 'producto_id')
+        .annotate(peso=Sum(_peso_interaccion()))
+        .values_list('user_profile_id', 'producto_id', 'peso')
+    )
+
+
+def matriz_interacciones(dias=DIAS_HISTORIAL):
+    """(MatrizDispersa usuarios x productos, IDs de usuario por fila, IDs de producto por columna)."""
+    filas = np.array(list(_interacciones_ponderadas(dias)), dtype=np.float64).reshape(-1, 3)
+    ids_usuarios, fila = np.unique(filas[:, 0].astype(np.int64), return_inverse=True)
+    ids_productos, columna = np.unique(filas[:, 1].astype(np.int64), return_inverse=True)
+    matriz = MatrizDispersa.desde_coordenadas(
+        fila, columna, np.log1p(filas[:, 2]), (len(ids_usuarios), len(ids_productos))
+    )
+    return matriz, ids_usuarios, ids_productos
+
+
+def _similitudes(modelo, campo_a, campo_b, campo_comunes, ids, resultado, fecha_calculo):
+    vecinos, similitudes, coincidencias = resultado
+    filas, posiciones = np.nonzero(vecinos >= 0)
+    return [
+        modelo(**{
+            f'{campo_a}_id': int(ids[fila]),
+            f'{campo_b}_id': int(ids[vecinos[fila, posicion]]),
+            'score_similitud': round(float(similitudes[fila, posicion]) * 100, 2),
+            campo_comunes: int(coincidencias[fila, posicion]),
+            'fecha_calculo': fecha_calculo,
+        })
+        for fila, posicion in zip(filas, posiciones)
+    ]
+
+
+def calcular_similitudes(k=K_VECINOS, dias=DIAS_HISTORIAL, tamano_bloque=TAMANO_BLOQUE):
+    """Recalcula y reemplaza los top-k de usuarios y de productos. Retorna (filas de usuarios, filas de productos)."""
+    matriz, ids_usuarios, ids_productos = matriz_interacciones(dias)
+    ahora = timezone.now()
+    usuarios = _similitudes(
+        SimilitudUsuarios, 'user_profile_a', 'user_profile_b', 'productos_comunes',
+        ids_usuarios, vecinos_coseno(matriz, k, tamano_bloque), ahora
+    )
+    productos = _similitudes(
+        SimilitudProductos, 'producto_a', 'producto_b', 'usuarios_comunes',
+        ids_productos, vecinos_coseno(matriz.transpuesta(), k, tamano_bloque), ahora
+    )
+    # Quien lee durante el recálculo ve las similitudes anteriores hasta el commit
+    with transaction.atomic():
+        SimilitudUsuarios.objects.all().delete()
+        SimilitudUsuarios.objects.bulk_create(usuarios, batch_size=2000)
+        SimilitudProductos.objects.all().delete()
+        SimilitudProductos.objects.bulk_create(productos, batch_size=2000)
+    return len(usuarios), len(productos)
+
+
+# ===== CONSULTA =====
+
+def productos_similares(producto_id):
+    """IDs de los productos parecidos, del más al menos parecido."""
+    return list(
+        SimilitudProductos.objects.filter(producto_a_id=producto_id)
+        .order_by('-score_similitud')
+        .values_list('producto_b_id', flat=True)
+    )
+
+
+def recomendar_para_usuario(user_profile_id, dias=DIAS_HISTORIAL):
+    """
+    IDs de productos ordenados por la suma, sobre los vecinos del usuario, de
+    similitud x peso de su interacción; sin los que el usuario ya conoce.
+    """
+    vecinos = dict(
+        SimilitudUsuarios.objects.filter(user_profile_a_id=user_profile_id)
+        .values_list('user_profile_b_id', 'score_similitud')
+    )
+    if not vecinos:
+        return []
+    puntajes, propios = defaultdict(float), set()
+    for usuario, producto_id, peso in _interacciones_ponderadas(
+        dias, user_profile_id__in=[user_profile_id, *vecinos]
+    ):
+        if usuario == user_profile_id:
+            propios.add(producto_id)
+        else:
+            puntajes[producto_id] += vecinos[usuario] * math.log1p(peso)
+    return sorted((p for p in puntajes if p not in propios), key=lambda p: (-puntajes[p], p))
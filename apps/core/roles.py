@@ -0,0 +1,74 @@
+# core/roles.py
+"""
+Resolución de roles de usuario con caché.
+
+Los permisos del admin consultan los roles en cada petición; aquí se resuelven
+una vez por usuario y se guardan en la caché hasta que cambie un UserRol, un Rol
+o un perfil (ver signals.py). Así quitar un rol tiene efecto en la siguiente
+petición, aunque el token del usuario siga vigente.
+"""
+from django.core.cache import cache
+from .models import UserRol
+from .versiones import incrementar_version, version
+
+CODIGOS_ADMIN = ('ADMIN', 'SUPERADMIN')
+CODIGO_SUPERADMIN = 'SUPERADMIN'
+CLAVE_VERSION_ROLES = 'roles:version'
+ROLES_CACHE_TTL = 60 * 60
+
+
+def _clave_usuario(user_id):
+    return f'roles:{version(CLAVE_VERSION_ROLES)}:usuario:{user_id}'
+
+
+def roles_por_usuario_id(user_id):
+    """[(codigo_rol, nombre_rol), ...] del usuario, desde la caché si está disponible."""
+    clave = _clave_usuario(user_id)
+    roles = cache.get(clave)
+    if roles is None:
+        roles = list(
+            UserRol.objects.filter(user_profile__user_id=user_id, rol__isnull=False)
+            .order_by('user_rol_id')
+            .values_list('rol__codigo_rol', 'rol__nombre_rol')
+        )
+        cache.set(clave, roles, ROLES_CACHE_TTL)
+    return roles
+
+
+def roles_de_usuario(user):
+    """Roles de `user`, memorizados en la instancia para el resto de la petición."""
+    if user is None or not user.is_authenticated:
+        return []
+    if not hasattr(user, '_roles_resueltos'):
+        user._roles_resueltos = roles_por_usuario_id(user.pk)
+    return user._roles_resueltos
+
+
+def codigos_roles(user):
+    return {codigo for codigo, _ in roles_de_usuario(user)}
+
+
+def tiene_rol(user, codigos):
+    return not codigos_roles(user).isdisjoint(codigos)
+
+
+def es_administrador(user):
+    """Superusuario de Django o rol ADMIN/SUPERADMIN."""
+    if user is None or not user.is_authenticated:
+        return False
+    return user.is_superuser or tiene_rol(user, CODIGOS_ADMIN)
+
+
+def es_superadministrador(user):
+    if user is None or not user.is_authenticated:
+        return False
+    return user.is_superuser or tiene_rol(user, [CODIGO_SUPERADMIN])
+
+
+def invalidar_roles_usuario(user_id):
+    cache.delete(_clave_usuario(user_id))
+
+
+def invalidar_roles():
+    """Invalida los roles en caché de todos los usuarios."""
+    incrementar_version(CLAVE_VERSION_ROLES)
@@ -1,10 +1,35 @@
+import json
 from rest_framework import serializers
 from .models import (
     Categoria, Subcategoria, Producto, Carrusel, Cliente, 
     PreguntaFrecuente, Carrito, ItemCarrito, ImagenProducto, Marca,
-    UnidadMedida, Proveedor, Terminacion, Acabado, TiempoProduccion
+    UnidadMedida, Proveedor, Terminacion, Acabado, TiempoProduccion, TipoInteraccion
 )
 from apps.orders.models import Pedido, DetallePedido, TamanoPredefinido
+from .precios import MAX_FILAS_COTIZACION
+from .catalogo import obtener_imagen_portada
+from .interacciones import MAX_EVENTOS_LOTE, TIPOS_CLIENTE, TIPOS_CON_PRODUCTO
+
+MAX_LARGO_DATOS_INTERACCION = 2000
+
+def url_absoluta(url, request):
+    if url and request:
+        return request.build_absolute_uri(url)
+    return url
+
+def variantes_imagen(imagen, request):
+    """
+    URLs de las variantes de una imagen para armar srcset/<picture>:
+    {'respaldo': png, 'thumb': {'ancho', 'alto', 'webp', 'avif'}, 'card': {...}, 'detail': {...}}
+    """
+    storage = imagen.imagen.storage
+    datos = {'respaldo': url_absoluta(imagen.imagen.url, request)}
+    for nombre, variante in (imagen.variantes or {}).items():
+        datos[nombre] = {
+            clave: url_absoluta(storage.url(valor), request) if clave not in ('ancho', 'alto') else valor
+            for clave, valor in variante.items()
+        }
+    return datos
 
 class CategoriaSerializer(serializers.ModelSerializer):
     class Meta:
@@ -69,6 +94,7 @@ class ProductoSerializer(serializers.ModelSerializer):
 class ProductoListSerializer(serializers.ModelSerializer):
     """Serializer ligero para listados de productos"""
     imagen_principal = serializers.SerializerMethodField()
+    imagen_principal_variantes = serializers.SerializerMethodField()
     precio_final = serializers.SerializerMethodField()
     caracteristicas_list = serializers.SerializerMethodField()
     categoria_nombre = serializers.CharField(source='subcategoria.categoria.nombre_categoria', read_only=True)
@@ -80,20 +106,32 @@ class ProductoListSerializer(serializers.ModelSerializer):
         fields = [
             'producto_id', 'nombre_producto', 'descripcion_corta', 'detalle_producto',
             'precio_venta', 'precio_oferta', 'es_oferta', 'precio_final',
-            'imagen_principal', 'es_destacado', 'es_novedad', 'es_solucion_inteligente',
-            'stock', 'categoria_nombre', 'subcategoria_nombre', 'marca_nombre',
+            'imagen_principal', 'imagen_principal_variantes', 'es_destacado', 'es_novedad',
+            'es_solucion_inteligente', 'stock', 'categoria_nombre', 'subcategoria_nombre', 'marca_nombre',
             'caracteristicas_list'
         ]
     
     def get_imagen_principal(self, obj):
-        imagen = obj.imagenes.filter(es_principal=True).first() or obj.imagenes.first()
+        """Variante 'card' (WebP) de la imagen principal; el PNG si aún no se procesa"""
+        imagen = self._imagen_principal(obj)
+        if imagen and imagen.imagen:
+            return url_absoluta(imagen.url_variante('card'), self.context.get('request'))
+        return None
+    
+    def get_imagen_principal_variantes(self, obj):
+        imagen = self._imagen_principal(obj)
         if imagen and imagen.imagen:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(imagen.imagen.url)
-            return imagen.imagen.url
+            return variantes_imagen(imagen, self.context.get('request'))
         return None
     
+    def _imagen_principal(self, obj):
+        # ProductoViewSet precarga la imagen con prefetch_imagen_portada(); sin
+        # precarga se consulta una sola vez por producto
+        if not hasattr(obj, 'imagen_portada'):
+            imagen = obtener_imagen_portada(obj)
+            obj.imagen_portada = [imagen] if imagen else []
+        return obtener_imagen_portada(obj)
+    
     def get_precio_final(self, obj):
         return float(obj.precio_final())
     
@@ -102,6 +140,14 @@ class ProductoListSerializer(serializers.ModelSerializer):
             return [c.strip() for c in obj.caracteristicas.split('\n') if c.strip()]
         return []
 
+class ResultadoBusquedaSerializer(ProductoListSerializer):
+    """Producto de /api/productos/buscar/ con su relevancia y los campos resaltados"""
+    rango = serializers.FloatField(source='rango_busqueda', read_only=True)
+    resaltado = serializers.DictField(child=serializers.CharField(allow_blank=True), read_only=True)
+    
+    class Meta(ProductoListSerializer.Meta):
+        fields = ProductoListSerializer.Meta.fields + ['rango', 'resaltado']
+
 class ProductoCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer para crear/actualizar productos"""
     imagenes_upload = serializers.ListField(
@@ -150,18 +196,23 @@ class ProductoCreateUpdateSerializer(serializers.ModelSerializer):
         return instance
     
 class ImagenProductoSerializer(serializers.ModelSerializer):
+    """Imagen para la ficha de producto: 'url' es la variante 'detail' (WebP) o el PNG de respaldo"""
     url = serializers.SerializerMethodField()
+    variantes = serializers.SerializerMethodField()
     
     class Meta:
         model = ImagenProducto
-        fields = ['imagen_producto_id', 'imagen', 'url', 'es_principal', 'orden', 'alt_text']
+        fields = ['imagen_producto_id', 'imagen', 'url', 'variantes', 'es_principal', 'orden', 'alt_text', 'estado_procesamiento']
+        read_only_fields = ['estado_procesamiento']
     
     def get_url(self, obj):
         if obj.imagen:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.imagen.url)
-            return obj.imagen.url
+            return url_absoluta(obj.url_variante('detail'), self.context.get('request'))
+        return None
+    
+    def get_variantes(self, obj):
+        if obj.imagen:
+            return variantes_imagen(obj, self.context.get('request'))
         return None
     
 class ProductoDetailSerializer(serializers.ModelSerializer):
@@ -231,7 +282,10 @@ class PreguntaFrecuenteSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class CalcularPrecioPersonalizadoSerializer(serializers.Serializer):
-    """Serializer para calcular precio dinámico basado en personalización"""
+    """
+    Serializer para calcular precio dinámico basado en personalización.
+    Si recibe 'hoja_precios' en el contexto valida contra ella, sin consultas.
+    """
     ancho_cm = serializers.IntegerField(min_value=1)
     alto_cm = serializers.IntegerField(min_value=1)
     terminacion_id = serializers.IntegerField()
@@ -245,23 +299,37 @@ class CalcularPrecioPersonalizadoSerializer(serializers.Serializer):
     
     def validate_terminacion_id(self, value):
         """Valida que la terminación exista"""
-        if not Terminacion.objects.filter(terminacion_id=value, activo=True).exists():
+        hoja = self.context.get('hoja_precios')
+        if hoja is not None:
+            valida = value in hoja.terminaciones
+        else:
+            valida = Terminacion.objects.filter(terminacion_id=value, activo=True).exists()
+        if not valida:
             raise serializers.ValidationError("Terminación no válida o inactiva")
         return value
     
     def validate_tiempo_produccion_id(self, value):
         """Valida que el tiempo de producción exista"""
-        if not TiempoProduccion.objects.filter(tiempo_produccion_id=value, activo=True).exists():
+        hoja = self.context.get('hoja_precios')
+        if hoja is not None:
+            valido = value in hoja.tiempos
+        else:
+            valido = TiempoProduccion.objects.filter(tiempo_produccion_id=value, activo=True).exists()
+        if not valido:
             raise serializers.ValidationError("Tiempo de producción no válido o inactivo")
         return value
     
     def validate_acabado_ids(self, value):
         """Valida que los acabados existan"""
         if value:
-            acabados_validos = Acabado.objects.filter(
-                acabado_id__in=value,
-                activo=True
-            ).count()
+            hoja = self.context.get('hoja_precios')
+            if hoja is not None:
+                acabados_validos = len(set(value) & hoja.acabados.keys())
+            else:
+                acabados_validos = Acabado.objects.filter(
+                    acabado_id__in=value,
+                    activo=True
+                ).count()
             if acabados_validos != len(value):
                 raise serializers.ValidationError("Uno o más acabados no válidos o inactivos")
         return value or []
@@ -271,7 +339,99 @@ class CalcularPrecioPersonalizadoSerializer(serializers.Serializer):
         if data['ancho_cm'] <= 0 or data['alto_cm'] <= 0:
             raise serializers.ValidationError("Las dimensiones deben ser mayores a 0")
         return data
-    
+
+class ItemCotizacionSerializer(serializers.Serializer):
+    """Una fila de cotización por lote (la existencia de las opciones se informa por fila)"""
+    ancho_cm = serializers.IntegerField(min_value=1)
+    alto_cm = serializers.IntegerField(min_value=1)
+    terminacion_id = serializers.IntegerField()
+    tiempo_produccion_id = serializers.IntegerField()
+    cantidad = serializers.IntegerField(min_value=1, default=1)
+    acabado_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list
+    )
+
+class GrillaCotizacionSerializer(serializers.Serializer):
+    """
+    Especificación cartesiana de una grilla de precios. Las medidas se indican como
+    pares [ancho, alto] en 'medidas' o como ejes independientes 'ancho_cm' × 'alto_cm'.
+    """
+    medidas = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=2, max_length=2),
+        required=False,
+        min_length=1
+    )
+    ancho_cm = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, min_length=1)
+    alto_cm = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, min_length=1)
+    terminacion_id = serializers.ListField(child=serializers.IntegerField(), min_length=1)
+    tiempo_produccion_id = serializers.ListField(child=serializers.IntegerField(), min_length=1)
+    cantidad = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, min_length=1)
+    acabado_ids = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField(), allow_empty=True),
+        required=False,
+        min_length=1
+    )
+
+    def validate(self, data):
+        if 'medidas' in data:
+            if 'ancho_cm' in data or 'alto_cm' in data:
+                raise serializers.ValidationError("Use 'medidas' o 'ancho_cm' y 'alto_cm', no ambos")
+        elif 'ancho_cm' not in data or 'alto_cm' not in data:
+            raise serializers.ValidationError("Debe indicar 'medidas' o bien 'ancho_cm' y 'alto_cm'")
+        data.setdefault('cantidad', [1])
+        data.setdefault('acabado_ids', [[]])
+        return data
+
+class CotizarLoteSerializer(serializers.Serializer):
+    """Cotización por lote: una lista de filas ('items') o una grilla cartesiana ('grilla')"""
+    items = ItemCotizacionSerializer(many=True, required=False, allow_empty=False)
+    grilla = GrillaCotizacionSerializer(required=False)
+
+    def validate(self, data):
+        if ('items' in data) == ('grilla' in data):
+            raise serializers.ValidationError("Debe enviar 'items' o 'grilla' (solo uno)")
+        if 'grilla' in data:
+            grilla = data['grilla']
+            forma = [len(grilla['medidas'])] if 'medidas' in grilla else [len(grilla['ancho_cm']), len(grilla['alto_cm'])]
+            forma += [len(grilla[eje]) for eje in ('terminacion_id', 'tiempo_produccion_id', 'cantidad', 'acabado_ids')]
+            data['forma'] = forma
+            filas = 1
+            for largo in forma:
+                filas *= largo
+        else:
+            filas = len(data['items'])
+        if filas > MAX_FILAS_COTIZACION:
+            raise serializers.ValidationError(
+                f"La cotización excede el máximo de {MAX_FILAS_COTIZACION} filas ({filas})"
+            )
+        return data
+
+class EventoInteraccionSerializer(serializers.Serializer):
+    """Una interacción informada por el frontend (ver core/interacciones.py)"""
+    tipo = serializers.ChoiceField(choices=TIPOS_CLIENTE)
+    producto_id = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    categoria_id = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    timestamp = serializers.DateTimeField(required=False)
+    duracion_segundos = serializers.IntegerField(required=False, allow_null=True, min_value=0, max_value=86400)
+    datos = serializers.DictField(required=False)
+
+    def validate(self, data):
+        if data['tipo'] in TIPOS_CON_PRODUCTO and not data.get('producto_id'):
+            raise serializers.ValidationError(f"'{data['tipo']}' requiere producto_id")
+        if data['tipo'] == TipoInteraccion.CATEGORY_VISIT and not data.get('categoria_id'):
+            raise serializers.ValidationError("'category_visit' requiere categoria_id")
+        if len(json.dumps(data.get('datos') or {}, default=str)) > MAX_LARGO_DATOS_INTERACCION:
+            raise serializers.ValidationError(
+                f"'datos' excede los {MAX_LARGO_DATOS_INTERACCION} caracteres"
+            )
+        return data
+
+class LoteInteraccionesSerializer(serializers.Serializer):
+    sesion_id = serializers.CharField(max_length=100)
+    eventos = EventoInteraccionSerializer(many=True, allow_empty=False, max_length=MAX_EVENTOS_LOTE)
+
 class CarritoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Carrito
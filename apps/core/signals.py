@@ -0,0 +1,129 @@
+# core/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import (
+    Categoria, Subcategoria, Producto, ImagenProducto, Marca,
+    Terminacion, TiempoProduccion, Acabado, ProductoAcabado,
+    Rol, UserProfile, UserRol
+)
+from .autocompletado import aplicar_cambio, filas_producto
+from .catalogo import invalidar_catalogo
+from .metricas import invalidar_metricas
+from .precios import invalidar_hojas_precios
+from .roles import invalidar_roles, invalidar_roles_usuario
+
+# Campos de Producto que no aparecen en el catálogo público
+CAMPOS_FUERA_DEL_CATALOGO = {'vistas', 'ventas_totales', 'stock'}
+# Campos de Producto que no forman parte de la hoja de precios
+CAMPOS_FUERA_DE_HOJA_PRECIOS = {'vistas', 'ventas_totales'}
+# Campos de Producto que no aparecen en las métricas del panel
+CAMPOS_FUERA_DE_METRICAS = {'vistas', 'ventas_totales'}
+
+
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=Subcategoria)
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=ImagenProducto)
+def invalidar_catalogo_por_cambio(sender, update_fields=None, **kwargs):
+    """Invalida la caché del catálogo cuando se confirma un cambio en sus modelos."""
+    if sender is Producto and update_fields and set(update_fields) <= CAMPOS_FUERA_DEL_CATALOGO:
+        return
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_hoja_precios_producto(sender, instance, update_fields=None, **kwargs):
+    """Invalida la hoja de precios del producto (incluye cambios de stock)."""
+    if update_fields and set(update_fields) <= CAMPOS_FUERA_DE_HOJA_PRECIOS:
+        return
+    producto_id = instance.pk
+    transaction.on_commit(lambda: invalidar_hojas_precios([producto_id]))
+
+
+@receiver([post_save, post_delete], sender=Terminacion)
+@receiver([post_save, post_delete], sender=TiempoProduccion)
+@receiver([post_save, post_delete], sender=ProductoAcabado)
+def invalidar_hoja_precios_opcion(sender, instance, **kwargs):
+    """Invalida la hoja de precios del producto dueño de la opción modificada."""
+    producto_id = instance.producto_id
+    transaction.on_commit(lambda: invalidar_hojas_precios([producto_id]))
+
+
+@receiver(post_save, sender=Acabado)
+def invalidar_hojas_precios_acabado(sender, instance, **kwargs):
+    """Los acabados se comparten: invalida las hojas de todos los productos que lo usan."""
+    producto_ids = list(
+        ProductoAcabado.objects.filter(acabado_id=instance.pk).values_list('producto_id', flat=True)
+    )
+    if producto_ids:
+        transaction.on_commit(lambda: invalidar_hojas_precios(producto_ids))
+
+
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=Subcategoria)
+def invalidar_metricas_productos(sender, update_fields=None, **kwargs):
+    """Invalida las métricas de productos del panel (contadores y desglose por categoría)."""
+    if sender is Producto and update_fields and set(update_fields) <= CAMPOS_FUERA_DE_METRICAS:
+        return
+    transaction.on_commit(lambda: invalidar_metricas('productos'))
+
+
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=Marca)
+@receiver([post_save, post_delete], sender=Subcategoria)
+def actualizar_autocompletado(sender, instance, signal, update_fields=None, **kwargs):
+    """Reemplaza las sugerencias del objeto en el índice de autocompletado al confirmar."""
+    if sender is Producto and update_fields and set(update_fields) <= CAMPOS_FUERA_DEL_CATALOGO:
+        return
+    visible = signal is post_save and instance.activo
+    if sender is Producto:
+        filas = list(filas_producto(instance.pk, instance.nombre_producto, instance.sku))
+        tipos = ('producto', 'sku')
+    elif sender is Marca:
+        filas = [('marca', instance.pk, instance.nombre_marca)]
+        tipos = ('marca',)
+    else:
+        filas = [('subcategoria', instance.pk, instance.nombre_subcategoria)]
+        tipos = ('subcategoria',)
+    id_objeto = instance.pk
+
+    def cambio(indice):
+        for tipo in tipos:
+            indice.eliminar(tipo, id_objeto)
+        if visible:
+            for fila in filas:
+                indice.agregar(*fila)
+
+    transaction.on_commit(lambda: aplicar_cambio(cambio))
+
+
+@receiver([post_save, post_delete], sender=UserRol)
+def invalidar_roles_por_asignacion(sender, instance, signal, created=False, **kwargs):
+    """Asignar o quitar un rol invalida al usuario; editar una asignación puede moverla de perfil."""
+    if signal is post_save and not created:
+        transaction.on_commit(invalidar_roles)
+        return
+    user_id = (
+        UserProfile.objects.filter(pk=instance.user_profile_id).values_list('user_id', flat=True).first()
+        if instance.user_profile_id else None
+    )
+    if user_id is not None:
+        transaction.on_commit(lambda: invalidar_roles_usuario(user_id))
+
+
+@receiver([post_save, post_delete], sender=Rol)
+def invalidar_roles_por_rol(sender, **kwargs):
+    """Un cambio en el código o nombre de un rol afecta a todos sus usuarios."""
+    transaction.on_commit(invalidar_roles)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidar_roles_por_perfil(sender, instance, created=False, **kwargs):
+    """
+    Un perfil existente puede cambiar de usuario o eliminarse (sus UserRol quedan
+    en NULL sin emitir señales); un perfil nuevo todavía no tiene roles.
+    """
+    if not created:
+        transaction.on_commit(invalidar_roles)
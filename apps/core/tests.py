@@ -1,3 +1,893 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from . import (
+    autocompletado, busqueda, contador_vistas, correos, estadisticas_visitas, interacciones, recomendaciones, visitas
+)
+from .models import (
+    Categoria, Subcategoria, Producto, ImagenProducto, Terminacion, TiempoProduccion,
+    Acabado, ProductoAcabado, EstadoProcesamientoImagen, Marca, CorreoSalida, EstadoCorreo,
+    AgenteUsuario, VisitaPagina, VisitaRutaHora, VisitaRutaDia, UserProfile,
+    HistorialNavegacion, PerfilComportamiento, TipoInteraccion, SimilitudUsuarios, SimilitudProductos
+)
+
+
+def crear_catalogo(n_categorias, n_subcategorias, n_productos, prefijo='cat'):
+    """Crea un catálogo de prueba con una imagen principal por producto."""
+    for c in range(n_categorias):
+        categoria = Categoria.objects.create(nombre_categoria=f'{prefijo}-{c}')
+        for s in range(n_subcategorias):
+            subcategoria = Subcategoria.objects.create(
+                nombre_subcategoria=f'{prefijo}-{c}-{s}', categoria=categoria
+            )
+            for p in range(n_productos):
+                producto = Producto.objects.create(
+                    nombre_producto=f'{prefijo}-{c}-{s}-{p}',
+                    subcategoria=subcategoria,
+                    precio_venta=1500 * (p + 1),
+                )
+                ImagenProducto.objects.create(
+                    producto=producto, imagen=f'productos/{producto.pk}/secundaria.png', orden=1
+                )
+                ImagenProducto.objects.create(
+                    producto=producto, imagen=f'productos/{producto.pk}/principal.png', es_principal=True
+                )
+
+
+class CategoriasConProductosTests(TestCase):
+    url = reverse('categorias-con-productos')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_estructura_del_arbol(self):
+        crear_catalogo(1, 1, 2)
+        Producto.objects.filter(nombre_producto='cat-0-0-1').update(activo=False)
+
+        datos = self.client.get(self.url).json()
+
+        self.assertEqual(len(datos), 1)
+        productos = datos[0]['subcategories'][0]['products']
+        self.assertEqual([p['name'] for p in productos], ['cat-0-0-0'])
+        self.assertEqual(productos[0]['price'], '$1.500')
+        self.assertTrue(productos[0]['image'].endswith('/principal.png'))
+
+    def test_consultas_constantes_segun_tamano_del_catalogo(self):
+        crear_catalogo(1, 1, 1, prefijo='chico')
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_catalogo(4, 3, 5, prefijo='grande')
+        with self.assertNumQueries(4):
+            respuesta = self.client.get(self.url)
+
+        self.assertEqual(len(respuesta.json()), 5)
+
+    def test_respuesta_en_cache_y_etag(self):
+        crear_catalogo(1, 1, 1)
+        primera = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get(self.url)
+            no_modificada = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(no_modificada.status_code, 304)
+        self.assertEqual(no_modificada['ETag'], primera['ETag'])
+
+    def test_cambio_en_producto_invalida_la_cache(self):
+        crear_catalogo(1, 1, 1)
+        primera = self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Producto.objects.get()
+            producto.nombre_producto = 'Renombrado'
+            producto.save()
+
+        segunda = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 200)
+        self.assertNotEqual(segunda['ETag'], primera['ETag'])
+        self.assertEqual(segunda.json()[0]['subcategories'][0]['products'][0]['name'], 'Renombrado')
+
+
+def crear_producto_personalizable(stock=100):
+    """Producto con dos terminaciones, dos tiempos de producción y dos acabados."""
+    categoria = Categoria.objects.create(nombre_categoria='Gran formato')
+    subcategoria = Subcategoria.objects.create(nombre_subcategoria='Pendones', categoria=categoria)
+    producto = Producto.objects.create(nombre_producto='Pendón', subcategoria=subcategoria, stock=stock)
+    terminaciones = [
+        Terminacion.objects.create(producto=producto, nombre_terminacion='Tela PVC', precio=1290),
+        Terminacion.objects.create(producto=producto, nombre_terminacion='Vinilo', precio=2475),
+    ]
+    tiempos = [
+        TiempoProduccion.objects.create(producto=producto, nombre_tiempo='Normal', dias_estimados=5, precio=0),
+        TiempoProduccion.objects.create(producto=producto, nombre_tiempo='Urgente', dias_estimados=1, precio=3500),
+    ]
+    acabados = [
+        Acabado.objects.create(nombre_acabado='Ojetillos', costo_adicional=2),
+        Acabado.objects.create(nombre_acabado='Laminado', costo_adicional=3),
+    ]
+    for orden, acabado in enumerate(acabados):
+        ProductoAcabado.objects.create(producto=producto, acabado=acabado, orden=orden)
+    return producto, terminaciones, tiempos, acabados
+
+
+class CalcularPrecioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producto, self.terminaciones, self.tiempos, self.acabados = crear_producto_personalizable()
+        self.url = reverse('producto-calcular-precio', args=[self.producto.pk])
+        self.datos = {
+            'ancho_cm': 120, 'alto_cm': 85,
+            'terminacion_id': self.terminaciones[1].pk,
+            'tiempo_produccion_id': self.tiempos[1].pk,
+            'cantidad': 3,
+            'acabado_ids': [self.acabados[0].pk, self.acabados[1].pk],
+        }
+
+    def test_cotizacion_coincide_con_el_modelo(self):
+        respuesta = self.client.post(self.url, self.datos, content_type='application/json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json(), self.producto.calcular_precio_personalizado(**self.datos))
+        # ((120 × 85 × 6 × 2475) / 10000) + 3500 = 18647
+        self.assertEqual(respuesta.json()['precio_unitario'], 18647)
+
+    def test_cotizacion_en_caliente_no_consulta_la_bd(self):
+        self.client.post(self.url, self.datos, content_type='application/json')
+
+        with self.assertNumQueries(0):
+            respuesta = self.client.post(self.url, self.datos, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_cambio_de_precio_invalida_la_hoja(self):
+        self.client.post(self.url, self.datos, content_type='application/json')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            terminacion = self.terminaciones[1]
+            terminacion.precio = 5000
+            terminacion.save()
+
+        respuesta = self.client.post(self.url, self.datos, content_type='application/json')
+        self.assertEqual(respuesta.json()['terminacion']['precio_por_100cm'], 5000)
+
+    def test_stock_insuficiente(self):
+        self.datos['cantidad'] = 101
+        respuesta = self.client.post(self.url, self.datos, content_type='application/json')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['mensaje'], 'Stock insuficiente. Disponibles: 100')
+
+
+class CotizarLoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producto, self.terminaciones, self.tiempos, self.acabados = crear_producto_personalizable(stock=50)
+        self.url = reverse('producto-cotizar-lote', args=[self.producto.pk])
+
+    def assertParidadConRutaEscalar(self, datos):
+        """Cada fila debe coincidir con Producto.calcular_precio_personalizado."""
+        columnas = datos['columnas']
+        errores = {e['fila']: e['mensaje'] for e in datos['errores']}
+        for i, fila in enumerate(datos['filas']):
+            item = dict(zip(columnas, fila))
+            esperado = self.producto.calcular_precio_personalizado(
+                item['ancho_cm'], item['alto_cm'], item['terminacion_id'], item['tiempo_produccion_id'],
+                cantidad=item['cantidad'], acabado_ids=item['acabado_ids']
+            )
+            if esperado['error']:
+                self.assertEqual(errores.get(i), esperado['mensaje'])
+                self.assertIsNone(item['precio_unitario'])
+            else:
+                self.assertNotIn(i, errores)
+                self.assertEqual(item['precio_unitario'], esperado['precio_unitario'])
+                self.assertEqual(item['precio_total'], esperado['precio_total'])
+
+    def test_grilla_coincide_con_la_ruta_escalar(self):
+        sin_precio = Terminacion.objects.create(producto=self.producto, nombre_terminacion='Sin precio', precio=None)
+        ojetillos, laminado = self.acabados
+        grilla = {
+            'medidas': [[1, 1], [33, 7], [120, 85], [99, 101], [400, 250], [10000, 9999]],
+            'terminacion_id': [t.pk for t in self.terminaciones] + [sin_precio.pk, 999999],
+            'tiempo_produccion_id': [t.pk for t in self.tiempos] + [999999],
+            'cantidad': [1, 7, 50, 51],
+            'acabado_ids': [[], [ojetillos.pk], [ojetillos.pk, laminado.pk], [laminado.pk, laminado.pk], [999999]],
+        }
+        respuesta = self.client.post(self.url, {'grilla': grilla}, content_type='application/json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(datos['forma'], [6, 4, 3, 4, 5])
+        self.assertEqual(len(datos['filas']), 6 * 4 * 3 * 4 * 5)
+        self.assertParidadConRutaEscalar(datos)
+
+    def test_items_coinciden_con_la_ruta_escalar(self):
+        vinilo, urgente = self.terminaciones[1].pk, self.tiempos[1].pk
+        items = [
+            {'ancho_cm': 120, 'alto_cm': 85, 'terminacion_id': vinilo, 'tiempo_produccion_id': urgente,
+             'cantidad': 3, 'acabado_ids': [a.pk for a in self.acabados]},
+            {'ancho_cm': 77, 'alto_cm': 13, 'terminacion_id': vinilo, 'tiempo_produccion_id': urgente},
+            {'ancho_cm': 77, 'alto_cm': 13, 'terminacion_id': 999999, 'tiempo_produccion_id': urgente},
+        ]
+        respuesta = self.client.post(self.url, {'items': items}, content_type='application/json')
+
+        datos = respuesta.json()
+        self.assertEqual(datos['filas'][0][-2:], [18647, 55941])
+        self.assertEqual([e['fila'] for e in datos['errores']], [2])
+        self.assertParidadConRutaEscalar(datos)
+
+    def test_montos_fuera_del_rango_exacto_usan_la_ruta_escalar(self):
+        Terminacion.objects.filter(pk=self.terminaciones[0].pk).update(precio=2 ** 40)
+        items = [{'ancho_cm': 10 ** 6, 'alto_cm': 10 ** 6, 'terminacion_id': self.terminaciones[0].pk,
+                  'tiempo_produccion_id': self.tiempos[0].pk}]
+        respuesta = self.client.post(self.url, {'items': items}, content_type='application/json')
+
+        self.assertParidadConRutaEscalar(respuesta.json())
+
+    def test_limite_de_filas(self):
+        grilla = {
+            'ancho_cm': list(range(1, 101)), 'alto_cm': list(range(1, 101)),
+            'terminacion_id': [self.terminaciones[0].pk], 'tiempo_produccion_id': [self.tiempos[0].pk],
+        }
+        respuesta = self.client.post(self.url, {'grilla': grilla}, content_type='application/json')
+
+        self.assertEqual(respuesta.status_code, 400)
+
+
+def archivo_png(nombre, tamano=(1600, 1200), modo='RGBA'):
+    buffer = io.BytesIO()
+    Image.new(modo, tamano, (200, 30, 30, 128) if modo == 'RGBA' else 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+
+class ProcesamientoImagenesTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        categoria = Categoria.objects.create(nombre_categoria='Fotos')
+        subcategoria = Subcategoria.objects.create(nombre_subcategoria='Fotos', categoria=categoria)
+        self.producto = Producto.objects.create(nombre_producto='Foto', subcategoria=subcategoria)
+
+    def test_la_subida_queda_pendiente_y_el_worker_la_procesa(self):
+        imagen = ImagenProducto.objects.create(producto=self.producto, imagen=archivo_png('foto.png'))
+        self.assertEqual(imagen.estado_procesamiento, EstadoProcesamientoImagen.PENDIENTE)
+        self.assertIn('temp_', imagen.imagen.name)
+
+        call_command('procesar_imagenes', stdout=io.StringIO())
+
+        imagen.refresh_from_db()
+        self.assertEqual(imagen.estado_procesamiento, EstadoProcesamientoImagen.LISTO)
+        self.assertEqual(imagen.imagen.name, f'productos/{self.producto.pk}/{imagen.pk}.png')
+        with Image.open(imagen.imagen.path) as procesada:
+            self.assertEqual((procesada.size, procesada.mode), ((800, 600), 'RGB'))
+
+        # Variantes por ancho, con la proporción original
+        self.assertEqual(
+            {nombre: (v['ancho'], v['alto']) for nombre, v in imagen.variantes.items()},
+            {'thumb': (240, 180), 'card': (480, 360), 'detail': (1200, 900)}
+        )
+        with Image.open(os.path.join(settings.MEDIA_ROOT, imagen.variantes['card']['webp'])) as card:
+            self.assertEqual((card.format, card.size), ('WEBP', (480, 360)))
+
+        listado = self.client.get(reverse('producto-list')).json()[0]
+        self.assertTrue(listado['imagen_principal'].endswith(f'/{imagen.pk}_card.webp'))
+        self.assertTrue(listado['imagen_principal_variantes']['respaldo'].endswith(f'/{imagen.pk}.png'))
+        detalle = self.client.get(reverse('producto-detail', args=[self.producto.pk])).json()
+        self.assertTrue(detalle['imagenes'][0]['url'].endswith(f'/{imagen.pk}_detail.webp'))
+
+    def test_archivo_corrupto_queda_con_error(self):
+        imagen = ImagenProducto.objects.create(
+            producto=self.producto, imagen=SimpleUploadedFile('roto.png', b'no es una imagen')
+        )
+
+        call_command('procesar_imagenes', stdout=io.StringIO())
+
+        imagen.refresh_from_db()
+        self.assertEqual(imagen.estado_procesamiento, EstadoProcesamientoImagen.ERROR)
+        self.assertTrue(imagen.error_procesamiento)
+
+
+class ListadoProductosConsultasTests(TestCase):
+    """El listado de productos usa un número de consultas independiente del tamaño de la página."""
+
+    def contar_consultas(self, cliente, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta.json()
+
+    def test_listado_publico_no_crece_con_los_productos(self):
+        crear_catalogo(1, 1, 1, prefijo='uno')
+        con_uno, listado = self.contar_consultas(self.client, reverse('producto-list'))
+        crear_catalogo(1, 2, 5, prefijo='diez')
+        con_once, listado = self.contar_consultas(self.client, reverse('producto-list'))
+
+        self.assertEqual(len(listado), 11)
+        self.assertEqual(con_uno, con_once)
+        # Se mantiene la imagen principal aunque no sea la de menor orden
+        self.assertTrue(all(p['imagen_principal'].endswith('/principal.png') for p in listado))
+
+    def test_listado_admin_no_crece_con_los_productos(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        url = reverse('productos-admin-list')
+        crear_catalogo(1, 1, 1, prefijo='uno')
+        con_uno, _ = self.contar_consultas(cliente, url)
+        crear_catalogo(1, 2, 5, prefijo='diez')
+        con_once, listado = self.contar_consultas(cliente, url)
+
+        self.assertEqual(len(listado), 11)
+        self.assertEqual(con_uno, con_once)
+        self.assertTrue(all(p['imagen_principal'].endswith('/principal.png') for p in listado))
+
+
+class PaginacionCursorTests(TestCase):
+    url = reverse('producto-list')
+
+    def setUp(self):
+        crear_catalogo(1, 1, 25)
+        self.esperados = list(
+            Producto.objects.order_by('nombre_producto', 'pk').values_list('nombre_producto', flat=True)
+        )
+
+    def test_sin_parametros_devuelve_la_lista_completa(self):
+        respuesta = self.client.get(self.url).json()
+        self.assertIsInstance(respuesta, list)
+        self.assertEqual(len(respuesta), 25)
+
+    def test_recorre_todas_las_paginas_en_orden_y_vuelve_atras(self):
+        pagina = self.client.get(self.url, {'page_size': 10, 'total': 1}).json()
+        self.assertEqual(pagina['count'], 25)
+        self.assertIsNone(pagina['previous'])
+        nombres, paginas = [], []
+        while True:
+            paginas.append(pagina)
+            nombres += [p['nombre_producto'] for p in pagina['results']]
+            if not pagina['next']:
+                break
+            pagina = self.client.get(pagina['next']).json()
+
+        self.assertEqual(nombres, self.esperados)
+        self.assertEqual([len(p['results']) for p in paginas], [10, 10, 5])
+
+        anterior = self.client.get(paginas[2]['previous']).json()
+        self.assertEqual(anterior['results'], paginas[1]['results'])
+        primera = self.client.get(anterior['previous']).json()
+        self.assertEqual(primera['results'], paginas[0]['results'])
+        self.assertIsNone(primera['previous'])
+
+    def test_paginas_profundas_cuestan_lo_mismo_que_la_primera(self):
+        primera = self.client.get(self.url, {'page_size': 5}).json()
+        with CaptureQueriesContext(connection) as consultas_primera:
+            self.client.get(self.url, {'page_size': 5})
+        siguiente = self.client.get(primera['next']).json()
+        siguiente = self.client.get(siguiente['next']).json()
+        with CaptureQueriesContext(connection) as consultas_profunda:
+            self.client.get(siguiente['next'])
+        self.assertEqual(len(consultas_primera), len(consultas_profunda))
+        self.assertNotIn('OFFSET', consultas_profunda.captured_queries[0]['sql'])
+
+    def test_cursor_invalido(self):
+        respuesta = self.client.get(self.url, {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class BusquedaProductosTests(TestCase):
+    url = reverse('producto-buscar')
+
+    def setUp(self):
+        cache.clear()
+        busqueda._indice_local['version'] = None
+        categoria = Categoria.objects.create(nombre_categoria='Gran formato')
+        subcategoria = Subcategoria.objects.create(nombre_subcategoria='Pendones', categoria=categoria)
+
+        def crear(nombre, descripcion='', **extra):
+            return Producto.objects.create(
+                nombre_producto=nombre, descripcion_corta=descripcion, subcategoria=subcategoria, **extra
+            )
+
+        self.roller = crear('Pendón Roller 80x200', 'Estructura de aluminio', sku='PEN-ROLLER')
+        self.lona = crear('Lona impresa', 'Ideal para pendones y letreros', sku='LON-01')
+        self.tarjetas = crear('Tarjetas de presentación', 'Papel couché 350 g', sku='TAR-01')
+        self.antiguo = crear('Pendón antiguo', activo=False, sku='PEN-OLD')
+
+    def buscar(self, texto):
+        respuesta = self.client.get(self.url, {'q': texto})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()['resultados']
+
+    def test_ignora_acentos_y_plurales_y_ordena_por_peso_del_campo(self):
+        resultados = self.buscar('pendones')
+
+        # El nombre pesa más que la descripción; los inactivos no aparecen
+        self.assertEqual([r['producto_id'] for r in resultados], [self.roller.pk, self.lona.pk])
+        self.assertGreater(resultados[0]['rango'], resultados[1]['rango'])
+        self.assertEqual(resultados[0]['resaltado']['nombre_producto'], '<mark>Pendón</mark> Roller 80x200')
+        self.assertEqual(
+            resultados[1]['resaltado']['descripcion_corta'], 'Ideal para <mark>pendones</mark> y letreros'
+        )
+
+    def test_todos_los_terminos_deben_coincidir(self):
+        self.assertEqual([r['producto_id'] for r in self.buscar('pendon aluminio')], [self.roller.pk])
+        self.assertEqual(self.buscar('pendon couche'), [])
+
+    def test_tolera_errores_de_tipeo(self):
+        self.assertEqual([r['producto_id'] for r in self.buscar('tarjteas')], [self.tarjetas.pk])
+
+    def test_el_indice_se_actualiza_con_el_catalogo(self):
+        self.assertEqual(self.buscar('adhesivo'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tarjetas.nombre_producto = 'Adhesivos troquelados'
+            self.tarjetas.save()
+        self.assertEqual([r['producto_id'] for r in self.buscar('adhesivo')], [self.tarjetas.pk])
+
+    def test_consulta_vacia(self):
+        self.assertEqual(self.client.get(self.url, {'q': ' '}).status_code, 400)
+
+    def test_busqueda_del_admin_incluye_inactivos_y_prefijo_de_sku(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        url = reverse('productos-admin-list')
+
+        por_texto = cliente.get(url, {'search': 'pendón'}).json()
+        por_sku = cliente.get(url, {'search': 'pen-'}).json()
+
+        self.assertEqual(
+            {p['producto_id'] for p in por_texto}, {self.roller.pk, self.lona.pk, self.antiguo.pk}
+        )
+        self.assertEqual({p['producto_id'] for p in por_sku}, {self.roller.pk, self.antiguo.pk})
+
+
+class AutocompletadoTests(TestCase):
+    url = reverse('producto-autocompletar')
+
+    def setUp(self):
+        cache.clear()
+        autocompletado._indice.update(version=None, indice=None)
+        categoria = Categoria.objects.create(nombre_categoria='Gran formato')
+        self.subcategoria = Subcategoria.objects.create(nombre_subcategoria='Pendones', categoria=categoria)
+        self.marca = Marca.objects.create(nombre_marca='Rolland')
+        self.roller = Producto.objects.create(
+            nombre_producto='Pendón Roller 80x200', sku='PEN-ROLLER', subcategoria=self.subcategoria
+        )
+
+    def sugerencias(self, texto):
+        return [(s['tipo'], s['id']) for s in self.client.get(self.url, {'q': texto}).json()['sugerencias']]
+
+    def test_prefijo_al_inicio_y_en_palabras_interiores(self):
+        self.assertEqual(
+            self.sugerencias('Pend'), [('producto', self.roller.pk), ('subcategoria', self.subcategoria.pk)]
+        )
+        # El comienzo del texto pesa más que una palabra interior
+        self.assertEqual(
+            self.sugerencias('roll'),
+            [('marca', self.marca.pk), ('producto', self.roller.pk), ('sku', self.roller.pk)]
+        )
+        self.assertEqual(self.sugerencias('pen-r'), [('sku', self.roller.pk)])
+        self.assertEqual(self.sugerencias(''), [])
+
+    def test_cambios_se_aplican_sin_reconstruir_ni_consultar(self):
+        self.sugerencias('pend')
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = Producto.objects.create(nombre_producto='Pendón Araña', subcategoria=self.subcategoria)
+            self.roller.activo = False
+            self.roller.save()
+
+        with self.assertNumQueries(0):
+            sugerencias = self.sugerencias('pend')
+        self.assertEqual(sugerencias, [('producto', nuevo.pk), ('subcategoria', self.subcategoria.pk)])
+
+    def test_otro_proceso_invalida_el_indice_local(self):
+        self.sugerencias('pend')
+        # Un cambio registrado por otro proceso sólo avanza la versión compartida
+        Producto.objects.filter(pk=self.roller.pk).update(nombre_producto='Bandera')
+        cache.incr(autocompletado.CLAVE_VERSION_AUTOCOMPLETADO)
+
+        self.assertEqual(self.sugerencias('band'), [('producto', self.roller.pk)])
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CONTACT_EMAIL='ventas@example.com'
+)
+class CorreoSalidaTests(TestCase):
+    def enviar_contacto(self, **extra):
+        datos = {'nombre': 'Ana', 'email': 'ana@example.com', 'asunto': 'Pendones', 'mensaje': 'Precio de 3 & 4'}
+        datos.update(extra)
+        return self.client.post(reverse('send_contact_email'), datos, content_type='application/json')
+
+    def test_la_vista_solo_encola_y_el_worker_envia(self):
+        respuesta = self.enviar_contacto()
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(CorreoSalida.objects.filter(estado=EstadoCorreo.PENDIENTE).count(), 2)
+
+        call_command('enviar_correos', stdout=io.StringIO())
+
+        negocio, confirmacion = mail.outbox
+        self.assertEqual((negocio.to, negocio.subject), (['ventas@example.com'], 'Contacto Web: Pendones'))
+        self.assertIn('Teléfono: No proporcionado', negocio.body)
+        self.assertIn('Precio de 3 & 4', negocio.body)
+        self.assertEqual(confirmacion.to, ['ana@example.com'])
+        self.assertFalse(CorreoSalida.objects.exclude(estado=EstadoCorreo.ENVIADO).exists())
+
+        call_command('enviar_correos', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_un_lote_reutiliza_la_conexion(self):
+        for i in range(3):
+            correos.encolar_correo('emails/contacto_confirmacion', f'c{i}@example.com', 'Hola', {'nombre': 'Ana'})
+        conexiones = []
+        original = correos.get_connection
+
+        def contar_conexiones(*args, **kwargs):
+            conexiones.append(original(*args, **kwargs))
+            return conexiones[-1]
+
+        correos.get_connection = contar_conexiones
+        self.addCleanup(setattr, correos, 'get_connection', original)
+        self.assertEqual(correos.enviar_pendientes(), (3, 0))
+        self.assertEqual(len(conexiones), 1)
+
+    def test_fallo_se_reintenta_con_espera_creciente(self):
+        correo = correos.encolar_correo('emails/no_existe', 'ana@example.com', 'Hola')
+
+        antes = timezone.now()
+        self.assertEqual(correos.enviar_pendientes(), (0, 1))
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.intentos), (EstadoCorreo.PENDIENTE, 1))
+        self.assertTrue(correo.ultimo_error)
+        self.assertGreaterEqual(correo.proximo_intento, antes + correos.ESPERA_BASE_REINTENTO)
+        # Aún no vence la espera: el worker no lo vuelve a tomar
+        self.assertEqual(correos.enviar_pendientes(), (0, 0))
+
+        for intento in range(2, correos.MAX_INTENTOS + 1):
+            CorreoSalida.objects.filter(pk=correo.pk).update(proximo_intento=timezone.now())
+            correos.enviar_pendientes()
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.intentos), (EstadoCorreo.ERROR, correos.MAX_INTENTOS))
+        self.assertEqual(correos.espera_reintento(2), 2 * correos.ESPERA_BASE_REINTENTO)
+        self.assertEqual(mail.outbox, [])
+
+
+class ContadorVistasTests(TestCase):
+    def setUp(self):
+        # Descarta vistas acumuladas por otras pruebas
+        contador_vistas.contador_vistas._tomar_pendientes()
+        categoria = Categoria.objects.create(nombre_categoria='Imprenta')
+        subcategoria = Subcategoria.objects.create(nombre_subcategoria='Tarjetas', categoria=categoria)
+        self.productos = [
+            Producto.objects.create(nombre_producto=f'Tarjeta {i}', subcategoria=subcategoria) for i in range(3)
+        ]
+
+    def vistas(self):
+        return [p.vistas for p in Producto.objects.order_by('pk')]
+
+    def test_hilos_concurrentes_sin_perdidas_y_un_update(self):
+        contador = contador_vistas.ContadorVistas(intervalo=3600, max_pendientes=10 ** 9)
+
+        def ver(numero):
+            for i in range(500):
+                contador.registrar(self.productos[(numero + i) % 3].pk)
+
+        threads = [threading.Thread(target=ver, args=(n,)) for n in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.vistas(), [0, 0, 0])
+        with self.assertNumQueries(1):
+            contador.vaciar()
+        self.assertEqual(self.vistas(), [1000, 1000, 1000])
+        self.assertEqual(contador.vaciar(), 0)
+
+    def test_vacia_al_llenarse_el_bufer(self):
+        contador = contador_vistas.ContadorVistas(intervalo=3600, max_pendientes=4)
+        for producto in self.productos + self.productos[:1]:
+            contador.registrar(producto.pk)
+        self.assertEqual(self.vistas(), [2, 1, 1])
+
+    def test_detalle_no_escribe_en_cada_vista(self):
+        producto = self.productos[0]
+        respuestas = [self.client.get(reverse('producto-detail', args=[producto.pk])) for _ in range(3)]
+        self.assertEqual([r.status_code for r in respuestas], [200] * 3)
+        self.assertEqual(contador_vistas.contador_vistas.pendientes(producto.pk), 3)
+        self.assertEqual(self.vistas()[0], 0)
+
+        contador_vistas.contador_vistas.vaciar()
+        self.assertEqual(self.vistas()[0], 3)
+
+
+class RegistroVisitasTests(TestCase):
+    def setUp(self):
+        self.registro = visitas.RegistroVisitas(capacidad=100, tamano_lote=10, segundo_plano=False)
+
+    def test_lotes_y_user_agents_deduplicados(self):
+        for i in range(25):
+            self.registro.registrar('10.0.0.1', f'Navegador {i % 3}', f'/api/productos/{i}/')
+
+        # 3 lotes; sólo el primero busca y crea los user agents
+        with self.assertNumQueries(3 + 3):
+            self.assertEqual(self.registro.vaciar(), 25)
+        self.assertEqual(VisitaPagina.objects.count(), 25)
+        self.assertEqual(AgenteUsuario.objects.count(), 3)
+        self.assertEqual(
+            VisitaPagina.objects.filter(agente_usuario__user_agent='Navegador 0').count(), 9
+        )
+
+        # Un proceso nuevo reutiliza los user agents existentes
+        otro = visitas.RegistroVisitas(segundo_plano=False)
+        otro.registrar('10.0.0.2', 'Navegador 1', '/')
+        otro.registrar('10.0.0.2', '', '/')
+        with self.assertNumQueries(2):
+            otro.vaciar()
+        self.assertEqual(AgenteUsuario.objects.count(), 3)
+        self.assertEqual(VisitaPagina.objects.filter(agente_usuario__isnull=True).count(), 1)
+
+    def test_vaciar_la_cache_de_user_agents_no_pierde_el_lote(self):
+        self.addCleanup(setattr, visitas, 'MAX_AGENTES_EN_MEMORIA', visitas.MAX_AGENTES_EN_MEMORIA)
+        setattr(visitas, 'MAX_AGENTES_EN_MEMORIA', 2)
+        self.registro.registrar('10.0.0.1', 'Navegador 0', '/')
+        self.registro.registrar('10.0.0.1', 'Navegador 1', '/')
+        self.registro.vaciar()
+
+        # 'Navegador 0' ya está en memoria, pero el nuevo supera el máximo
+        self.registro.registrar('10.0.0.1', 'Navegador 0', '/')
+        self.registro.registrar('10.0.0.1', 'Navegador 2', '/')
+        self.registro.vaciar()
+
+        self.assertEqual(VisitaPagina.objects.count(), 4)
+        self.assertFalse(VisitaPagina.objects.filter(agente_usuario__isnull=True).exists())
+        self.assertEqual(VisitaPagina.objects.filter(agente_usuario__user_agent='Navegador 0').count(), 2)
+
+    def test_muestrea_y_descarta_con_el_bufer_lleno(self):
+        aceptadas = sum(self.registro.registrar('10.0.0.1', 'Navegador', '/') for _ in range(300))
+        estado = self.registro.estado()
+
+        # 80 sin muestreo, luego una de cada 10 hasta llenar las 100
+        self.assertEqual(aceptadas, 100)
+        self.assertEqual(estado['pendientes'], 100)
+        self.assertEqual(estado['descartadas_muestreo'], 180)
+        self.assertEqual(estado['descartadas'], 20)
+
+        self.registro.vaciar()
+        self.assertEqual(self.registro.estado()['guardadas'], 100)
+        self.assertEqual(self.registro.estado()['pendientes'], 0)
+
+    @override_settings(REGISTRO_VISITAS=True)
+    def test_middleware_registra_sin_escribir(self):
+        self.addCleanup(setattr, visitas, 'registro_visitas', visitas.registro_visitas)
+        setattr(visitas, 'registro_visitas', self.registro)
+
+        self.client.get(reverse('producto-list'), HTTP_USER_AGENT='Navegador')
+        self.client.options(reverse('producto-list'))
+        self.client.get('/static/app.css')
+
+        self.assertEqual(self.registro.estado()['pendientes'], 1)
+        self.assertEqual(VisitaPagina.objects.count(), 0)
+        self.registro.vaciar()
+        visita = VisitaPagina.objects.select_related('agente_usuario').get()
+        self.assertEqual((visita.ruta, visita.agente_usuario.user_agent), (reverse('producto-list'), 'Navegador'))
+
+
+class EstadisticasVisitasTests(TestCase):
+    def setUp(self):
+        self.hoy = timezone.localdate()
+        self.ayer = self.hoy - datetime.timedelta(days=1)
+
+    def visita(self, ruta, dia, hora, ip='10.0.0.1'):
+        instante = timezone.make_aware(datetime.datetime.combine(dia, datetime.time(hora, 30)))
+        return VisitaPagina(ip=ip, ruta=ruta, fecha=instante)
+
+    def test_consolida_por_hora_y_dia(self):
+        VisitaPagina.objects.bulk_create([
+            self.visita('/a', self.ayer, 9), self.visita('/a', self.ayer, 9, '10.0.0.2'),
+            self.visita('/a', self.ayer, 10), self.visita('/b', self.hoy, 0),
+        ])
+        self.assertEqual(estadisticas_visitas.consolidar(), (3, 2))
+        # Se puede repetir sin duplicar
+        self.assertEqual(estadisticas_visitas.consolidar(), (3, 2))
+
+        dia = VisitaRutaDia.objects.get(fecha=self.ayer, ruta='/a')
+        self.assertEqual((dia.visitas, dia.visitantes), (3, 2))
+        self.assertEqual(
+            list(VisitaRutaHora.objects.filter(ruta='/a').values_list('visitas', 'visitantes')), [(2, 2), (1, 1)]
+        )
+        self.assertEqual(
+            estadisticas_visitas.rutas_principales(self.ayer, self.hoy),
+            [{'ruta': '/a', 'visitas': 3}, {'ruta': '/b', 'visitas': 1}]
+        )
+        self.assertEqual(
+            [fila['visitas'] for fila in estadisticas_visitas.curva_trafico(self.ayer, self.hoy)], [3, 1]
+        )
+
+    def test_compactar_conserva_los_rollups(self):
+        antiguo = self.hoy - datetime.timedelta(days=100)
+        VisitaPagina.objects.bulk_create(
+            [self.visita('/a', antiguo, 12) for _ in range(3)] + [self.visita('/a', self.hoy, 0)]
+        )
+
+        self.assertEqual(estadisticas_visitas.compactar(90), 3)
+        self.assertEqual(VisitaPagina.objects.count(), 1)
+        self.assertEqual(VisitaRutaDia.objects.get(fecha=antiguo).visitas, 3)
+
+        # Recalcular un rango que incluye días ya compactados no borra sus rollups
+        estadisticas_visitas.consolidar(antiguo, self.hoy)
+        self.assertEqual(VisitaRutaDia.objects.get(fecha=antiguo).visitas, 3)
+        self.assertEqual(VisitaRutaDia.objects.get(fecha=self.hoy).visitas, 1)
+
+
+class InteraccionesTests(TestCase):
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre_categoria='Imprenta')
+        self.categoria_id = categoria.categoria_id
+        subcategoria = Subcategoria.objects.create(nombre_subcategoria='Tarjetas', categoria=categoria)
+        self.tarjeta = Producto.objects.create(nombre_producto='Tarjeta', subcategoria=subcategoria, precio_venta=1000)
+        self.volante = Producto.objects.create(nombre_producto='Volante', subcategoria=subcategoria, precio_venta=3000)
+        self.usuario = User.objects.create_user('cliente')
+        self.perfiles = [UserProfile.objects.create(user=self.usuario), UserProfile.objects.create()]
+
+    def sin_margen(self):
+        self.addCleanup(setattr, interacciones, 'MARGEN_REGISTRO', interacciones.MARGEN_REGISTRO)
+        setattr(interacciones, 'MARGEN_REGISTRO', datetime.timedelta(0))
+
+    def vista(self, producto):
+        return {'tipo': TipoInteraccion.PRODUCT_VIEW, 'producto_id': producto.pk}
+
+    def test_registra_el_lote_con_un_insert(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        url = reverse('registrar-interacciones')
+        respuesta = cliente.post(url, {'sesion_id': 'abc', 'eventos': [
+            self.vista(self.tarjeta),
+            {'tipo': 'search', 'datos': {'query': 'tarjetas'}},
+            {'tipo': 'add_to_cart', 'producto_id': self.tarjeta.pk},
+            {'tipo': 'product_view', 'producto_id': 999999},
+        ]}, format='json', HTTP_USER_AGENT='Navegador')
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual((respuesta.json()['guardados'], respuesta.json()['rechazados']), (3, 1))
+        vista = HistorialNavegacion.objects.get(tipo_interaccion=TipoInteraccion.PRODUCT_VIEW)
+        self.assertEqual(vista.user_profile, self.perfiles[0])
+        # La categoría se toma del producto
+        self.assertEqual(vista.categoria_id, self.categoria_id)
+        self.assertEqual(vista.agente_usuario.user_agent, 'Navegador')
+
+        # Las compras no las informa el cliente
+        for eventos in ([{'tipo': 'purchase', 'producto_id': self.tarjeta.pk}], [{'tipo': 'product_view'}]):
+            respuesta = cliente.post(url, {'sesion_id': 'abc', 'eventos': eventos}, format='json')
+            self.assertEqual(respuesta.status_code, 400)
+
+    def test_perfil_suma_solo_las_interacciones_nuevas(self):
+        primero, segundo = (perfil.pk for perfil in self.perfiles)
+        interacciones.guardar_interacciones(
+            [self.vista(self.tarjeta), self.vista(self.volante), self.vista(self.tarjeta), {'tipo': 'search'}],
+            'abc', user_profile_id=primero
+        )
+        # Recién registradas: pueden quedar filas con ID menor sin confirmar
+        self.assertEqual(interacciones.actualizar_perfiles(), 0)
+
+        self.sin_margen()
+        self.assertEqual(interacciones.actualizar_perfiles(), 4)
+        perfil = PerfilComportamiento.objects.get(user_profile_id=primero)
+        self.assertEqual((perfil.total_productos_vistos, perfil.total_busquedas, perfil.score_actividad), (3, 1, 9))
+        self.assertEqual(perfil.productos_vistos_recientes, [self.tarjeta.pk, self.volante.pk])
+        self.assertEqual(perfil.categorias_favoritas, {str(self.categoria_id): 3})
+        self.assertEqual(
+            (perfil.precio_minimo_promedio, perfil.precio_maximo_promedio, perfil.precio_promedio_productos_vistos),
+            (800, 3600, 1666)
+        )
+        self.assertEqual(interacciones.actualizar_perfiles(), 0)
+
+        # Otro lote con más usuarios (y una sesión anónima) usa las mismas consultas
+        interacciones.guardar_interacciones([self.vista(self.volante)], 'abc', user_profile_id=primero)
+        interacciones.guardar_interacciones([self.vista(self.volante)], 'def', user_profile_id=segundo)
+        interacciones.guardar_interacciones([self.vista(self.volante)], 'ghi')
+        with self.assertNumQueries(9):
+            self.assertEqual(interacciones.actualizar_perfiles(), 3)
+
+        perfil.refresh_from_db()
+        self.assertEqual(perfil.total_productos_vistos, 4)
+        self.assertEqual(perfil.productos_vistos_recientes, [self.volante.pk, self.tarjeta.pk])
+        self.assertEqual(PerfilComportamiento.objects.get(user_profile_id=segundo).total_productos_vistos, 1)
+
+
+class RecomendacionesTests(TestCase):
+    def test_vecinos_coinciden_con_el_calculo_denso(self):
+        generador = np.random.default_rng(1)
+        filas, columnas = generador.integers(0, 120, 1500), generador.integers(0, 40, 1500)
+        valores = generador.integers(1, 5, 1500).astype(float)
+        matriz = recomendaciones.MatrizDispersa.desde_coordenadas(filas, columnas, valores, (120, 40))
+        densa = np.zeros((120, 40))
+        np.add.at(densa, (filas, columnas), valores)
+        # Algunas columnas por la multiplicación densa y el resto por cruces dispersos
+        self.addCleanup(setattr, recomendaciones, 'FRACCION_COLUMNA_DENSA', recomendaciones.FRACCION_COLUMNA_DENSA)
+        setattr(recomendaciones, 'FRACCION_COLUMNA_DENSA', 0.35)
+
+        for matriz_csr, referencia in ((matriz, densa), (matriz.transpuesta(), densa.T)):
+            normas = np.linalg.norm(referencia, axis=1)
+            coseno = referencia @ referencia.T / np.outer(normas, normas)
+            np.fill_diagonal(coseno, 0)
+            vecinos, similitudes, coincidencias = recomendaciones.vecinos_coseno(matriz_csr, k=5, tamano_bloque=16)
+            np.testing.assert_allclose(similitudes, -np.sort(-coseno, axis=1)[:, :5])
+            presencia = (referencia > 0).astype(int)
+            np.testing.assert_array_equal(
+                coincidencias, np.take_along_axis(presencia @ presencia.T, vecinos, axis=1)
+            )
+
+    def test_recomendaciones_desde_los_top_k(self):
+        categoria = Categoria.objects.create(nombre_categoria='Imprenta')
+        subcategoria = Subcategoria.objects.create(nombre_subcategoria='Tarjetas', categoria=categoria)
+        p1, p2, p3, p4 = (
+            Producto.objects.create(nombre_producto=f'Producto {i}', subcategoria=subcategoria) for i in range(4)
+        )
+        usuario = User.objects.create_user('cliente')
+        ana, beto, carla = UserProfile.objects.create(user=usuario), UserProfile.objects.create(), UserProfile.objects.create()
+        for perfil, productos in ((ana, [p1, p2]), (beto, [p1, p2, p3]), (carla, [p4])):
+            interacciones.guardar_interacciones(
+                [{'tipo': 'product_view', 'producto_id': producto.pk} for producto in productos],
+                'abc', user_profile_id=perfil.pk
+            )
+
+        recomendaciones.calcular_similitudes(k=5)
+        self.assertEqual(
+            list(SimilitudUsuarios.objects.filter(user_profile_a=ana).values_list('user_profile_b_id', flat=True)),
+            [beto.pk]
+        )
+
+        cliente = APIClient()
+        respuesta = cliente.get(reverse('producto-recomendados', args=[p1.pk])).json()
+        self.assertEqual(respuesta['fuente'], 'similitudes')
+        self.assertEqual(respuesta['productos'][0]['producto_id'], p2.pk)
+        # Sin similitudes: los más vendidos de la subcategoría
+        self.assertEqual(cliente.get(reverse('producto-recomendados', args=[p4.pk])).json()['fuente'], 'populares')
+
+        self.assertEqual(cliente.get(reverse('producto-para-ti')).status_code, 401)
+        cliente.force_authenticate(usuario)
+        respuesta = cliente.get(reverse('producto-para-ti')).json()
+        self.assertEqual(respuesta['fuente'], 'similitudes')
+        # Lo que ven sus vecinos, sin lo que ya vio
+        self.assertEqual([p['producto_id'] for p in respuesta['productos']], [p3.pk])
+
+    def test_salta_los_similares_inactivos(self):
+        categoria = Categoria.objects.create(nombre_categoria='Imprenta')
+        subcategoria = Subcategoria.objects.create(nombre_subcategoria='Tarjetas', categoria=categoria)
+        producto, *similares = (
+            Producto.objects.create(nombre_producto=f'Producto {i}', subcategoria=subcategoria) for i in range(7)
+        )
+        SimilitudProductos.objects.bulk_create([
+            SimilitudProductos(producto_a=producto, producto_b=similar, score_similitud=90 - i)
+            for i, similar in enumerate(similares)
+        ])
+        # Los cuatro más parecidos ya no están a la venta
+        Producto.objects.filter(pk__in=[similar.pk for similar in similares[:4]]).update(activo=False)
+
+        respuesta = APIClient().get(reverse('producto-recomendados', args=[producto.pk]), {'limite': 2}).json()
+        self.assertEqual(respuesta['fuente'], 'similitudes')
+        self.assertEqual([p['producto_id'] for p in respuesta['productos']], [similares[4].pk, similares[5].pk])
 
-# Create your tests here.
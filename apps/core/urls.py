@@ -4,7 +4,7 @@ from .views import (
     CategoriaViewSet, SubcategoriaViewSet, ProductoViewSet, CarruselViewSet, 
     ClienteViewSet, PreguntaFrecuenteViewSet, 
     CarritoViewSet, ItemCarritoViewSet, obtener_categorias_con_productos, obtener_productos_por_subcategoria, 
-    user_profile, crear_orden, send_contact_email
+    user_profile, crear_orden, send_contact_email, registrar_interacciones
 )
 router = DefaultRouter()
 router.register(r'categorias', CategoriaViewSet)
@@ -23,6 +23,7 @@ urlpatterns = [
     path('user-profile/', user_profile, name='user-profile'),
     path('crear-orden/', crear_orden, name='crear-orden'),
     path('contact/send/', send_contact_email, name='send_contact_email'),
+    path('interacciones/', registrar_interacciones, name='registrar-interacciones'),
 ]
 
 
@@ -0,0 +1,31 @@
+# core/versiones.py
+"""
+Versiones compartidas de caché.
+
+Las entradas cacheadas de un grupo (catálogo, métricas, roles, ...) llevan la
+versión del grupo en su clave: incrementar la versión las invalida a todas sin
+borrarlas, y las antiguas expiran por su TTL. La versión se inicializa con un
+timestamp en milisegundos para no reutilizar versiones si la clave se pierde
+(reinicio o desalojo de la caché).
+"""
+import time
+from django.core.cache import cache
+
+
+def version(clave):
+    """Versión vigente guardada en `clave`; la inicializa si no existe."""
+    valor = cache.get(clave)
+    if valor is None:
+        # add(): si dos procesos la inicializan a la vez, gana el primero
+        cache.add(clave, int(time.time() * 1000), None)
+        valor = cache.get(clave)
+    return valor
+
+
+def incrementar_version(clave):
+    """Avanza la versión de `clave`. Retorna la nueva, o None si la clave no existía y se reinició."""
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        cache.set(clave, int(time.time() * 1000), None)
+        return None
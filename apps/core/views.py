@@ -1,12 +1,13 @@
 # core/views.py
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, Http404
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 from django.db import transaction
 from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import csrf_exempt 
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
 from django.conf import settings
 from django.views import View
 from django.shortcuts import get_object_or_404
@@ -18,97 +19,44 @@ import logging
 from apps.orders.models import Pedido, DetallePedido, SeguimientoDespacho
 from .models import (
     Categoria, Subcategoria, Producto, Carrusel, Terminacion, Acabado, TiempoProduccion,
-    PreguntaFrecuente, Carrito, ItemCarrito, ImagenProducto, Cliente
+    PreguntaFrecuente, Carrito, ItemCarrito, ImagenProducto, Cliente, UserProfile
 )
 from .serializers import(
     CategoriaSerializer, SubcategoriaSerializer, CarruselSerializer, ProductoDetailSerializer,
     ClienteSerializer, PreguntaFrecuenteSerializer, 
     CarritoSerializer, ItemCarritoSerializer, ProductoCreateUpdateSerializer, ProductoListSerializer,
-    TerminacionSerializer, AcabadoSerializer, TiempoProduccionSerializer, CalcularPrecioPersonalizadoSerializer
+    TerminacionSerializer, AcabadoSerializer, TiempoProduccionSerializer, CalcularPrecioPersonalizadoSerializer,
+    CotizarLoteSerializer, ResultadoBusquedaSerializer, LoteInteraccionesSerializer
 ) 
+from .catalogo import etag_catalogo, obtener_catalogo_serializado, prefetch_imagen_portada
+from .paginacion import PaginacionCursor
+from .busqueda import LIMITE_BUSQUEDA, LIMITE_BUSQUEDA_MAXIMO, buscar_productos
+from .autocompletado import LIMITE_SUGERENCIAS, LIMITE_SUGERENCIAS_MAXIMO, sugerir
+from .precios import obtener_hoja_precios, expandir_grilla
+from .correos import encolar_correo
+from .interacciones import guardar_interacciones
+from .recomendaciones import K_VECINOS, productos_similares, recomendar_para_usuario
 
 logger = logging.getLogger(__name__)
 
+LIMITE_RECOMENDACIONES = 10
+
 def obtener_categorias_con_productos(request):
     try:
-        logger.info("Solicitud recibida para categorías con productos")
-        
-        # Obtener categorías activas con sus subcategorías
-        categorias = Categoria.objects.filter(activo=True)
-        
-        logger.info(f"Encontradas {categorias.count()} categorías")
-        
-        datos_categorias = []
-        
-        for categoria in categorias:
-            categoria_data = {
-                'id': categoria.categoria_id,
-                'name': categoria.nombre_categoria,
-                'subcategories': []
-            }
-            
-            # Obtener subcategorías activas de esta categoría
-            subcategorias = Subcategoria.objects.filter(
-                categoria=categoria,
-                activo=True
+        # La versión del catálogo define el ETag: si el cliente ya la tiene, no hay nada que enviar
+        etag = etag_catalogo(request)
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match == '*' or etag in parse_etags(if_none_match):
+            respuesta = HttpResponseNotModified()
+        else:
+            # JSON ya serializado en caché; se reconstruye solo tras cambios en el catálogo
+            respuesta = HttpResponse(
+                obtener_catalogo_serializado(request, etag),
+                content_type='application/json'
             )
-            
-            logger.info(f"Categoría {categoria.nombre_categoria}: {subcategorias.count()} subcategorías")
-            
-            # Procesar cada subcategoría
-            for subcategoria in subcategorias:
-                # CAMBIO IMPORTANTE: Obtener TODOS los productos activos, no solo destacados
-                productos = Producto.objects.filter(
-                    subcategoria=subcategoria,
-                    activo=True
-                ).order_by('nombre_producto')  # Ordenar alfabéticamente
-                
-                logger.info(f"Subcategoría {subcategoria.nombre_subcategoria}: {productos.count()} productos")
-                
-                productos_data = []
-                for producto in productos:
-                    try:
-                        # Obtener la primera imagen del producto si existe
-                        imagen = producto.imagenes.first() if hasattr(producto, 'imagenes') else None
-                        imagen_url = ''
-                        
-                        if imagen and hasattr(imagen, 'imagen'):
-                            imagen_url = request.build_absolute_uri(imagen.imagen.url)
-                        
-                        producto_data = {
-                            'id': producto.producto_id,
-                            'name': producto.nombre_producto,
-                            'price': f"${producto.precio_venta:,}".replace(',', '.') if producto.precio_venta else '$0',
-                            'image': imagen_url,
-                            'description': producto.detalle_producto or '',
-                            'characteristics': producto.caracteristicas or ''
-                        }
-                        productos_data.append(producto_data)
-                        logger.debug(f"Producto agregado: {producto.nombre_producto} (ID: {producto.producto_id})")
-                        
-                    except Exception as e:
-                        logger.error(f"Error procesando producto {producto.producto_id}: {e}")
-                        continue
-                
-                subcategoria_data = {
-                    'id': subcategoria.subcategoria_id,
-                    'name': subcategoria.nombre_subcategoria,
-                    'products': productos_data
-                }
-                
-                categoria_data['subcategories'].append(subcategoria_data)
-            
-            datos_categorias.append(categoria_data)
-        
-        logger.info(f"Enviando {len(datos_categorias)} categorías con productos")
-        
-        # Debug log para verificar estructura
-        for cat in datos_categorias:
-            logger.debug(f"Categoría: {cat['name']} ({cat['id']})")
-            for subcat in cat['subcategories']:
-                logger.debug(f"  - Subcategoría: {subcat['name']} ({subcat['id']}) - {len(subcat['products'])} productos")
-        
-        return JsonResponse(datos_categorias, safe=False)
+        respuesta['ETag'] = etag
+        patch_cache_control(respuesta, no_cache=True)
+        return respuesta
         
     except Exception as e:
         logger.error(f"Error en obtener_categorias_con_productos: {str(e)}", exc_info=True)
@@ -290,61 +238,20 @@ def send_contact_email(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Construir el mensaje del correo
-        email_subject = f"Contacto Web: {asunto}"
-        email_body = f"""
-        Nuevo mensaje de contacto desde el sitio web:
-        
-        Nombre: {nombre}
-        Email: {email}
-        Teléfono: {telefono if telefono else 'No proporcionado'}
-        Asunto: {asunto}
-        
-        Mensaje:
-        {mensaje}
-        
-        ---
-        Este correo fue enviado desde el formulario de contacto del sitio web.
-        """
-
-        # Enviar correo
-        send_mail(
-            subject=email_subject,
-            message=email_body,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.CONTACT_EMAIL],  # Email del negocio
-            fail_silently=False,
-        )
-
-        # También enviar correo de confirmación al cliente
-        confirmation_subject = "Gracias por contactarnos - Impresores"
-        confirmation_body = f"""
-        Hola {nombre},
-        
-        Hemos recibido tu mensaje y nos pondremos en contacto contigo lo antes posible.
-        
-        Resumen de tu consulta:
-        Asunto: {asunto}
-        Mensaje: {mensaje}
-        
-        Gracias por tu interés en nuestros servicios de impresión.
-        
-        Atentamente,
-        Equipo de Impresores
-        
-        ---
-        Si no realizaste esta consulta, por favor ignora este correo.
-        """
-
-        send_mail(
-            subject=confirmation_subject,
-            message=confirmation_body,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=True,  # No fallar si este correo no se envía
-        )
+        # Se encolan ambos correos (al negocio y la confirmación al cliente);
+        # los envía el comando enviar_correos
+        contexto = {
+            'nombre': nombre,
+            'email': email,
+            'telefono': telefono,
+            'asunto': asunto,
+            'mensaje': mensaje,
+        }
+        with transaction.atomic():
+            encolar_correo('emails/contacto_negocio', settings.CONTACT_EMAIL, f"Contacto Web: {asunto}", contexto)
+            encolar_correo('emails/contacto_confirmacion', email, "Gracias por contactarnos - Impresores", contexto)
 
-        logger.info(f"Correo de contacto enviado exitosamente desde {email}")
+        logger.info(f"Correo de contacto encolado desde {email}")
         
         return Response(
             {'message': 'Mensaje enviado exitosamente'},
@@ -352,12 +259,52 @@ def send_contact_email(request):
         )
 
     except Exception as e:
-        logger.error(f"Error al enviar correo de contacto: {str(e)}")
+        logger.error(f"Error al encolar correo de contacto: {str(e)}")
         return Response(
             {'message': 'Error al enviar el mensaje. Por favor intenta nuevamente.'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-    
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def registrar_interacciones(request):
+    """
+    Registra un lote de interacciones del frontend (hasta 100) con un solo INSERT.
+    Con JWT se asocian al perfil del usuario; sin él, sólo a la sesión.
+
+    POST /api/interacciones/
+    {
+        "sesion_id": "3f9c...",
+        "eventos": [
+            {"tipo": "product_view", "producto_id": 7, "timestamp": "2025-05-01T12:00:00Z", "duracion_segundos": 40},
+            {"tipo": "search", "datos": {"query": "tarjetas"}},
+            {"tipo": "add_to_cart", "producto_id": 7}
+        ]
+    }
+    """
+    serializer = LoteInteraccionesSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({'error': True, 'mensaje': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    user_profile_id = None
+    if request.user.is_authenticated:
+        user_profile_id = UserProfile.objects.filter(user=request.user).values_list(
+            'user_profile_id', flat=True
+        ).first()
+
+    guardados, rechazados = guardar_interacciones(
+        serializer.validated_data['eventos'],
+        serializer.validated_data['sesion_id'],
+        user_profile_id=user_profile_id,
+        ip=request.META.get('REMOTE_ADDR'),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')
+    )
+    return Response({
+        'error': False,
+        'guardados': guardados,
+        'rechazados': rechazados
+    }, status=status.HTTP_201_CREATED)
+
 class CategoriaViewSet(viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
@@ -368,6 +315,21 @@ class SubcategoriaViewSet(viewsets.ModelViewSet):
 
 class ProductoViewSet(viewsets.ModelViewSet):
     queryset = Producto.objects.filter(activo=True)
+    pagination_class = PaginacionCursor
+    ordenamiento_cursor = ('nombre_producto', 'pk')
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'buscar', 'recomendados', 'para_ti'):
+            # Número constante de consultas: FKs en el mismo SELECT e imagen principal precargada
+            return queryset.select_related('subcategoria__categoria', 'marca').prefetch_related(
+                prefetch_imagen_portada()
+            )
+        if self.action == 'retrieve':
+            return queryset.select_related(
+                'subcategoria__categoria', 'marca', 'unidad_medida', 'proveedor'
+            ).prefetch_related('imagenes', 'tamanos_predefinidos', 'terminaciones', 'tiempos_produccion')
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -376,8 +338,19 @@ class ProductoViewSet(viewsets.ModelViewSet):
             return ProductoCreateUpdateSerializer
         elif self.action == 'calcular_precio':
             return CalcularPrecioPersonalizadoSerializer
+        elif self.action == 'cotizar_lote':
+            return CotizarLoteSerializer
+        elif self.action == 'buscar':
+            return ResultadoBusquedaSerializer
         return ProductoListSerializer
     
+    def retrieve(self, request, *args, **kwargs):
+        """Detalle del producto; la vista se acumula y se escribe en lote (core/contador_vistas.py)"""
+        producto = self.get_object()
+        producto.incrementar_vistas()
+        serializer = self.get_serializer(producto)
+        return Response(serializer.data)
+    
     @action(detail=True, methods=['post'], url_path='calcular-precio', permission_classes=[AllowAny])
     def calcular_precio(self, request, pk=None):
         """
@@ -409,10 +382,16 @@ class ProductoViewSet(viewsets.ModelViewSet):
             "desglose": {...}
         }
         """
-        producto = self.get_object()
+        # Hoja de precios precompilada y en caché: la cotización no consulta la BD
+        try:
+            hoja = obtener_hoja_precios(int(pk))
+        except (TypeError, ValueError):
+            hoja = None
+        if hoja is None:
+            raise Http404
         
         # Validar que el producto tenga opciones de personalización
-        if not producto.tiene_personalizaciones():
+        if not hoja.tiene_personalizaciones():
             return Response(
                 {
                     'error': True,
@@ -422,7 +401,10 @@ class ProductoViewSet(viewsets.ModelViewSet):
             )
         
         # Serializar y validar datos de entrada
-        serializer = CalcularPrecioPersonalizadoSerializer(data=request.data)
+        serializer = CalcularPrecioPersonalizadoSerializer(
+            data=request.data,
+            context={'hoja_precios': hoja}
+        )
         
         if not serializer.is_valid():
             return Response(
@@ -436,8 +418,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
         # Obtener datos validados
         datos = serializer.validated_data
         
-        # Calcular precio usando el método del modelo
-        resultado = producto.calcular_precio_personalizado(
+        # Calcular precio con la hoja de precios (misma fórmula que el modelo)
+        resultado = hoja.calcular(
             ancho_cm=datos['ancho_cm'],
             alto_cm=datos['alto_cm'],
             terminacion_id=datos['terminacion_id'],
@@ -453,6 +435,226 @@ class ProductoViewSet(viewsets.ModelViewSet):
             )
         
         return Response(resultado, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['post'], url_path='cotizar-lote', permission_classes=[AllowAny])
+    def cotizar_lote(self, request, pk=None):
+        """
+        Cotiza muchas combinaciones en una sola solicitud, con la misma fórmula que
+        calcular-precio evaluada en forma vectorial.
+        
+        POST /api/productos/{id}/cotizar-lote/
+        
+        Body esperado (una de las dos formas):
+        {
+            "items": [
+                {"ancho_cm": 100, "alto_cm": 150, "terminacion_id": 1,
+                 "tiempo_produccion_id": 2, "cantidad": 5, "acabado_ids": [1, 2]},
+                ...
+            ]
+        }
+        {
+            "grilla": {
+                "medidas": [[100, 150], [200, 100]],   // o "ancho_cm": [...], "alto_cm": [...]
+                "terminacion_id": [1, 3],
+                "tiempo_produccion_id": [2, 4],
+                "cantidad": [1, 10],                   // opcional, por defecto [1]
+                "acabado_ids": [[], [1, 2]]            // opcional, por defecto [[]]
+            }
+        }
+        
+        Response:
+        {
+            "error": false,
+            "producto_id": 7,
+            "columnas": ["ancho_cm", "alto_cm", "terminacion_id", "tiempo_produccion_id",
+                         "cantidad", "acabado_ids", "precio_unitario", "precio_total"],
+            "filas": [[100, 150, 1, 2, 5, [1, 2], 75000, 375000], ...],
+            "forma": [2, 2, 2, 2, 2],   // solo en grillas: largo de cada eje, filas en orden C
+            "errores": [{"fila": 3, "mensaje": "..."}]
+        }
+        Las filas con error llevan precio_unitario y precio_total en null.
+        """
+        try:
+            hoja = obtener_hoja_precios(int(pk))
+        except (TypeError, ValueError):
+            hoja = None
+        if hoja is None:
+            raise Http404
+        
+        if not hoja.tiene_personalizaciones():
+            return Response(
+                {
+                    'error': True,
+                    'mensaje': 'Este producto no tiene opciones de personalización'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = CotizarLoteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    'error': True,
+                    'mensajes_validacion': serializer.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        datos = serializer.validated_data
+        
+        if 'grilla' in datos:
+            columnas = expandir_grilla(datos['grilla'])
+        else:
+            columnas = [
+                [item[campo] for item in datos['items']]
+                for campo in ('ancho_cm', 'alto_cm', 'terminacion_id', 'tiempo_produccion_id', 'cantidad', 'acabado_ids')
+            ]
+        
+        unitarios, totales, errores = hoja.cotizar_lote(*columnas)
+        
+        respuesta = {
+            'error': False,
+            'producto_id': hoja.producto_id,
+            'columnas': [
+                'ancho_cm', 'alto_cm', 'terminacion_id', 'tiempo_produccion_id',
+                'cantidad', 'acabado_ids', 'precio_unitario', 'precio_total'
+            ],
+            'filas': [list(fila) for fila in zip(*columnas, unitarios, totales)],
+            'errores': [{'fila': fila, 'mensaje': mensaje} for fila, mensaje in sorted(errores.items())]
+        }
+        if 'grilla' in datos:
+            respuesta['forma'] = datos['forma']
+        return Response(respuesta, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def buscar(self, request):
+        """
+        Búsqueda de productos por texto, ordenada por relevancia.
+        
+        GET /api/productos/buscar/?q=pendon roller&limite=20
+        
+        Response:
+        {
+            "error": false,
+            "consulta": "pendon roller",
+            "resultados": [
+                {...campos del listado..., "rango": 0.61,
+                 "resaltado": {"nombre_producto": "<mark>Pendón</mark> <mark>Roller</mark> 80x200",
+                               "descripcion_corta": "..."}}
+            ]
+        }
+        """
+        texto = request.query_params.get('q', '').strip()
+        if not texto:
+            return Response(
+                {
+                    'error': True,
+                    'mensaje': 'Debe indicar el texto a buscar en el parámetro q'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limite = min(max(int(request.query_params.get('limite', LIMITE_BUSQUEDA)), 1), LIMITE_BUSQUEDA_MAXIMO)
+        except ValueError:
+            limite = LIMITE_BUSQUEDA
+        
+        productos = buscar_productos(texto, self.get_queryset(), limite)
+        return Response({
+            'error': False,
+            'consulta': texto,
+            'resultados': self.get_serializer(productos, many=True).data
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def autocompletar(self, request):
+        """
+        Sugerencias para la caja de búsqueda, desde un índice en memoria (sin consultas a la BD).
+        
+        GET /api/productos/autocompletar/?q=pend&limite=8
+        
+        Response:
+        {
+            "error": false,
+            "consulta": "pend",
+            "sugerencias": [
+                {"texto": "Pendón Roller 80x200", "tipo": "producto", "id": 12},
+                {"texto": "Pendones", "tipo": "subcategoria", "id": 3}
+            ]
+        }
+        tipo: producto | sku (id del producto) | marca | subcategoria
+        """
+        texto = request.query_params.get('q', '')
+        try:
+            limite = min(max(int(request.query_params.get('limite', LIMITE_SUGERENCIAS)), 1), LIMITE_SUGERENCIAS_MAXIMO)
+        except ValueError:
+            limite = LIMITE_SUGERENCIAS
+        return Response({
+            'error': False,
+            'consulta': texto,
+            'sugerencias': sugerir(texto, limite)
+        }, status=status.HTTP_200_OK)
+    
+    def _limite_recomendaciones(self, request):
+        try:
+            return min(max(int(request.query_params.get('limite', LIMITE_RECOMENDACIONES)), 1), K_VECINOS)
+        except ValueError:
+            return LIMITE_RECOMENDACIONES
+    
+    def _respuesta_recomendaciones(self, ids, alternativa, limite):
+        """Los primeros `limite` productos activos de `ids`, en ese orden; si no hay, los de `alternativa` (queryset)."""
+        recomendados = []
+        if ids:
+            # Primero se descartan los inactivos: sólo se cargan los que se van a mostrar
+            activos = set(self.queryset.filter(pk__in=ids).values_list('pk', flat=True))
+            elegidos = [producto_id for producto_id in ids if producto_id in activos][:limite]
+            productos = self.get_queryset().in_bulk(elegidos) if elegidos else {}
+            recomendados = [productos[producto_id] for producto_id in elegidos if producto_id in productos]
+        fuente = 'similitudes'
+        if not recomendados:
+            recomendados = list(alternativa[:limite])
+            fuente = 'populares'
+        return Response({
+            'error': False,
+            'fuente': fuente,
+            'productos': self.get_serializer(recomendados, many=True).data
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def recomendados(self, request, pk=None):
+        """
+        Productos que suelen interesar a quienes interactúan con este (core/recomendaciones.py).
+        Sin similitudes calculadas, los más vendidos de su subcategoría.
+        
+        GET /api/productos/{id}/recomendados/?limite=10
+        
+        Response:
+        {
+            "error": false,
+            "fuente": "similitudes",   // o "populares"
+            "productos": [{...campos del listado...}, ...]
+        }
+        """
+        producto = get_object_or_404(Producto.objects.filter(activo=True).only('subcategoria_id'), pk=pk)
+        limite = self._limite_recomendaciones(request)
+        populares = self.get_queryset().filter(subcategoria_id=producto.subcategoria_id).exclude(
+            pk=producto.pk
+        ).order_by('-ventas_totales', '-vistas', 'pk')
+        return self._respuesta_recomendaciones(productos_similares(producto.pk), populares, limite)
+    
+    @action(detail=False, methods=['get'], url_path='para-ti', permission_classes=[IsAuthenticated])
+    def para_ti(self, request):
+        """
+        Recomendaciones para el usuario autenticado a partir de sus vecinos más
+        parecidos. Sin vecinos (usuario nuevo), los destacados y más vendidos.
+        
+        GET /api/productos/para-ti/?limite=10  (mismo formato que recomendados)
+        """
+        limite = self._limite_recomendaciones(request)
+        user_profile_id = UserProfile.objects.filter(user=request.user).values_list(
+            'user_profile_id', flat=True
+        ).first()
+        ids = recomendar_para_usuario(user_profile_id) if user_profile_id else []
+        populares = self.get_queryset().order_by('-es_destacado', '-ventas_totales', 'pk')
+        return self._respuesta_recomendaciones(ids, populares, limite)
 
 class CarruselViewSet(viewsets.ModelViewSet):
     queryset = Carrusel.objects.all()
@@ -460,6 +662,8 @@ class CarruselViewSet(viewsets.ModelViewSet):
 
 class ClienteViewSet(viewsets.ModelViewSet):
     queryset = Cliente.objects.all()
+    pagination_class = PaginacionCursor
+    ordenamiento_cursor = ('-fecha_creacion', '-pk')
     serializer_class = ClienteSerializer
 
 class PreguntaFrecuenteViewSet(viewsets.ModelViewSet):
@@ -0,0 +1,211 @@
+# core/visitas.py
+"""
+Registro de visitas de páginas con escritura en lote.
+
+RegistroVisitasMiddleware (middleware.py) agrega (ip, user_agent, ruta, fecha)
+a un búfer acotado en memoria y la petición sigue sin escribir nada. Un hilo en
+segundo plano lo vacía con bulk_create cada INTERVALO_VACIADO segundos, o antes
+si se junta un lote de TAMANO_LOTE visitas.
+
+Si la base de datos no da abasto y el búfer se llena:
+  - sobre UMBRAL_MUESTREO de la capacidad se acepta una de cada FACTOR_MUESTREO visitas;
+  - con el búfer lleno se descartan todas.
+estado() expone los contadores del proceso (recibidas, guardadas, descartadas, ...).
+
+Los user agents se guardan una sola vez en agentes_usuario (por su sha256) y el
+proceso recuerda sus IDs, así que en régimen normal cada lote es un solo INSERT.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import threading
+from collections import Counter, deque
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from .models import AgenteUsuario, VisitaPagina
+
+logger = logging.getLogger(__name__)
+
+CAPACIDAD = 10000
+TAMANO_LOTE = 500
+INTERVALO_VACIADO = 2.0
+UMBRAL_MUESTREO = 0.8
+FACTOR_MUESTREO = 10
+MAX_AGENTES_EN_MEMORIA = 5000
+LARGO_RUTA = 200
+
+
+def hash_user_agent(user_agent):
+    return hashlib.sha256(user_agent.encode('utf-8')).hexdigest()
+
+
+def agente_usuario_id(user_agent):
+    """ID del user agent en agentes_usuario (lo crea si no existe), o None si viene vacío."""
+    if not user_agent:
+        return None
+    agente, _ = AgenteUsuario.objects.get_or_create(
+        hash_user_agent=hash_user_agent(user_agent), defaults={'user_agent': user_agent}
+    )
+    return agente.agente_usuario_id
+
+
+class RegistroVisitas:
+    def __init__(self, capacidad=CAPACIDAD, tamano_lote=TAMANO_LOTE, intervalo=INTERVALO_VACIADO,
+                 segundo_plano=True):
+        self.capacidad = capacidad
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        # Sin hilo (tests, comandos) las visitas se escriben sólo al llamar a vaciar()
+        self.segundo_plano = segundo_plano
+        self._bufer = deque()
+        self._lock = threading.Lock()
+        self._contadores = Counter()
+        self._muestreo = 0
+        # Base de datos en la que se registraron las visitas pendientes
+        self._base_de_datos = None
+        self._agentes = {}
+        self._hilo = None
+        self._pid = None
+        self._hay_lote = threading.Event()
+        self._detenido = threading.Event()
+
+    def registrar(self, ip, user_agent, ruta, fecha=None):
+        """Agrega la visita al búfer. Retorna False si se descartó."""
+        with self._lock:
+            self._contadores['recibidas'] += 1
+            ocupacion = len(self._bufer)
+            if ocupacion >= self.capacidad:
+                self._contadores['descartadas'] += 1
+                return False
+            if ocupacion >= self.capacidad * UMBRAL_MUESTREO:
+                self._muestreo += 1
+                if self._muestreo % FACTOR_MUESTREO:
+                    self._contadores['descartadas_muestreo'] += 1
+                    return False
+            if not self._bufer:
+                self._base_de_datos = connection.settings_dict['NAME']
+            self._bufer.append((ip, user_agent or '', ruta[:LARGO_RUTA], fecha or timezone.now()))
+            lote_completo = len(self._bufer) >= self.tamano_lote
+        if self.segundo_plano:
+            self._asegurar_hilo()
+            if lote_completo:
+                self._hay_lote.set()
+        return True
+
+    def estado(self):
+        with self._lock:
+            return {
+                'recibidas': self._contadores['recibidas'],
+                'guardadas': self._contadores['guardadas'],
+                'descartadas': self._contadores['descartadas'],
+                'descartadas_muestreo': self._contadores['descartadas_muestreo'],
+                'errores': self._contadores['errores'],
+                'pendientes': len(self._bufer),
+                'capacidad': self.capacidad,
+            }
+
+    # ===== VACIADO =====
+
+    def _tomar_lote(self):
+        with self._lock:
+            return [self._bufer.popleft() for _ in range(min(self.tamano_lote, len(self._bufer)))]
+
+    def vaciar(self):
+        """Escribe todo lo pendiente, un bulk_create por lote. Retorna las visitas guardadas."""
+        if self._base_de_datos not in (None, connection.settings_dict['NAME']):
+            # Se registraron contra otra base de datos (p. ej. la de tests, ya eliminada)
+            with self._lock:
+                self._contadores['descartadas'] += len(self._bufer)
+                self._bufer.clear()
+            return 0
+        guardadas = 0
+        while True:
+            lote = self._tomar_lote()
+            if not lote:
+                break
+            try:
+                self._guardar(lote)
+            except Exception as e:
+                # No se reintenta: mientras la base de datos falle el búfer
+                # seguiría lleno y se descartarían las visitas nuevas
+                logger.error(f"Error guardando {len(lote)} visitas: {e}")
+                with self._lock:
+                    self._contadores['errores'] += len(lote)
+                break
+            guardadas += len(lote)
+            with self._lock:
+                self._contadores['guardadas'] += len(lote)
+        return guardadas
+
+    def _guardar(self, lote):
+        ids = self._ids_agentes({user_agent for _, user_agent, _, _ in lote})
+        VisitaPagina.objects.bulk_create([
+            VisitaPagina(ip=ip, agente_usuario_id=ids.get(user_agent), ruta=ruta, fecha=fecha)
+            for ip, user_agent, ruta, fecha in lote
+        ])
+
+    def _ids_agentes(self, user_agents):
+        """{user_agent: agente_usuario_id}, creando los que no existan."""
+        hashes = {hash_user_agent(user_agent): user_agent for user_agent in user_agents if user_agent}
+        faltantes = [valor for valor in hashes if valor not in self._agentes]
+        if faltantes and len(self._agentes) + len(faltantes) > MAX_AGENTES_EN_MEMORIA:
+            # Se vacía antes de resolver el lote: todos sus agentes se vuelven a consultar
+            self._agentes.clear()
+            faltantes = list(hashes)
+        if faltantes:
+            existentes = dict(
+                AgenteUsuario.objects.filter(hash_user_agent__in=faltantes)
+                .values_list('hash_user_agent', 'agente_usuario_id')
+            )
+            nuevos = [valor for valor in faltantes if valor not in existentes]
+            if nuevos:
+                # ignore_conflicts: otro proceso puede estar creando el mismo
+                AgenteUsuario.objects.bulk_create(
+                    [AgenteUsuario(hash_user_agent=valor, user_agent=hashes[valor]) for valor in nuevos],
+                    ignore_conflicts=True
+                )
+                existentes.update(
+                    AgenteUsuario.objects.filter(hash_user_agent__in=nuevos)
+                    .values_list('hash_user_agent', 'agente_usuario_id')
+                )
+            self._agentes.update(existentes)
+        return {user_agent: self._agentes.get(valor) for valor, user_agent in hashes.items()}
+
+    # ===== HILO DE VACIADO =====
+
+    def _asegurar_hilo(self):
+        # Tras un fork (gunicorn --preload) el hilo no existe en el proceso hijo
+        if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+                return
+            self._pid = os.getpid()
+            self._detenido.clear()
+            self._hilo = threading.Thread(target=self._trabajar, name='registro-visitas', daemon=True)
+            self._hilo.start()
+
+    def _trabajar(self):
+        while not self._detenido.is_set():
+            self._hay_lote.wait(self.intervalo)
+            self._hay_lote.clear()
+            # Como un worker de Django: descarta la conexión si cayó o superó CONN_MAX_AGE
+            close_old_connections()
+            try:
+                self.vaciar()
+            except Exception as e:
+                logger.error(f"Error en el registro de visitas: {e}")
+        connection.close()
+
+    def detener(self):
+        """Detiene el hilo y escribe lo pendiente (al terminar el proceso)."""
+        self._detenido.set()
+        self._hay_lote.set()
+        if self._hilo is not None and self._hilo.is_alive():
+            self._hilo.join(timeout=5)
+        self.vaciar()
+
+
+registro_visitas = RegistroVisitas()
+atexit.register(registro_visitas.detener)
@@ -1,51 +1,28 @@
 from rest_framework import permissions
+from apps.core.roles import es_administrador, es_superadministrador
+
+# Los roles se resuelven con apps.core.roles, que los mantiene en caché por usuario:
+# los permisos no consultan la base de datos en cada petición.
 
 class EsAdministrador(permissions.BasePermission):
     """
     Permiso personalizado para verificar si el usuario es administrador o superadministrador
     """
     message = "Solo los administradores pueden acceder a este recurso."
-    
+
     def has_permission(self, request, view):
-        # El usuario debe estar autenticado
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        # Verificar si es superusuario de Django
-        if request.user.is_superuser:
-            return True
-        
-        # Verificar si tiene perfil y roles de admin
-        try:
-            user_profile = request.user.perfil
-            return user_profile.roles.filter(
-                rol__codigo_rol__in=['ADMIN', 'SUPERADMIN']
-            ).exists()
-        except:
-            return False
+        # Superusuario de Django o rol ADMIN/SUPERADMIN
+        return es_administrador(request.user)
 
 class EsSuperAdministrador(permissions.BasePermission):
     """
     Permiso personalizado solo para superadministradores
     """
     message = "Solo los superadministradores pueden acceder a este recurso."
-    
+
     def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        # Verificar si es superusuario de Django
-        if request.user.is_superuser:
-            return True
-        
-        # Verificar si tiene rol de superadmin
-        try:
-            user_profile = request.user.perfil
-            return user_profile.roles.filter(
-                rol__codigo_rol='SUPERADMIN'
-            ).exists()
-        except:
-            return False
+        # Superusuario de Django o rol SUPERADMIN
+        return es_superadministrador(request.user)
 
 class EsAdminOSoloLectura(permissions.BasePermission):
     """
@@ -55,19 +32,6 @@ class EsAdminOSoloLectura(permissions.BasePermission):
         # Métodos de solo lectura permitidos para todos
         if request.method in permissions.SAFE_METHODS:
             return True
-        
+
         # Métodos de escritura solo para admins
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        if request.user.is_superuser:
-            return True
-        
-        try:
-            user_profile = request.user.perfil
-            return user_profile.roles.filter(
-                rol__codigo_rol__in=['ADMIN', 'SUPERADMIN']
-            ).exists()
-        except:
-            return False
-        
+        return es_administrador(request.user)
@@ -4,6 +4,7 @@ from apps.core.models import (
     Producto, ImagenProducto, Categoria, Subcategoria, 
     Carrusel, Marca, UnidadMedida, Proveedor
 )
+from apps.core.catalogo import obtener_imagen_portada
 
 class ProductFileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -77,7 +78,8 @@ class ImagenProductoAdminSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ImagenProducto
-        fields = ['imagen_producto_id', 'imagen', 'url', 'es_principal', 'orden', 'alt_text']
+        fields = ['imagen_producto_id', 'imagen', 'url', 'es_principal', 'orden', 'alt_text', 'estado_procesamiento']
+        read_only_fields = ['estado_procesamiento']
     
     def get_url(self, obj):
         if obj.imagen:
@@ -194,7 +196,8 @@ class ProductoListAdminSerializer(serializers.ModelSerializer):
         ]
     
     def get_imagen_principal(self, obj):
-        imagen = obj.imagenes.filter(es_principal=True).first() or obj.imagenes.first()
+        # ProductoAdminViewSet precarga la imagen con prefetch_imagen_portada()
+        imagen = obtener_imagen_portada(obj)
         if imagen and imagen.imagen:
             request = self.context.get('request')
             if request:
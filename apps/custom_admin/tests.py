@@ -1,3 +1,156 @@
+import datetime
+from types import SimpleNamespace
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.core.models import Rol, UserProfile, UserRol, Categoria, Subcategoria, Producto, VisitaRutaDia
+from .permissions import EsAdministrador, EsSuperAdministrador, EsAdminOSoloLectura
+
+
+class PermisosPorRolTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rol_admin = Rol.objects.create(nombre_rol='Administrador', codigo_rol='ADMIN')
+        self.usuario = User.objects.create_user('ana')
+        perfil = UserProfile.objects.create(user=self.usuario)
+        self.asignacion = UserRol.objects.create(user_profile=perfil, rol=self.rol_admin)
+
+    def peticion(self, metodo='GET'):
+        # Cada petición trae su propia instancia del usuario, como JWTAuthentication
+        return SimpleNamespace(user=User.objects.get(pk=self.usuario.pk), method=metodo)
+
+    def test_permisos_sin_consultas_una_vez_en_cache(self):
+        self.assertTrue(EsAdministrador().has_permission(self.peticion(), None))
+
+        peticion = self.peticion('POST')
+        with self.assertNumQueries(0):
+            self.assertTrue(EsAdministrador().has_permission(peticion, None))
+            self.assertTrue(EsAdminOSoloLectura().has_permission(peticion, None))
+            self.assertFalse(EsSuperAdministrador().has_permission(peticion, None))
+
+    def test_quitar_el_rol_revoca_el_acceso(self):
+        self.assertTrue(EsAdministrador().has_permission(self.peticion(), None))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.asignacion.delete()
+        self.assertFalse(EsAdministrador().has_permission(self.peticion(), None))
+
+    def test_cambiar_el_codigo_del_rol_revoca_el_acceso(self):
+        self.assertTrue(EsAdministrador().has_permission(self.peticion(), None))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rol_admin.codigo_rol = 'CLIENTE'
+            self.rol_admin.save()
+        self.assertFalse(EsAdministrador().has_permission(self.peticion(), None))
+
+    def test_endpoint_del_admin(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        url = reverse('productos-admin-list')
+        self.assertEqual(cliente.get(url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.asignacion.delete()
+        cliente.force_authenticate(User.objects.get(pk=self.usuario.pk))
+        self.assertEqual(cliente.get(url).status_code, 403)
+
+
+class EstadisticasProductosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        imprenta = Categoria.objects.create(nombre_categoria='Imprenta')
+        gran_formato = Categoria.objects.create(nombre_categoria='Gran formato')
+        tarjetas = Subcategoria.objects.create(nombre_subcategoria='Tarjetas', categoria=imprenta)
+        pendones = Subcategoria.objects.create(nombre_subcategoria='Pendones', categoria=gran_formato)
+        Producto.objects.create(nombre_producto='Tarjeta', subcategoria=tarjetas, stock=10, precio_neto=100, es_oferta=True)
+        Producto.objects.create(nombre_producto='Volante', subcategoria=tarjetas, stock=2, stock_minimo=5, precio_neto=50)
+        Producto.objects.create(nombre_producto='Pendón', subcategoria=pendones, stock=0, precio_neto=1000,
+                                activo=False, es_destacado=True)
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(User.objects.create_user('admin', is_superuser=True))
+
+    def estadisticas(self):
+        return self.cliente.get(reverse('productos-admin-estadisticas')).json()
+
+    def test_una_consulta_por_grupo_y_cache(self):
+        # Contadores en una consulta y desglose por categoría en otra
+        with self.assertNumQueries(2):
+            stats = self.estadisticas()
+        self.assertEqual(
+            {clave: stats[clave] for clave in (
+                'total_productos', 'productos_activos', 'productos_sin_stock', 'productos_stock_bajo',
+                'productos_destacados', 'productos_en_oferta', 'productos_novedades'
+            )},
+            {'total_productos': 3, 'productos_activos': 2, 'productos_sin_stock': 1, 'productos_stock_bajo': 2,
+             'productos_destacados': 1, 'productos_en_oferta': 1, 'productos_novedades': 0}
+        )
+        self.assertEqual((stats['valor_inventario'], stats['valor_reposicion']), (1100, 5150))
+        self.assertEqual(
+            [(c['nombre_categoria'], c['total_productos'], c['productos_stock_bajo']) for c in stats['por_categoria']],
+            [('Gran formato', 1, 1), ('Imprenta', 2, 1)]
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.estadisticas(), stats)
+
+    def test_escritura_de_producto_invalida(self):
+        self.estadisticas()
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.filter(nombre_producto='Volante').get().save(update_fields=['vistas'])
+        with self.assertNumQueries(0):
+            self.estadisticas()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            volante = Producto.objects.get(nombre_producto='Volante')
+            volante.stock = 20
+            volante.save()
+        self.assertEqual(self.estadisticas()['productos_stock_bajo'], 1)
+
+
+class EstadoRegistroVisitasTests(TestCase):
+    def test_solo_administradores_ven_los_contadores(self):
+        url = reverse('estado-registro-visitas')
+        self.assertEqual(APIClient().get(url).status_code, 401)
+
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user('admin', is_superuser=True))
+        respuesta = cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            set(respuesta.json()['contadores']),
+            {'recibidas', 'guardadas', 'descartadas', 'descartadas_muestreo', 'errores', 'pendientes', 'capacidad'}
+        )
+
+
+class EstadisticasVisitasTests(TestCase):
+    def setUp(self):
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(User.objects.create_user('admin', is_superuser=True))
+        self.url = reverse('estadisticas-visitas')
+
+    def test_lee_solo_los_rollups(self):
+        hoy = timezone.localdate()
+        VisitaRutaDia.objects.bulk_create([
+            VisitaRutaDia(fecha=hoy, ruta='/a', visitas=5, visitantes=2),
+            VisitaRutaDia(fecha=hoy - datetime.timedelta(days=1), ruta='/b', visitas=7, visitantes=7),
+            VisitaRutaDia(fecha=hoy - datetime.timedelta(days=40), ruta='/c', visitas=100, visitantes=1),
+        ])
+        # Rutas principales y curva: una consulta cada una
+        with self.assertNumQueries(2):
+            datos = self.cliente.get(self.url).json()
+        self.assertEqual([r['ruta'] for r in datos['rutas_principales']], ['/b', '/a'])
+        self.assertEqual([t['visitas'] for t in datos['trafico']], [7, 5])
+
+        datos = self.cliente.get(self.url, {'ruta': '/a'}).json()
+        self.assertEqual(datos['trafico'], [{'fecha': hoy.isoformat(), 'visitas': 5, 'visitantes': 2}])
+
+        # limite se acota a [1, 100]
+        self.assertEqual([r['ruta'] for r in self.cliente.get(self.url, {'limite': -1}).json()['rutas_principales']], ['/b'])
+
+    def test_valida_parametros(self):
+        self.assertEqual(self.cliente.get(self.url, {'desde': 'ayer'}).status_code, 400)
+        self.assertEqual(
+            self.cliente.get(self.url, {'por': 'hora', 'desde': '2025-01-01', 'hasta': '2025-03-01'}).status_code, 400
+        )
 
-# Create your tests here.
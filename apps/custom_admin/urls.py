@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     ProductoAdminViewSet, CategoriaAdminViewSet, SubcategoriaAdminViewSet,
     CarruselAdminViewSet, MarcaAdminViewSet, UnidadMedidaAdminViewSet,
-    ProveedorAdminViewSet
+    ProveedorAdminViewSet, estado_registro_visitas, estadisticas_visitas
 )
 
 router = DefaultRouter()
@@ -17,6 +17,8 @@ router.register(r'proveedores', ProveedorAdminViewSet, basename='proveedores-adm
 
 
 urlpatterns = [
+    path('visitas/estadisticas/', estadisticas_visitas, name='estadisticas-visitas'),
+    path('visitas/estado/', estado_registro_visitas, name='estado-registro-visitas'),
     path('', include(router.urls)),
 ]
 
@@ -1,9 +1,14 @@
+import datetime
+import os
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from .models import ProductFile
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Count
 from apps.core.models import (
     Producto, ImagenProducto, Categoria, Subcategoria, Terminacion, TiempoProduccion,
     Carrusel, Marca, UnidadMedida, Proveedor
@@ -14,6 +19,13 @@ from .serializers import (
     SubcategoriaAdminSerializer, CarruselAdminSerializer,
     MarcaSerializer, UnidadMedidaSerializer, ProveedorSerializer
 )
+from apps.core.catalogo import invalidar_catalogo, prefetch_imagen_portada
+from apps.core.paginacion import PaginacionCursor
+from apps.core.parametros import fecha_parametro
+from apps.core.busqueda import filtrar_por_busqueda
+from apps.core.metricas import metricas_productos
+from apps.core.visitas import registro_visitas
+from apps.core.estadisticas_visitas import curva_trafico, rutas_principales
 from .permissions import EsAdministrador
 
 # ==================== PRODUCTOS ====================
@@ -28,6 +40,8 @@ class ProductoAdminViewSet(viewsets.ModelViewSet):
     ).prefetch_related('imagenes')
     permission_classes = [EsAdministrador]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = PaginacionCursor
+    ordenamiento_cursor = ('-fecha_creacion', '-pk')
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -36,6 +50,8 @@ class ProductoAdminViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.prefetch_related(prefetch_imagen_portada())
         
         # Filtros opcionales
         search = self.request.query_params.get('search', None)
@@ -45,11 +61,7 @@ class ProductoAdminViewSet(viewsets.ModelViewSet):
         activo = self.request.query_params.get('activo', None)
         
         if search:
-            queryset = queryset.filter(
-                Q(nombre_producto__icontains=search) |
-                Q(sku__icontains=search) |
-                Q(descripcion_corta__icontains=search)
-            )
+            queryset = filtrar_por_busqueda(queryset, search)
         
         if categoria_id:
             queryset = queryset.filter(subcategoria__categoria_id=categoria_id)
@@ -134,6 +146,8 @@ class ProductoAdminViewSet(viewsets.ModelViewSet):
         try:
             # Quitar principal de todas las imágenes
             producto.imagenes.update(es_principal=False)
+            # El update() masivo no dispara señales: invalidar el catálogo explícitamente
+            transaction.on_commit(invalidar_catalogo)
             
             # Establecer la nueva imagen principal
             imagen = producto.imagenes.get(imagen_producto_id=imagen_id)
@@ -152,16 +166,8 @@ class ProductoAdminViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def estadisticas(self, request):
-        """Obtener estadísticas generales de productos"""
-        stats = {
-            'total_productos': Producto.objects.count(),
-            'productos_activos': Producto.objects.filter(activo=True).count(),
-            'productos_sin_stock': Producto.objects.filter(stock=0).count(),
-            'productos_destacados': Producto.objects.filter(es_destacado=True).count(),
-            'productos_en_oferta': Producto.objects.filter(es_oferta=True).count(),
-            'productos_novedades': Producto.objects.filter(es_novedad=True).count(),
-        }
-        return Response(stats)
+        """Obtener estadísticas generales de productos (en caché por unos segundos, ver core/metricas.py)"""
+        return Response(metricas_productos())
 
     # ==================== TERMINACIONES ====================
     @action(detail=True, methods=['get', 'post'])
@@ -475,3 +481,52 @@ class ProveedorAdminViewSet(viewsets.ModelViewSet):
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
     permission_classes = [EsAdministrador]
+
+
+# ==================== VISITAS ====================
+@api_view(['GET'])
+@permission_classes([EsAdministrador])
+def estado_registro_visitas(request):
+    """Contadores del registro de visitas de este proceso (cada worker tiene el suyo)"""
+    return Response({
+        'error': False,
+        'registro_activo': settings.REGISTRO_VISITAS,
+        'pid': os.getpid(),
+        'contadores': registro_visitas.estado()
+    })
+
+# Días del rango por defecto y máximo por hora de estadisticas_visitas
+DIAS_ESTADISTICAS_VISITAS = 30
+MAX_DIAS_VISITAS_POR_HORA = 31
+
+
+@api_view(['GET'])
+@permission_classes([EsAdministrador])
+def estadisticas_visitas(request):
+    """
+    Rutas más visitadas y curva de tráfico, sólo desde los rollups (consolidar_visitas).
+    Parámetros: desde/hasta (AAAA-MM-DD, por defecto los últimos 30 días), por=dia|hora,
+    ruta (curva de una sola ruta) y limite (rutas principales, entre 1 y 100).
+    """
+    try:
+        hasta = fecha_parametro(request, 'hasta', timezone.localdate())
+        desde = fecha_parametro(request, 'desde', hasta - datetime.timedelta(days=DIAS_ESTADISTICAS_VISITAS - 1))
+        limite = min(max(int(request.query_params.get('limite', 10)), 1), 100)
+    except ValueError as error:
+        return Response({'error': True, 'mensaje': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    por_hora = request.query_params.get('por') == 'hora'
+    if por_hora and (hasta - desde).days >= MAX_DIAS_VISITAS_POR_HORA:
+        return Response({
+            'error': True,
+            'mensaje': f'La curva por hora admite hasta {MAX_DIAS_VISITAS_POR_HORA} días'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'error': False,
+        'desde': desde,
+        'hasta': hasta,
+        'rutas_principales': rutas_principales(desde, hasta, limite),
+        'trafico': curva_trafico(desde, hasta, por_hora, request.query_params.get('ruta'))
+    })
+
@@ -0,0 +1,195 @@
+# orders/archivos.py
+import os
+import re
+import time
+import uuid
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+
+# Los archivos de diseño se escriben en disco en bloques de este tamaño: la memoria
+# usada no depende del tamaño del archivo
+TAMANO_BLOQUE = 64 * 1024
+EXTENSIONES_PERMITIDAS = {
+    '.png', '.jpg', '.jpeg', '.webp', '.tif', '.tiff', '.pdf', '.ai', '.eps', '.psd', '.svg'
+}
+# Subidas aún no asociadas a un pedido: MEDIA_ROOT/pedidos/temporales/<token>/<nombre>
+CARPETA_TEMPORALES = os.path.join('pedidos', 'temporales')
+PATRON_TOKEN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ArchivoInvalido(Exception):
+    pass
+
+
+def tamano_maximo():
+    return settings.ARCHIVO_PEDIDO_MAX_MB * 1024 * 1024
+
+
+def carpeta_temporal(token):
+    """Carpeta de una subida, o None si el token no tiene el formato esperado."""
+    if not token or not PATRON_TOKEN.match(token):
+        return None
+    return os.path.join(settings.MEDIA_ROOT, CARPETA_TEMPORALES, token)
+
+
+def extension_permitida(nombre):
+    extension = os.path.splitext(nombre or '')[1].lower()
+    if extension not in EXTENSIONES_PERMITIDAS:
+        raise ArchivoInvalido(
+            f"Extensión no permitida. Permitidas: {', '.join(sorted(EXTENSIONES_PERMITIDAS))}"
+        )
+    return extension
+
+
+class ArchivoEnPreparacion:
+    """Escribe una subida en su carpeta temporal bloque a bloque, controlando el tamaño máximo."""
+
+    def __init__(self, nombre):
+        self.extension = extension_permitida(nombre)
+        self.token = uuid.uuid4().hex
+        self.nombre = f'archivo{self.extension}'
+        self.tamano = 0
+        carpeta = carpeta_temporal(self.token)
+        os.makedirs(carpeta, exist_ok=True)
+        self.ruta = os.path.join(carpeta, self.nombre)
+        self._archivo = open(self.ruta, 'wb')
+
+    def escribir(self, bloque):
+        self.tamano += len(bloque)
+        if self.tamano > tamano_maximo():
+            self.descartar()
+            raise ArchivoInvalido(f'El archivo excede el máximo de {settings.ARCHIVO_PEDIDO_MAX_MB} MB')
+        self._archivo.write(bloque)
+
+    def cerrar(self):
+        self._archivo.close()
+        if not self.tamano:
+            self.descartar()
+            raise ArchivoInvalido('El archivo está vacío')
+
+    def descartar(self):
+        self._archivo.close()
+        eliminar_subida(self.token)
+
+
+class ArchivoPedidoUploadHandler(FileUploadHandler):
+    """
+    Handler de subida multipart que escribe el campo 'archivo' directo en su carpeta
+    temporal, sin pasar por memoria ni por el directorio temporal del sistema.
+    El error (si lo hay) queda en self.error.
+    """
+    chunk_size = TAMANO_BLOQUE
+    campo = 'archivo'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.destino = None
+        self.error = None
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        if field_name != self.campo or self.destino is not None:
+            raise SkipFile()
+        try:
+            self.destino = ArchivoEnPreparacion(file_name)
+        except ArchivoInvalido as e:
+            self.error = str(e)
+            raise StopUpload(connection_reset=False)
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.destino.escribir(raw_data)
+        except ArchivoInvalido as e:
+            self.error = str(e)
+            raise StopUpload(connection_reset=False)
+        return None
+
+    def file_complete(self, file_size):
+        try:
+            self.destino.cerrar()
+        except ArchivoInvalido as e:
+            self.error = str(e)
+            return None
+        archivo = UploadedFile(name=self.file_name, content_type=self.content_type, size=self.destino.tamano)
+        archivo.token = self.destino.token
+        return archivo
+
+    def upload_interrupted(self):
+        if self.destino is not None:
+            self.destino.descartar()
+
+
+def guardar_cuerpo_crudo(flujo, nombre):
+    """Guarda un cuerpo de solicitud sin codificar (application/octet-stream, image/*, ...)."""
+    destino = ArchivoEnPreparacion(nombre)
+    try:
+        while True:
+            bloque = flujo.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            destino.escribir(bloque)
+    except Exception:
+        destino.descartar()
+        raise
+    destino.cerrar()
+    return destino
+
+
+def buscar_archivo_subido(token):
+    """Ruta del archivo de una subida, o None si no existe o ya fue usada."""
+    carpeta = carpeta_temporal(token)
+    if carpeta is None or not os.path.isdir(carpeta):
+        return None
+    for nombre in os.listdir(carpeta):
+        return os.path.join(carpeta, nombre)
+    return None
+
+
+def _origen_subida(token):
+    origen = buscar_archivo_subido(token)
+    if origen is None:
+        raise ArchivoInvalido('Archivo subido no encontrado o expirado')
+    return origen
+
+
+def nombre_archivo_subido(token, nombre_base):
+    """Nombre final de una subida en la carpeta del pedido: nombre_base más la extensión original."""
+    return nombre_base + os.path.splitext(_origen_subida(token))[1]
+
+
+def mover_archivo_subido(token, carpeta_destino, nombre_base):
+    """
+    Mueve una subida a la carpeta del pedido (un rename, sin copiar datos) y retorna
+    el nombre final: nombre_base más la extensión original.
+    """
+    origen = _origen_subida(token)
+    nombre_archivo = nombre_base + os.path.splitext(origen)[1]
+    os.makedirs(carpeta_destino, exist_ok=True)
+    os.replace(origen, os.path.join(carpeta_destino, nombre_archivo))
+    eliminar_subida(token)
+    return nombre_archivo
+
+
+def eliminar_subida(token):
+    carpeta = carpeta_temporal(token)
+    if carpeta is None or not os.path.isdir(carpeta):
+        return
+    for nombre in os.listdir(carpeta):
+        os.remove(os.path.join(carpeta, nombre))
+    os.rmdir(carpeta)
+
+
+def limpiar_subidas_antiguas(horas):
+    """Elimina las subidas que nunca se asociaron a un pedido. Retorna cuántas eliminó."""
+    raiz = os.path.join(settings.MEDIA_ROOT, CARPETA_TEMPORALES)
+    if not os.path.isdir(raiz):
+        return 0
+    limite = time.time() - horas * 3600
+    eliminadas = 0
+    for token in os.listdir(raiz):
+        carpeta = carpeta_temporal(token)
+        if carpeta and os.path.getmtime(carpeta) < limite:
+            eliminar_subida(token)
+            eliminadas += 1
+    return eliminadas
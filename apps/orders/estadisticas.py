@@ -0,0 +1,204 @@
+# orders/estadisticas.py
+"""
+Estadísticas de pedidos.
+
+EstadisticaDiariaPedido guarda, por día de creación y estado, la cantidad de
+pedidos y la suma de sus totales. Las señales de Pedido (signals.py) aplican la
+diferencia de cada alta, cambio de estado o de total y baja; las escrituras
+masivas que usan queryset.update() llaman a registrar_guardados(). Los ajustes
+se aplican al confirmarse la transacción del pedido, para no retener el
+bloqueo de la fila del día mientras se crean los detalles.
+
+Los resúmenes se calculan con una sola consulta de agregación condicional,
+sobre el rollup (por defecto) o sobre la tabla de pedidos.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import Pedido, EstadoPedido, EstadisticaDiariaPedido
+
+# Claves del resumen que antes se calculaban con una consulta cada una
+CLAVES_ESTADO = {
+    EstadoPedido.PENDIENTE: 'pendientes',
+    EstadoPedido.PREPARANDO: 'en_preparacion',
+    EstadoPedido.EN_CAMINO: 'en_camino',
+    EstadoPedido.ENTREGADO: 'entregados',
+    EstadoPedido.CANCELADO: 'cancelados',
+}
+
+
+def dia_pedido(pedido):
+    return timezone.localdate(pedido.fecha_creacion)
+
+
+# ===== ACTUALIZACIÓN INCREMENTAL =====
+
+def _ajustar(fecha, estado, cantidad, total):
+    """Suma (cantidad, total) a la fila (fecha, estado), creándola si no existe."""
+    fila = EstadisticaDiariaPedido.objects.filter(fecha=fecha, estado=estado)
+    if fila.update(cantidad=F('cantidad') + cantidad, total=F('total') + total):
+        return
+    try:
+        with transaction.atomic():
+            EstadisticaDiariaPedido.objects.create(fecha=fecha, estado=estado, cantidad=cantidad, total=total)
+    except IntegrityError:
+        # Otro proceso creó la fila entre medio
+        fila.update(cantidad=F('cantidad') + cantidad, total=F('total') + total)
+
+
+def aplicar_diferencias(diferencias):
+    """Aplica {(fecha, estado): [cantidad, total]} en una transacción, omitiendo las nulas."""
+    with transaction.atomic():
+        for (fecha, estado), (cantidad, total) in sorted(diferencias.items()):
+            if cantidad or total:
+                _ajustar(fecha, estado, cantidad, total)
+
+
+def _diferencia_pedido(diferencias, pedido, creado=False):
+    """Agrega a `diferencias` el efecto de guardar `pedido` y actualiza su estado original."""
+    fecha = dia_pedido(pedido)
+    total = Decimal(pedido.total or 0)
+    if not creado:
+        estado_anterior, total_anterior = getattr(pedido, '_original_estadistica', (None, None))
+        if estado_anterior is None or total_anterior is None:
+            # Instancia no leída de la base de datos: se corrige con recalcular_estadisticas_pedidos
+            return
+        if (estado_anterior, total_anterior) == (pedido.estado, total):
+            return
+        anterior = diferencias[(fecha, estado_anterior)]
+        anterior[0] -= 1
+        anterior[1] -= total_anterior
+    actual = diferencias[(fecha, pedido.estado)]
+    actual[0] += 1
+    actual[1] += total
+    pedido._original_estadistica = (pedido.estado, total)
+
+
+def _nuevas_diferencias():
+    return defaultdict(lambda: [0, Decimal('0')])
+
+
+def _al_confirmar(diferencias):
+    # robust: si el ajuste falla (queda registrado en el log) el pedido ya está
+    # confirmado y no debe reportarse como fallido; recalcular_estadisticas_pedidos
+    # corrige la diferencia
+    if diferencias:
+        transaction.on_commit(lambda: aplicar_diferencias(diferencias), robust=True)
+
+
+def registrar_guardado(pedido, creado):
+    diferencias = _nuevas_diferencias()
+    _diferencia_pedido(diferencias, pedido, creado)
+    _al_confirmar(diferencias)
+
+
+def registrar_guardados(pedidos):
+    """Para escrituras con queryset.update(): un ajuste por (día, estado), no por pedido."""
+    diferencias = _nuevas_diferencias()
+    for pedido in pedidos:
+        _diferencia_pedido(diferencias, pedido)
+    _al_confirmar(diferencias)
+
+
+def registrar_eliminado(pedido):
+    estado, total = getattr(pedido, '_original_estadistica', (pedido.estado, pedido.total))
+    diferencias = _nuevas_diferencias()
+    diferencias[(dia_pedido(pedido), estado)] = [-1, -(total or Decimal('0'))]
+    _al_confirmar(diferencias)
+
+
+# ===== RECÁLCULO =====
+
+def filas_desde_pedidos(desde=None, hasta=None):
+    """EstadisticaDiariaPedido (sin guardar) calculadas desde la tabla de pedidos."""
+    pedidos = Pedido.objects.annotate(fecha=TruncDate('fecha_creacion'))
+    if desde:
+        pedidos = pedidos.filter(fecha__gte=desde)
+    if hasta:
+        pedidos = pedidos.filter(fecha__lte=hasta)
+    grupos = pedidos.order_by().values('fecha', 'estado').annotate(
+        cantidad=Count('pedido_id'), suma=Sum('total')
+    )
+    return [
+        EstadisticaDiariaPedido(
+            fecha=grupo['fecha'], estado=grupo['estado'],
+            cantidad=grupo['cantidad'], total=grupo['suma'] or 0
+        )
+        for grupo in grupos
+    ]
+
+
+def recalcular(desde=None, hasta=None):
+    """Reemplaza el rollup del rango (o completo) con lo que dice la tabla de pedidos."""
+    filas = filas_desde_pedidos(desde, hasta)
+    with transaction.atomic():
+        _filtrar_rollup(desde, hasta).delete()
+        EstadisticaDiariaPedido.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+# ===== CONSULTA =====
+
+def _resumen(queryset, cantidad, monto):
+    """Resumen por estado en una sola consulta de agregación condicional."""
+    agregados = {
+        'total_pedidos': cantidad(None),
+        'ventas_totales': monto(~Q(estado=EstadoPedido.CANCELADO)),
+    }
+    for estado in EstadoPedido:
+        agregados[estado.value] = cantidad(Q(estado=estado))
+    fila = queryset.aggregate(**agregados)
+
+    stats = {
+        'total_pedidos': fila['total_pedidos'],
+        'por_estado': {estado.value: fila[estado.value] for estado in EstadoPedido if fila[estado.value]},
+    }
+    for estado, clave in CLAVES_ESTADO.items():
+        stats[clave] = fila[estado.value]
+    stats['ventas_totales'] = fila['ventas_totales']
+    return stats
+
+
+def _monto(filtro=None):
+    return Coalesce(
+        Sum('total', filter=filtro), Value(0), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+def _filtrar_rollup(desde, hasta):
+    filas = EstadisticaDiariaPedido.objects.all()
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta:
+        filas = filas.filter(fecha__lte=hasta)
+    return filas
+
+
+def resumen_desde_rollup(desde=None, hasta=None):
+    return _resumen(
+        _filtrar_rollup(desde, hasta),
+        lambda filtro: Coalesce(Sum('cantidad', filter=filtro), 0),
+        _monto,
+    )
+
+
+def resumen_desde_pedidos(desde=None, hasta=None):
+    pedidos = Pedido.objects.all()
+    if desde:
+        pedidos = pedidos.filter(fecha_creacion__date__gte=desde)
+    if hasta:
+        pedidos = pedidos.filter(fecha_creacion__date__lte=hasta)
+    return _resumen(pedidos, lambda filtro: Count('pedido_id', filter=filtro), _monto)
+
+
+def serie_diaria(desde=None, hasta=None):
+    """[{'fecha', 'pedidos', 'ventas'}, ...] por día, desde el rollup."""
+    return list(
+        _filtrar_rollup(desde, hasta).order_by('fecha').values('fecha').annotate(
+            pedidos=Sum('cantidad'),
+            ventas=_monto(~Q(estado=EstadoPedido.CANCELADO))
+        )
+    )
@@ -0,0 +1,89 @@
+# orders/inventario.py
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from apps.core.models import Producto
+from apps.core.precios import invalidar_hojas_precios
+
+
+class StockInsuficiente(Exception):
+    """La reserva no alcanzó para una o más líneas; 'resultados' trae el detalle por línea."""
+
+    def __init__(self, resultados):
+        self.resultados = resultados
+        super().__init__('Stock insuficiente')
+
+    def mensajes(self):
+        return [
+            f"Stock insuficiente para {r['nombre_producto']} (solicitados: {r['solicitado']}, disponibles: {r['disponible']})"
+            for r in self.resultados if not r['reservado']
+        ]
+
+
+def reservar_stock(lineas):
+    """
+    Descuenta el stock y suma ventas_totales de todas las líneas en una sola transacción.
+    Recibe pares (producto_id, cantidad) y retorna un resultado por línea:
+    {'producto_id', 'nombre_producto', 'cantidad', 'solicitado', 'disponible', 'reservado'},
+    donde 'solicitado' es el total del producto sumando todas sus líneas.
+
+    Las filas se bloquean en orden de producto_id (sin interbloqueos entre pedidos con
+    los mismos productos) y el UPDATE es condicional (stock >= cantidad), así dos pedidos
+    concurrentes nunca venden más de lo disponible. Si alguna línea no alcanza, lanza
+    StockInsuficiente y no descuenta nada.
+    """
+    lineas = list(lineas)
+    solicitado = {}
+    for producto_id, cantidad in lineas:
+        solicitado[producto_id] = solicitado.get(producto_id, 0) + cantidad
+
+    try:
+        with transaction.atomic():
+            productos = {
+                p['producto_id']: p
+                for p in Producto.objects.select_for_update().filter(producto_id__in=solicitado)
+                .order_by('producto_id').values('producto_id', 'nombre_producto', 'stock')
+            }
+            resultados = [
+                {
+                    'producto_id': producto_id,
+                    'nombre_producto': productos[producto_id]['nombre_producto'] if producto_id in productos else None,
+                    'cantidad': cantidad,
+                    'solicitado': solicitado[producto_id],
+                    'disponible': productos[producto_id]['stock'] if producto_id in productos else 0,
+                    'reservado': producto_id in productos and productos[producto_id]['stock'] >= solicitado[producto_id],
+                }
+                for producto_id, cantidad in lineas
+            ]
+            if not all(r['reservado'] for r in resultados):
+                raise StockInsuficiente(resultados)
+
+            cantidad_por_producto = Case(
+                *[When(producto_id=producto_id, then=Value(cantidad)) for producto_id, cantidad in solicitado.items()],
+                output_field=IntegerField()
+            )
+            actualizados = Producto.objects.filter(
+                producto_id__in=solicitado, stock__gte=cantidad_por_producto
+            ).update(
+                stock=F('stock') - cantidad_por_producto,
+                ventas_totales=F('ventas_totales') + cantidad_por_producto,
+                fecha_modificacion=timezone.now()
+            )
+            if actualizados != len(solicitado):
+                # Sin bloqueo de filas (SQLite) otro pedido pudo descontar entre la lectura
+                # y el UPDATE: se revierte lo descontado y se informa el stock vigente
+                raise StockInsuficiente(resultados)
+    except StockInsuficiente as error:
+        if all(r['reservado'] for r in error.resultados):
+            disponibles = dict(
+                Producto.objects.filter(producto_id__in=solicitado).values_list('producto_id', 'stock')
+            )
+            for r in error.resultados:
+                r['disponible'] = disponibles.get(r['producto_id'], 0)
+                r['reservado'] = r['disponible'] >= r['solicitado']
+        raise
+
+    # update() no emite señales: la hoja de precios guarda el stock
+    producto_ids = list(solicitado)
+    transaction.on_commit(lambda: invalidar_hojas_precios(producto_ids))
+    return resultados
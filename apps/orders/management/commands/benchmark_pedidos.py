@@ -0,0 +1,88 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from apps.core.models import (
+    Categoria, Subcategoria, Producto, UserProfile, Terminacion, TiempoProduccion, Acabado
+)
+from apps.orders.serializers import CrearPedidoSerializer
+
+# Ejecutar el comando python manage.py benchmark_pedidos [--lineas 1 10 100] [--repeticiones 5]
+
+class Command(BaseCommand):
+    help = 'Mide consultas y latencia de CrearPedidoSerializer para pedidos de 1, 10 y 100 líneas (sin dejar datos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'líneas':>8} {'consultas':>10} {'mediana ms':>12} {'mín ms':>10}")
+        # Todo ocurre dentro de una transacción que se revierte al final
+        with transaction.atomic():
+            datos_base = self.crear_datos(max(options['lineas']))
+            for lineas in options['lineas']:
+                consultas, tiempos = self.medir(datos_base, lineas, options['repeticiones'])
+                self.stdout.write(
+                    f"{lineas:>8} {consultas:>10} {statistics.median(tiempos):>12.1f} {min(tiempos):>10.1f}"
+                )
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark terminado (datos revertidos)'))
+
+    def crear_datos(self, cantidad_productos):
+        """Productos de prueba con una terminación, un tiempo de producción y dos acabados cada uno"""
+        categoria = Categoria.objects.create(nombre_categoria='Benchmark')
+        subcategoria = Subcategoria.objects.create(nombre_subcategoria='Benchmark', categoria=categoria)
+        acabados = [
+            Acabado.objects.create(nombre_acabado='Benchmark A', costo_adicional=2),
+            Acabado.objects.create(nombre_acabado='Benchmark B', costo_adicional=3),
+        ]
+        items = []
+        for i in range(cantidad_productos):
+            producto = Producto.objects.create(
+                nombre_producto=f'Benchmark {i}', subcategoria=subcategoria, stock=10 ** 6
+            )
+            terminacion = Terminacion.objects.create(producto=producto, nombre_terminacion='Tela', precio=1500)
+            tiempo = TiempoProduccion.objects.create(
+                producto=producto, nombre_tiempo='Normal', dias_estimados=3, precio=1000
+            )
+            items.append({
+                'producto_id': producto.producto_id,
+                'nombre_producto': producto.nombre_producto,
+                'cantidad': 2,
+                'precio_unitario': '15000',
+                'acabado_ids': [a.acabado_id for a in acabados],
+                'terminacion_id': terminacion.terminacion_id,
+                'tiempo_produccion_id': tiempo.tiempo_produccion_id,
+                'ancho_cm': 100,
+                'alto_cm': 50,
+            })
+        return {
+            'user_profile_id': UserProfile.objects.create().user_profile_id,
+            'items': items,
+            'direccion_entrega': 'Calle Benchmark 123',
+            'comuna': 'Santiago',
+            'ciudad': 'Santiago',
+            'region': 'Metropolitana',
+            'telefono_contacto': '+56911111111',
+            'email_contacto': 'benchmark@graficagyg.com',
+            'subtotal': '0',
+            'costo_envio': '0',
+            'total': '0',
+            'metodo_pago': 'benchmark',
+        }
+
+    def medir(self, datos_base, lineas, repeticiones):
+        datos = dict(datos_base, items=datos_base['items'][:lineas])
+        tiempos = []
+        consultas = 0
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                serializer = CrearPedidoSerializer(data=datos)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = len(capturadas)
+        return consultas, tiempos
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.orders.archivos import limpiar_subidas_antiguas
+
+# Ejecutar el comando python manage.py limpiar_archivos_pedido [--horas 24]
+
+class Command(BaseCommand):
+    help = 'Elimina los archivos de diseño subidos que no se asociaron a ningún pedido'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=24, help='Antigüedad mínima de las subidas a eliminar')
+
+    def handle(self, *args, **options):
+        eliminadas = limpiar_subidas_antiguas(options['horas'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {eliminadas} subidas temporales eliminadas'))
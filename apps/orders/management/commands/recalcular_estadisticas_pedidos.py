@@ -0,0 +1,16 @@
+import datetime
+from django.core.management.base import BaseCommand
+from apps.orders.estadisticas import recalcular
+
+# Ejecutar el comando python manage.py recalcular_estadisticas_pedidos [--desde 2025-01-01] [--hasta 2025-12-31]
+
+class Command(BaseCommand):
+    help = 'Recalcula desde la tabla de pedidos las estadísticas diarias (todas o las de un rango de fechas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=datetime.date.fromisoformat, help='Primer día a recalcular (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=datetime.date.fromisoformat, help='Último día a recalcular (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        filas = recalcular(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {filas} filas de estadísticas diarias recalculadas'))
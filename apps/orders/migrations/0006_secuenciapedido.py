@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_alter_detallepedido_costo_terminacion_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaPedido',
+            fields=[
+                ('fecha', models.DateField(primary_key=True, serialize=False)),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'secuencias_pedido',
+            },
+        ),
+    ]
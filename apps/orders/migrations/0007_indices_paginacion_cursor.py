@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_indices_paginacion_cursor'),
+        ('orders', '0006_secuenciapedido'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha_creacion', 'pedido_id'], name='pedidos_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['user_profile', 'fecha_creacion', 'pedido_id'], name='pedidos_usuario_cursor_idx'),
+        ),
+    ]
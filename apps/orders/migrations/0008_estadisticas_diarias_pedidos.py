@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:36
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_estadisticas(apps, schema_editor):
+    # Mismo cálculo que estadisticas.recalcular(), con los modelos históricos
+    Pedido = apps.get_model('orders', 'Pedido')
+    EstadisticaDiariaPedido = apps.get_model('orders', 'EstadisticaDiariaPedido')
+    grupos = (
+        Pedido.objects.annotate(fecha=TruncDate('fecha_creacion'))
+        .order_by().values('fecha', 'estado')
+        .annotate(cantidad=Count('pedido_id'), suma=Sum('total'))
+    )
+    EstadisticaDiariaPedido.objects.bulk_create([
+        EstadisticaDiariaPedido(
+            fecha=grupo['fecha'], estado=grupo['estado'],
+            cantidad=grupo['cantidad'], total=grupo['suma'] or 0
+        )
+        for grupo in grupos
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_indices_paginacion_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDiariaPedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('CONFIRMADO', 'Confirmado'), ('PREPARANDO', 'Preparando'), ('EN_CAMINO', 'En Camino'), ('ENTREGADO', 'Entregado'), ('CANCELADO', 'Cancelado')], max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'estadisticas_diarias_pedidos',
+                'ordering': ['fecha', 'estado'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado'), name='estadistica_diaria_pedido_unica')],
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
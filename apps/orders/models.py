@@ -1,6 +1,8 @@
-from django.db import models
+import threading
+from django.db import models, connection, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
 from apps.core.models import BaseModel, Producto, Cliente, UserProfile
-import datetime
 
 # ============= MODELOS DE PEDIDOS Y DESPACHO =============
 class EstadoPedido(models.TextChoices):
@@ -50,18 +52,94 @@ class Pedido(BaseModel):
     class Meta:
         db_table = 'pedidos'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Paginación por cursor: (-fecha_creacion, -pk), global y por usuario
+            models.Index(fields=['fecha_creacion', 'pedido_id'], name='pedidos_cursor_idx'),
+            models.Index(fields=['user_profile', 'fecha_creacion', 'pedido_id'], name='pedidos_usuario_cursor_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido {self.numero_pedido}"
 
     def save(self, *args, **kwargs):
         if not self.numero_pedido:
-            # Generar número de pedido único
-            fecha = datetime.datetime.now().strftime('%Y%m%d')
-            ultimo = Pedido.objects.filter(numero_pedido__startswith=f'PED-{fecha}').count()
-            self.numero_pedido = f'PED-{fecha}-{ultimo + 1:04d}'
+            # Generar número de pedido único desde la secuencia diaria
+            self.numero_pedido = SecuenciaPedido.siguiente_numero_pedido()
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        pedido = super().from_db(db, field_names, values)
+        # Estado y total leídos: las estadísticas diarias aplican sólo la diferencia al guardar
+        pedido._original_estadistica = (pedido.__dict__.get('estado'), pedido.__dict__.get('total'))
+        return pedido
+
+class SecuenciaPedido(models.Model):
+    """
+    Contador diario de números de pedido (PED-YYYYMMDD-NNNN). Cada asignación es un
+    UPDATE de una sola fila, sin recorrer los pedidos del día.
+    """
+    fecha = models.DateField(primary_key=True)
+    ultimo_numero = models.PositiveIntegerField(default=0)
+
+    # SQLite admite un solo escritor y no espera los bloqueos de tabla en memoria
+    # compartida: dentro del proceso las asignaciones se serializan con este lock
+    _lock_sqlite = threading.Lock()
+
+    class Meta:
+        db_table = 'secuencias_pedido'
+
+    def __str__(self):
+        return f"{self.fecha:%Y%m%d}: {self.ultimo_numero}"
+
+    @classmethod
+    def siguiente_numero_pedido(cls, fecha=None):
+        """
+        Retorna el siguiente número de pedido del día. Conviene llamarlo fuera de una
+        transacción larga: el bloqueo de la fila del día dura hasta el commit.
+        """
+        fecha = fecha or timezone.localdate()
+        if connection.vendor == 'sqlite':
+            with cls._lock_sqlite:
+                numero = cls._asignar(fecha)
+        else:
+            numero = cls._asignar(fecha)
+        return f'PED-{fecha:%Y%m%d}-{numero:04d}'
+
+    @classmethod
+    def _asignar(cls, fecha):
+        with transaction.atomic():
+            numero = cls._incrementar(fecha)
+            if numero is not None:
+                return numero
+            # Primer pedido del día: la fila parte desde los pedidos ya numerados
+            # con el esquema anterior (solo ocurre una vez por día)
+            existentes = Pedido.objects.filter(numero_pedido__startswith=f'PED-{fecha:%Y%m%d}').count()
+            try:
+                with transaction.atomic():
+                    cls.objects.create(fecha=fecha, ultimo_numero=existentes + 1)
+                return existentes + 1
+            except IntegrityError:
+                # Otro proceso creó la fila entre medio
+                return cls._incrementar(fecha)
+
+    @classmethod
+    def _incrementar(cls, fecha):
+        """Incrementa el contador del día y retorna el nuevo valor, o None si no hay fila."""
+        if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert:
+            # UPDATE ... RETURNING (PostgreSQL, SQLite >= 3.35): una sola sentencia por asignación
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {cls._meta.db_table} SET ultimo_numero = ultimo_numero + 1 '
+                    f'WHERE fecha = %s RETURNING ultimo_numero',
+                    [connection.ops.adapt_datefield_value(fecha)]
+                )
+                fila = cursor.fetchone()
+            return fila[0] if fila else None
+        if not cls.objects.filter(fecha=fecha).update(ultimo_numero=F('ultimo_numero') + 1):
+            return None
+        return cls.objects.filter(fecha=fecha).values_list('ultimo_numero', flat=True).get()
+
 class DetallePedido(BaseModel):
     detalle_pedido_id = models.AutoField(primary_key=True)
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='detalles')
@@ -137,6 +215,28 @@ class SeguimientoDespacho(BaseModel):
 
     def __str__(self):
         return f"Seguimiento {self.pedido.numero_pedido} - {self.estado}"
+
+class EstadisticaDiariaPedido(models.Model):
+    """
+    Pedidos y montos por día de creación y estado actual, mantenidos en forma
+    incremental (ver estadisticas.py). Las estadísticas de meses leen unos
+    cientos de filas en vez de recorrer la tabla de pedidos. Se recalculan con
+    python manage.py recalcular_estadisticas_pedidos.
+    """
+    fecha = models.DateField()
+    estado = models.CharField(max_length=20, choices=EstadoPedido.choices)
+    cantidad = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'estadisticas_diarias_pedidos'
+        ordering = ['fecha', 'estado']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'estado'], name='estadistica_diaria_pedido_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado}: {self.cantidad}"
     
 class TamanoPredefinido(BaseModel):
     """Tamaños preestablecidos para productos personalizables"""
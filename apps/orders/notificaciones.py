@@ -0,0 +1,47 @@
+# orders/notificaciones.py
+"""
+Correos al cliente sobre su pedido. Sólo se encolan (apps.core.correos): deben
+llamarse dentro de la transacción que escribe el pedido o su seguimiento.
+"""
+from apps.core.correos import encolar_correo, encolar_correos, nuevo_correo
+
+
+def encolar_confirmacion_pedido(pedido):
+    return encolar_correo(
+        'emails/pedido_confirmacion',
+        pedido.email_contacto,
+        f'Confirmación de Pedido #{pedido.numero_pedido}',
+        {
+            'numero_pedido': pedido.numero_pedido,
+            'total': pedido.total,
+            'estado': pedido.get_estado_display(),
+        }
+    )
+
+
+def correo_actualizacion_estado(pedido, seguimiento):
+    return nuevo_correo(
+        'emails/pedido_actualizacion',
+        pedido.email_contacto,
+        f'Actualización de Pedido #{pedido.numero_pedido}',
+        {
+            'numero_pedido': pedido.numero_pedido,
+            'estado': pedido.get_estado_display(),
+            'descripcion': seguimiento.descripcion,
+            'ubicacion': seguimiento.ubicacion,
+        }
+    )
+
+
+def encolar_actualizacion_estado(pedido, seguimiento):
+    correo = correo_actualizacion_estado(pedido, seguimiento)
+    if correo is not None:
+        correo.save()
+    return correo
+
+
+def encolar_actualizaciones_estado(pedidos_seguimientos):
+    """Encola en un solo INSERT los avisos de varios pares (pedido, seguimiento)."""
+    return encolar_correos(
+        correo_actualizacion_estado(pedido, seguimiento) for pedido, seguimiento in pedidos_seguimientos
+    )
@@ -1,9 +1,19 @@
 import os
 import base64
+import binascii
+import logging
 from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from apps.core.models import Producto, UserProfile, Persona, Direccion, Terminacion
-from .models import Pedido, DetallePedido, SeguimientoDespacho, EstadoPedido
+from apps.core.models import Producto, UserProfile, Persona, Direccion, Terminacion, Acabado, TiempoProduccion
+from .models import Pedido, DetallePedido, SeguimientoDespacho, EstadoPedido, SecuenciaPedido
+from .inventario import reservar_stock
+from .notificaciones import encolar_confirmacion_pedido
+from apps.core.interacciones import registrar_compra
+from .archivos import ArchivoInvalido, buscar_archivo_subido, mover_archivo_subido, nombre_archivo_subido
+
+logger = logging.getLogger(__name__)
+
 
 class SeguimientoDespachoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,6 +21,24 @@ class SeguimientoDespachoSerializer(serializers.ModelSerializer):
         fields = ['seguimiento_id', 'estado', 'descripcion', 'ubicacion', 'fecha_creacion']
         read_only_fields = ['seguimiento_id', 'fecha_creacion']
 
+# Transiciones de estado permitidas (ENTREGADO y CANCELADO son finales)
+TRANSICIONES_VALIDAS = {
+    EstadoPedido.PENDIENTE: [EstadoPedido.CONFIRMADO, EstadoPedido.CANCELADO],
+    EstadoPedido.CONFIRMADO: [EstadoPedido.PREPARANDO, EstadoPedido.CANCELADO],
+    EstadoPedido.PREPARANDO: [EstadoPedido.EN_CAMINO, EstadoPedido.CANCELADO],
+    EstadoPedido.EN_CAMINO: [EstadoPedido.ENTREGADO],
+    EstadoPedido.ENTREGADO: [],
+    EstadoPedido.CANCELADO: []
+}
+# Pedidos por llamada a actualizar_estado_masivo
+MAX_PEDIDOS_ACTUALIZACION_MASIVA = 500
+
+def error_transicion(estado_actual, nuevo_estado):
+    """Mensaje de error si la transición no está permitida, o None."""
+    if nuevo_estado not in TRANSICIONES_VALIDAS.get(estado_actual, []):
+        return f"No se puede cambiar de {estado_actual} a {nuevo_estado}"
+    return None
+
 class ActualizarEstadoPedidoSerializer(serializers.Serializer):
     """Serializer para actualizar el estado de un pedido"""
     estado = serializers.ChoiceField(choices=EstadoPedido.choices)
@@ -23,23 +51,30 @@ class ActualizarEstadoPedidoSerializer(serializers.Serializer):
         if not pedido:
             raise serializers.ValidationError("Pedido no encontrado en el contexto")
         
-        # Validar transiciones lógicas
-        transiciones_validas = {
-            EstadoPedido.PENDIENTE: [EstadoPedido.CONFIRMADO, EstadoPedido.CANCELADO],
-            EstadoPedido.CONFIRMADO: [EstadoPedido.PREPARANDO, EstadoPedido.CANCELADO],
-            EstadoPedido.PREPARANDO: [EstadoPedido.EN_CAMINO, EstadoPedido.CANCELADO],
-            EstadoPedido.EN_CAMINO: [EstadoPedido.ENTREGADO],
-            EstadoPedido.ENTREGADO: [],  # Estado final
-            EstadoPedido.CANCELADO: []   # Estado final
-        }
-        
-        if value not in transiciones_validas.get(pedido.estado, []):
-            raise serializers.ValidationError(
-                f"No se puede cambiar de {pedido.estado} a {value}"
-            )
+        error = error_transicion(pedido.estado, value)
+        if error:
+            raise serializers.ValidationError(error)
         
         return value
 
+class ActualizarEstadoMasivoSerializer(serializers.Serializer):
+    """
+    Mismo cambio de estado para varios pedidos. Las transiciones se validan por
+    pedido en la vista, que informa el resultado de cada uno.
+    """
+    pedido_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=MAX_PEDIDOS_ACTUALIZACION_MASIVA
+    )
+    estado = serializers.ChoiceField(choices=EstadoPedido.choices)
+    descripcion = serializers.CharField(required=True)
+    ubicacion = serializers.CharField(required=False, allow_blank=True)
+    
+    def validate_pedido_ids(self, value):
+        # Sin duplicados, conservando el orden recibido
+        return list(dict.fromkeys(value))
+
 class PedidoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Pedido
@@ -221,6 +256,18 @@ class ItemPedidoSerializer(serializers.Serializer):
     archivo_cara1_nombre = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     archivo_cara2_base64 = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     archivo_cara2_nombre = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    # Archivos subidos por POST /api/orders/pedidos/archivos/ (preferido sobre Base64)
+    archivo_cara1_token = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    archivo_cara2_token = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    
+    def validate(self, data):
+        for cara in ('cara1', 'cara2'):
+            token = data.get(f'archivo_{cara}_token')
+            if token and buscar_archivo_subido(token) is None:
+                raise serializers.ValidationError({
+                    f'archivo_{cara}_token': 'Archivo subido no encontrado o expirado'
+                })
+        return data
 
 class CrearPedidoSerializer(serializers.Serializer):
     # Datos del usuario
@@ -257,163 +304,182 @@ class CrearPedidoSerializer(serializers.Serializer):
         if not items:
             raise serializers.ValidationError("El pedido debe tener al menos un producto")
         
-        # Validar stock disponible
+        # Cantidad total pedida por producto (un producto puede venir en varias líneas)
+        cantidades = {}
         for item in items:
-            try:
-                producto_id = item['producto_id']
-                cantidad = item['cantidad']
-                
-                producto = Producto.objects.get(producto_id=producto_id)
-                
-                # Validar stock solo si el producto tiene gestión de stock
-                if hasattr(producto, 'tiene_stock'):
-                    if not producto.tiene_stock(cantidad):
-                        raise serializers.ValidationError(
-                            f"Stock insuficiente para {producto.nombre_producto}"
-                        )
-                        
-            except Producto.DoesNotExist:
+            cantidades[item['producto_id']] = cantidades.get(item['producto_id'], 0) + item['cantidad']
+        
+        # Una sola consulta para todos los productos del pedido
+        productos = Producto.objects.in_bulk(list(cantidades))
+        
+        for producto_id, cantidad in cantidades.items():
+            producto = productos.get(producto_id)
+            if producto is None:
                 raise serializers.ValidationError(
                     f"Producto con ID {producto_id} no existe"
                 )
-            except KeyError as e:
+            # Validación preliminar sin bloqueo: la reserva definitiva se hace en create()
+            if not producto.tiene_stock(cantidad):
                 raise serializers.ValidationError(
-                    f"Falta el campo {str(e)} en el item"
+                    f"Stock insuficiente para {producto.nombre_producto}"
                 )
         
+        # Se reutilizan en create() para no volver a consultarlos
+        self._productos = productos
         return items
     
     def create(self, validated_data):
         items_data = validated_data.pop('items')
+        productos = getattr(self, '_productos', None) or Producto.objects.in_bulk(
+            list({item['producto_id'] for item in items_data})
+        )
         
-        # Crear el pedido
-        pedido = Pedido.objects.create(**validated_data)
+        # Resolver todas las opciones referenciadas con una consulta por modelo
+        acabados = self._en_bulk(Acabado, [a for item in items_data for a in item.get('acabado_ids') or []])
+        terminaciones = self._en_bulk(Terminacion, [item.get('terminacion_id') for item in items_data])
+        tiempos = self._en_bulk(TiempoProduccion, [item.get('tiempo_produccion_id') for item in items_data])
         
-        # Crear los detalles del pedido
-        for item_data in items_data:
-            producto = Producto.objects.get(producto_id=item_data['producto_id'])
+        # El número se asigna antes de abrir la transacción del pedido, para no
+        # retener el bloqueo de la secuencia diaria mientras se crean los detalles
+        validated_data['numero_pedido'] = SecuenciaPedido.siguiente_numero_pedido()
+        
+        with transaction.atomic():
+            # Crear el pedido
+            pedido = Pedido.objects.create(**validated_data)
             
-            # Obtener referencias
-            acabados_list = []
-            tiempo_produccion = None
-            terminacion = None
+            # Reserva condicional de stock (y ventas) de todas las líneas; si alguna no
+            # alcanza, StockInsuficiente revierte el pedido completo
+            reservar_stock((item['producto_id'], item['cantidad']) for item in items_data)
             
-            # Procesar acabados (puede ser lista)
-            if item_data.get('acabado_ids'):
-                try:
-                    from apps.core.models import Acabado
-                    acabados_list = list(Acabado.objects.filter(acabado_id__in=item_data['acabado_ids']))
-                except Exception as e:
-                    print(f"Error obteniendo acabados: {e}")
-                            
-            if item_data.get('terminacion_id'):
-                try:
-                    terminacion = Terminacion.objects.get(terminacion_id=item_data['terminacion_id'])
-                except Terminacion.DoesNotExist:
-                    pass
-
-            if item_data.get('tiempo_produccion_id'):
-                try:
-                    from apps.core.models import TiempoProduccion
-                    tiempo_produccion = TiempoProduccion.objects.get(
-                        tiempo_produccion_id=item_data['tiempo_produccion_id']
-                    )
-                except TiempoProduccion.DoesNotExist:
-                    pass
+            # 📁 La ruta de cada archivo va en el INSERT de su detalle, pero el disco se toca
+            # recién al confirmar: si el pedido se revierte, las subidas siguen disponibles
+            pedido_folder = os.path.join(settings.MEDIA_ROOT, 'pedidos', str(pedido.pedido_id))
+            telefono_limpio = ''.join(filter(str.isdigit, validated_data.get('telefono_contacto', 'cliente')))[:8]
             
-            # ✅ CALCULAR MULTIPLICADOR DE ACABADOS (producto, no suma)
-            multiplicador_acabados = 1.0
-            if acabados_list:
+            detalles = []
+            for item_data in items_data:
+                producto = productos[item_data['producto_id']]
+                acabados_list = sorted(
+                    (acabados[a] for a in set(item_data.get('acabado_ids') or []) if a in acabados),
+                    key=lambda acabado: acabado.acabado_id
+                )
+                terminacion = terminaciones.get(item_data.get('terminacion_id'))
+                tiempo_produccion = tiempos.get(item_data.get('tiempo_produccion_id'))
+                
+                # ✅ CALCULAR MULTIPLICADOR DE ACABADOS (producto, no suma)
+                multiplicador_acabados = 1.0
                 for acabado in acabados_list:
                     multiplicador_acabados *= float(acabado.costo_adicional)
+                
+                detalle = DetallePedido(
+                    pedido=pedido,
+                    producto=producto,
+                    nombre_producto=item_data.get('nombre_producto', producto.nombre_producto),
+                    cantidad=item_data['cantidad'],
+                    precio_unitario=item_data['precio_unitario'],
+                    # bulk_create no pasa por DetallePedido.save(): el subtotal se calcula aquí
+                    subtotal=item_data['precio_unitario'] * item_data['cantidad'],
+                    # Acabado (guardar multiplicador acumulado)
+                    acabado=acabados_list[0] if acabados_list else None,
+                    nombre_acabado=', '.join([a.nombre_acabado for a in acabados_list]) if acabados_list else None,
+                    costo_acabado=multiplicador_acabados,  # ✅ Multiplicador acumulado
+                    # Terminación (guardar multiplicador)
+                    terminacion=terminacion,
+                    nombre_terminacion=terminacion.nombre_terminacion if terminacion else None,
+                    costo_terminacion=float(terminacion.precio) if terminacion else 1.0,  # ✅ Multiplicador
+                    # Tiempo de producción (este SÍ es suma)
+                    tiempo_produccion=tiempo_produccion,
+                    nombre_tiempo_produccion=tiempo_produccion.nombre_tiempo if tiempo_produccion else None,
+                    dias_produccion=tiempo_produccion.dias_estimados if tiempo_produccion else None,
+                    costo_tiempo_produccion=float(tiempo_produccion.precio) if tiempo_produccion else 0,  # ✅ Costo a sumar
+                    # Personalización
+                    personalizacion_texto=f"{item_data.get('ancho_cm')}cm x {item_data.get('alto_cm')}cm" if item_data.get('ancho_cm') else None,
+                    notas_producto=item_data.get('notas_producto')
+                )
+                
+                # Formato: telefono_pedidoID_caraN.ext
+                for cara in ('cara1', 'cara2'):
+                    nombre_base = f"{telefono_limpio}_{pedido.pedido_id}_{cara}"
+                    nombre_archivo = None
+                    if item_data.get(f'archivo_{cara}_token'):
+                        # Subida previa en bloques: solo se mueve a la carpeta del pedido
+                        token = item_data[f'archivo_{cara}_token']
+                        try:
+                            nombre_archivo = nombre_archivo_subido(token, nombre_base)
+                        except ArchivoInvalido as e:
+                            raise serializers.ValidationError({f'archivo_{cara}_token': str(e)})
+                        transaction.on_commit(
+                            lambda token=token, nombre_base=nombre_base:
+                                self._mover_archivo_subido(token, pedido_folder, nombre_base)
+                        )
+                    elif item_data.get(f'archivo_{cara}_base64'):
+                        # Compatibilidad: archivo en Base64 dentro del JSON
+                        contenido = self._decodificar_base64(item_data[f'archivo_{cara}_base64'])
+                        if contenido is not None:
+                            nombre_archivo = f"{nombre_base}.png"
+                            transaction.on_commit(
+                                lambda contenido=contenido, nombre_archivo=nombre_archivo:
+                                    self._guardar_archivo(contenido, pedido_folder, nombre_archivo)
+                            )
+                    if nombre_archivo:
+                        setattr(detalle, f'archivo_{cara}', f'pedidos/{pedido.pedido_id}/{nombre_archivo}')
+                
+                detalles.append(detalle)
             
-            # Crear detalle del pedido
-            detalle = DetallePedido.objects.create(
-                pedido=pedido,
-                producto=producto,
-                nombre_producto=item_data.get('nombre_producto', producto.nombre_producto),
-                cantidad=item_data['cantidad'],
-                precio_unitario=item_data['precio_unitario'],
-                # Acabado (guardar multiplicador acumulado)
-                acabado=acabados_list[0] if acabados_list else None,
-                nombre_acabado=', '.join([a.nombre_acabado for a in acabados_list]) if acabados_list else None,
-                costo_acabado=multiplicador_acabados,  # ✅ Multiplicador acumulado
-                # Terminación (guardar multiplicador)
-                terminacion=terminacion,
-                nombre_terminacion=terminacion.nombre_terminacion if terminacion else None,
-                costo_terminacion=float(terminacion.precio) if terminacion else 1.0,  # ✅ Multiplicador
-                # Tiempo de producción (este SÍ es suma)
-                tiempo_produccion=tiempo_produccion,
-                nombre_tiempo_produccion=tiempo_produccion.nombre_tiempo if tiempo_produccion else None,
-                dias_produccion=tiempo_produccion.dias_estimados if tiempo_produccion else None,
-                costo_tiempo_produccion=float(tiempo_produccion.precio) if tiempo_produccion else 0,  # ✅ Costo a sumar
-                # Personalización
-                personalizacion_texto=f"{item_data.get('ancho_cm')}cm x {item_data.get('alto_cm')}cm" if item_data.get('ancho_cm') else None,
-                notas_producto=item_data.get('notas_producto')
-            )
-
-            # 📁 GUARDAR ARCHIVOS EN SISTEMA DE ARCHIVOS (NO EN DB)
-            pedido_folder = os.path.join(settings.MEDIA_ROOT, 'pedidos', str(pedido.pedido_id))
-            os.makedirs(pedido_folder, exist_ok=True)
-            
-            # Procesar cara 1
-            if item_data.get('archivo_cara1_base64'):
-                try:
-                    # Extraer datos del base64
-                    base64_data = item_data['archivo_cara1_base64']
-                    if ',' in base64_data:
-                        formato, imgstr = base64_data.split(',', 1)
-                    else:
-                        imgstr = base64_data
-                    
-                    # Decodificar y guardar
-                    img_data = base64.b64decode(imgstr)
-                    # Formato: telefono_pedidoID_cara1.png
-                    telefono_limpio = ''.join(filter(str.isdigit, validated_data.get('telefono_contacto', 'cliente')))[:8]
-                    nombre_archivo = f"{telefono_limpio}_{pedido.pedido_id}_cara1.png"
-                    ruta_completa = os.path.join(pedido_folder, nombre_archivo)
-                    
-                    with open(ruta_completa, 'wb') as f:
-                        f.write(img_data)
-                    
-                    # Guardar solo la ruta relativa en DB
-                    detalle.archivo_cara1 = f'pedidos/{pedido.pedido_id}/{nombre_archivo}'
-                    detalle.save(update_fields=['archivo_cara1'])
-                    print(f"✅ Archivo cara1 guardado en: {detalle.archivo_cara1}")
-                    
-                except Exception as e:
-                    print(f"❌ Error guardando cara1: {e}")
+            DetallePedido.objects.bulk_create(detalles)
             
-            # Procesar cara 2
-            if item_data.get('archivo_cara2_base64'):
-                try:
-                    base64_data = item_data['archivo_cara2_base64']
-                    if ',' in base64_data:
-                        formato, imgstr = base64_data.split(',', 1)
-                    else:
-                        imgstr = base64_data
-                    
-                    img_data = base64.b64decode(imgstr)
-                    telefono_limpio = ''.join(filter(str.isdigit, validated_data.get('telefono_contacto', 'cliente')))[:8]
-                    nombre_archivo = f"{telefono_limpio}_{pedido.pedido_id}_cara2.png"
-                    ruta_completa = os.path.join(pedido_folder, nombre_archivo)
-                    
-                    with open(ruta_completa, 'wb') as f:
-                        f.write(img_data)
-                    
-                    detalle.archivo_cara2 = f'pedidos/{pedido.pedido_id}/{nombre_archivo}'
-                    detalle.save(update_fields=['archivo_cara2'])
-                    print(f"✅ Archivo cara2 guardado en: {detalle.archivo_cara2}")
-                    
-                except Exception as e:
-                    print(f"❌ Error guardando cara2: {e}")
+            # Historial del usuario para su perfil de comportamiento (core/interacciones.py)
+            registrar_compra(pedido, [item['producto_id'] for item in items_data])
             
-            # Actualizar stock del producto
-            producto.stock -= item_data['cantidad']
-            producto.ventas_totales += item_data['cantidad']
-            producto.save()
+            # Primer seguimiento y correo de confirmación, en la misma transacción del pedido
+            SeguimientoDespacho.objects.create(
+                pedido=pedido,
+                estado=EstadoPedido.PENDIENTE,
+                descripcion='Pedido creado y en espera de confirmación de pago'
+            )
+            encolar_confirmacion_pedido(pedido)
         
         return pedido
+    
+    @staticmethod
+    def _en_bulk(modelo, ids):
+        """in_bulk que omite la consulta cuando no hay IDs que resolver."""
+        ids = {i for i in ids if i}
+        return modelo.objects.in_bulk(list(ids)) if ids else {}
+    
+    @staticmethod
+    def _decodificar_base64(base64_data):
+        """Contenido de un archivo en Base64 (con o sin prefijo data:), o None si no es válido."""
+        # Extraer datos del base64
+        if ',' in base64_data:
+            formato, imgstr = base64_data.split(',', 1)
+        else:
+            imgstr = base64_data
+        try:
+            return base64.b64decode(imgstr)
+        except (binascii.Error, ValueError) as e:
+            print(f"❌ Archivo Base64 inválido: {e}")
+            return None
+    
+    @staticmethod
+    def _mover_archivo_subido(token, carpeta, nombre_base):
+        """Al confirmar el pedido: mueve la subida a su carpeta."""
+        try:
+            mover_archivo_subido(token, carpeta, nombre_base)
+        except (ArchivoInvalido, OSError) as e:
+            logger.error(f"Error moviendo la subida {token} a {carpeta}: {e}")
+    
+    @staticmethod
+    def _guardar_archivo(contenido, carpeta, nombre_archivo):
+        """Al confirmar el pedido: escribe en disco (NO en DB) un archivo recibido en Base64."""
+        try:
+            os.makedirs(carpeta, exist_ok=True)
+            ruta_completa = os.path.join(carpeta, nombre_archivo)
+            with open(ruta_completa, 'wb') as f:
+                f.write(contenido)
+            print(f"✅ Archivo guardado en: {ruta_completa}")
+        except OSError as e:
+            logger.error(f"Error guardando {nombre_archivo}: {e}")
 
 class PedidoSerializer(serializers.ModelSerializer):
     detalles = DetallePedidoSerializer(many=True, read_only=True)
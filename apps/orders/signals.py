@@ -0,0 +1,18 @@
+# orders/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Pedido
+from .estadisticas import registrar_guardado, registrar_eliminado
+
+
+@receiver(post_save, sender=Pedido)
+def actualizar_estadisticas_por_guardado(sender, instance, created, raw=False, **kwargs):
+    """Aplica al rollup diario el alta o el cambio de estado/total del pedido."""
+    if raw:
+        return
+    registrar_guardado(instance, created)
+
+
+@receiver(post_delete, sender=Pedido)
+def actualizar_estadisticas_por_eliminacion(sender, instance, **kwargs):
+    registrar_eliminado(instance)
@@ -1,3 +1,465 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from django.db import connection, OperationalError
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.models import (
+    Categoria, Subcategoria, Producto, UserProfile, Terminacion, TiempoProduccion, Acabado, CorreoSalida
+)
+from .models import Pedido, SecuenciaPedido, EstadoPedido
+from rest_framework.test import APIClient
+from apps.authentication.tokens import TokenRefrescoConClaims
+from .archivos import TAMANO_BLOQUE, buscar_archivo_subido
+from .inventario import StockInsuficiente
+from .serializers import CrearPedidoSerializer
+
+
+def crear_productos(cantidad, stock=10):
+    categoria = Categoria.objects.create(nombre_categoria='Imprenta')
+    subcategoria = Subcategoria.objects.create(nombre_subcategoria='Tarjetas', categoria=categoria)
+    return [
+        Producto.objects.create(nombre_producto=f'Producto {i}', subcategoria=subcategoria, stock=stock)
+        for i in range(cantidad)
+    ]
+
+
+def datos_pedido(items, **extra):
+    datos = {
+        'user_profile_id': UserProfile.objects.create().user_profile_id,
+        'items': items,
+        'direccion_entrega': 'Av. Siempre Viva 742',
+        'comuna': 'Santiago',
+        'ciudad': 'Santiago',
+        'region': 'Metropolitana',
+        'telefono_contacto': '+56912345678',
+        'email_contacto': 'cliente@example.com',
+        'subtotal': '0',
+        'costo_envio': '0',
+        'total': '0',
+        'metodo_pago': 'transferencia',
+    }
+    datos.update(extra)
+    return datos
+
+
+def item(producto, cantidad=1, **extra):
+    datos = {
+        'producto_id': producto.producto_id,
+        'nombre_producto': producto.nombre_producto,
+        'cantidad': cantidad,
+        'precio_unitario': '1000',
+    }
+    datos.update(extra)
+    return datos
+
+
+class CrearPedidoTests(TestCase):
+    def crear_pedido(self, datos):
+        serializer = CrearPedidoSerializer(data=datos)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+
+    def test_detalles_stock_y_ventas(self):
+        producto, otro = crear_productos(2)
+        terminacion = Terminacion.objects.create(producto=producto, nombre_terminacion='Couché', precio=3)
+        tiempo = TiempoProduccion.objects.create(producto=producto, nombre_tiempo='Express', dias_estimados=1, precio=500)
+        acabados = [Acabado.objects.create(nombre_acabado=n, costo_adicional=c) for n, c in (('Barniz', 2), ('Corte', 3))]
+
+        pedido = self.crear_pedido(datos_pedido([
+            item(producto, 2, terminacion_id=terminacion.pk, tiempo_produccion_id=tiempo.pk,
+                 acabado_ids=[a.pk for a in acabados], ancho_cm=9, alto_cm=5),
+            item(producto, 3),
+            item(otro, 4),
+        ]))
+
+        detalle = pedido.detalles.get(cantidad=2)
+        self.assertEqual(detalle.subtotal, 2000)
+        self.assertEqual(detalle.nombre_acabado, 'Barniz, Corte')
+        self.assertEqual(detalle.costo_acabado, 6)
+        self.assertEqual(detalle.nombre_terminacion, 'Couché')
+        self.assertEqual(detalle.dias_produccion, 1)
+        self.assertEqual(detalle.personalizacion_texto, '9cm x 5cm')
+        self.assertEqual(pedido.detalles.count(), 3)
+        self.assertEqual(pedido.seguimientos.get().estado, EstadoPedido.PENDIENTE)
+        correo = CorreoSalida.objects.get()
+        self.assertEqual((correo.destinatarios, correo.asunto), (['cliente@example.com'], f'Confirmación de Pedido #{pedido.numero_pedido}'))
+
+        producto.refresh_from_db()
+        otro.refresh_from_db()
+        self.assertEqual((producto.stock, producto.ventas_totales), (5, 5))
+        self.assertEqual((otro.stock, otro.ventas_totales), (6, 4))
+
+    def test_stock_insuficiente_sumando_lineas(self):
+        producto, = crear_productos(1, stock=4)
+        serializer = CrearPedidoSerializer(data=datos_pedido([item(producto, 3), item(producto, 2)]))
+
+        self.assertFalse(serializer.is_valid())
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_faltante_en_create_revierte_el_pedido(self):
+        producto, otro = crear_productos(2, stock=5)
+        serializer = CrearPedidoSerializer(data=datos_pedido([item(producto, 2), item(otro, 3)]))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # Otro pedido consume el stock entre la validación y la creación
+        Producto.objects.filter(pk=otro.pk).update(stock=1)
+
+        with self.assertRaises(StockInsuficiente) as contexto:
+            serializer.save()
+
+        reserva = contexto.exception.resultados
+        self.assertEqual([r['reservado'] for r in reserva], [True, False])
+        self.assertEqual(reserva[1]['disponible'], 1)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(CorreoSalida.objects.exists())
+        producto.refresh_from_db()
+        self.assertEqual((producto.stock, producto.ventas_totales), (5, 0))
+
+    def test_consultas_constantes_segun_cantidad_de_lineas(self):
+        productos = crear_productos(30)
+        SecuenciaPedido.objects.create(fecha=timezone.localdate())
+        chico = datos_pedido([item(productos[0])])
+        grande = datos_pedido([item(p) for p in productos])
+
+        # Incluye el primer seguimiento, el correo de confirmación encolado y
+        # las interacciones 'purchase' del historial
+        with self.assertNumQueries(15):
+            self.crear_pedido(chico)
+        with self.assertNumQueries(15):
+            self.crear_pedido(grande)
+
+
+class SecuenciaPedidoTests(TestCase):
+    def test_continua_la_numeracion_existente_del_dia(self):
+        hoy = timezone.localdate()
+        perfil = UserProfile.objects.create()
+        for i in (1, 2):
+            Pedido.objects.create(
+                numero_pedido=f'PED-{hoy:%Y%m%d}-{i:04d}', user_profile=perfil,
+                direccion_entrega='-', comuna='-', ciudad='-', region='-',
+                telefono_contacto='-', email_contacto='a@b.cl'
+            )
+
+        self.assertEqual(SecuenciaPedido.siguiente_numero_pedido(), f'PED-{hoy:%Y%m%d}-0003')
+        with self.assertNumQueries(3):
+            self.assertEqual(SecuenciaPedido.siguiente_numero_pedido(), f'PED-{hoy:%Y%m%d}-0004')
+
+
+def reintentar_si_bloqueada(funcion):
+    """
+    La BD de pruebas de SQLite (en memoria, caché compartida) rechaza al instante a un
+    segundo escritor con 'table is locked' en vez de esperarlo; solo ese error se reintenta.
+    Una colisión de numero_pedido o un sobreconsumo de stock seguirían fallando.
+    """
+    while True:
+        try:
+            return funcion()
+        except OperationalError as e:
+            if connection.vendor != 'sqlite' or 'locked' not in str(e):
+                raise
+            time.sleep(0.001)
+
+
+class SecuenciaPedidoConcurrenciaTests(TransactionTestCase):
+    hilos = 8
+    pedidos_por_hilo = 15
+
+    def test_pedidos_concurrentes_sin_colisiones(self):
+        perfil = UserProfile.objects.create()
+        errores = []
+        barrera = threading.Barrier(self.hilos)
+
+        def crear_pedidos():
+            try:
+                barrera.wait()
+                for _ in range(self.pedidos_por_hilo):
+                    pedido = Pedido(
+                        user_profile_id=perfil.pk, direccion_entrega='-', comuna='-', ciudad='-',
+                        region='-', telefono_contacto='-', email_contacto='a@b.cl'
+                    )
+                    reintentar_si_bloqueada(pedido.save)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=crear_pedidos) for _ in range(self.hilos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        total = self.hilos * self.pedidos_por_hilo
+        numeros = list(Pedido.objects.values_list('numero_pedido', flat=True))
+        self.assertEqual(len(set(numeros)), total)
+        self.assertEqual(
+            sorted(int(n.rsplit('-', 1)[1]) for n in numeros), list(range(1, total + 1))
+        )
+
+
+class ReservaStockConcurrenciaTests(TransactionTestCase):
+    def test_checkouts_paralelos_del_mismo_producto_no_sobrevenden(self):
+        producto, = crear_productos(1, stock=20)
+        SecuenciaPedido.objects.create(fecha=timezone.localdate())
+        hilos = 12
+        exitos, rechazos, errores = [], [], []
+        barrera = threading.Barrier(hilos)
+
+        def comprar():
+            def intento():
+                serializer = CrearPedidoSerializer(data=datos_pedido([item(producto, 3)]))
+                if not serializer.is_valid():
+                    return False
+                try:
+                    serializer.save()
+                except StockInsuficiente:
+                    return False
+                return True
+            try:
+                barrera.wait()
+                (exitos if reintentar_si_bloqueada(intento) else rechazos).append(1)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=comprar) for _ in range(hilos)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errores, [])
+        producto.refresh_from_db()
+        # 20 unidades alcanzan para 6 pedidos de 3
+        self.assertEqual(len(exitos), 6)
+        self.assertEqual(len(rechazos), hilos - 6)
+        self.assertEqual((producto.stock, producto.ventas_totales), (2, 18))
+        self.assertEqual(Pedido.objects.count(), 6)
+
+
+class SubidaArchivosTests(TestCase):
+    url = '/api/orders/pedidos/archivos/'
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media, ARCHIVO_PEDIDO_MAX_MB=1)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('cliente'))
+
+    def test_multipart_se_escribe_en_bloques(self):
+        contenido = os.urandom(3 * TAMANO_BLOQUE + 17)
+        respuesta = self.client.post(
+            self.url, {'archivo': SimpleUploadedFile('diseño.PDF', contenido)}, format='multipart'
+        )
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data['tamano'], len(contenido))
+        with open(buscar_archivo_subido(respuesta.data['token']), 'rb') as f:
+            self.assertEqual(f.read(), contenido)
+
+    def test_cuerpo_crudo(self):
+        respuesta = self.client.post(
+            self.url + '?nombre=logo.png', b'\x89PNG' * 1000, content_type='application/octet-stream'
+        )
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(os.path.getsize(buscar_archivo_subido(respuesta.data['token'])), 4000)
+
+    def test_rechaza_extension_y_tamano(self):
+        extension = self.client.post(self.url + '?nombre=virus.exe', b'MZ', content_type='application/octet-stream')
+        grande = self.client.post(
+            self.url, {'archivo': SimpleUploadedFile('grande.png', b'0' * (1024 * 1024 + 1))}, format='multipart'
+        )
+
+        self.assertEqual(extension.status_code, 400)
+        self.assertEqual(grande.status_code, 400)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'pedidos', 'temporales')), [])
+
+    def test_pedido_referencia_el_token(self):
+        token = self.client.post(
+            self.url + '?nombre=arte.pdf', b'%PDF-1.7', content_type='application/pdf'
+        ).data['token']
+        producto, = crear_productos(1)
+
+        serializer = CrearPedidoSerializer(data=datos_pedido([item(producto, archivo_cara1_token=token)]))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = serializer.save()
+
+        detalle = pedido.detalles.get()
+        self.assertEqual(detalle.archivo_cara1, f'pedidos/{pedido.pedido_id}/56912345_{pedido.pedido_id}_cara1.pdf')
+        with open(os.path.join(self.media, detalle.archivo_cara1), 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.7')
+        self.assertIsNone(buscar_archivo_subido(token))
+
+        # El token ya fue usado
+        repetido = CrearPedidoSerializer(data=datos_pedido([item(producto, archivo_cara1_token=token)]))
+        self.assertFalse(repetido.is_valid())
+
+    def test_pedido_revertido_no_consume_el_token(self):
+        token = self.client.post(
+            self.url + '?nombre=arte.pdf', b'%PDF-1.7', content_type='application/pdf'
+        ).data['token']
+        producto, = crear_productos(1, stock=5)
+        serializer = CrearPedidoSerializer(data=datos_pedido([
+            item(producto, 2, archivo_cara1_token=token, archivo_cara2_base64='data:image/png;base64,iVBORw0K')
+        ]))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # Otro pedido consume el stock entre la validación y la creación (la vista responde 409)
+        Producto.objects.filter(pk=producto.pk).update(stock=1)
+
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(StockInsuficiente):
+            serializer.save()
+
+        self.assertFalse(Pedido.objects.exists())
+        # Ni la subida ni el Base64 llegaron a una carpeta de pedido
+        self.assertEqual(os.listdir(os.path.join(self.media, 'pedidos')), ['temporales'])
+        # El reintento usa la misma subida
+        Producto.objects.filter(pk=producto.pk).update(stock=5)
+        reintento = CrearPedidoSerializer(data=datos_pedido([item(producto, 2, archivo_cara1_token=token)]))
+        self.assertTrue(reintento.is_valid(), reintento.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = reintento.save()
+        self.assertTrue(os.path.isfile(os.path.join(self.media, pedido.detalles.get().archivo_cara1)))
+        self.assertIsNone(buscar_archivo_subido(token))
+
+
+class MisPedidosTests(TestCase):
+    def test_usa_el_perfil_del_token_sin_leer_usuario_ni_perfil(self):
+        usuario = User.objects.create_user('cliente')
+        perfil = UserProfile.objects.create(user=usuario)
+        producto, = crear_productos(1)
+        datos = datos_pedido([item(producto)])
+        datos['user_profile_id'] = perfil.pk
+        serializer = CrearPedidoSerializer(data=datos)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        pedido = serializer.save()
+        # Pedido de otro perfil, que no debe aparecer
+        otro = CrearPedidoSerializer(data=datos_pedido([item(producto)]))
+        self.assertTrue(otro.is_valid(), otro.errors)
+        otro.save()
+
+        cliente = APIClient()
+        acceso = TokenRefrescoConClaims.for_user(usuario).access_token
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {acceso}')
+
+        # Pedidos y sus dos prefetch; antes se sumaban auth_user y users_profile
+        with self.assertNumQueries(3):
+            respuesta = cliente.get(reverse('pedido-mis-pedidos'))
+        self.assertEqual([p['pedido_id'] for p in respuesta.json()], [pedido.pk])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class ActualizacionEstadoMasivaTests(TestCase):
+    def setUp(self):
+        producto, = crear_productos(1, stock=100)
+        self.pedidos = []
+        for i in range(4):
+            serializer = CrearPedidoSerializer(data=datos_pedido([item(producto)], email_contacto=f'c{i}@example.com'))
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            self.pedidos.append(serializer.save())
+        CorreoSalida.objects.all().delete()
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(User.objects.create_user('admin', is_staff=True))
+
+    def actualizar(self, pedido_ids, estado=EstadoPedido.EN_CAMINO):
+        return self.cliente.post(reverse('pedido-actualizar-estado-masivo'), {
+            'pedido_ids': pedido_ids, 'estado': estado, 'descripcion': 'Salió a reparto'
+        }, format='json')
+
+    def test_resultado_por_pedido_y_correos_en_un_lote(self):
+        listos = self.pedidos[:3]
+        Pedido.objects.filter(pk__in=[p.pk for p in listos]).update(estado=EstadoPedido.PREPARANDO)
+        pendiente = self.pedidos[3]
+
+        # Savepoint, lectura con bloqueo, UPDATE, seguimientos, correos y release: no crece con los pedidos
+        with self.assertNumQueries(6):
+            respuesta = self.actualizar([p.pk for p in listos] + [pendiente.pk, 999999, listos[0].pk])
+
+        datos = respuesta.json()
+        self.assertEqual((datos['actualizados'], datos['fallidos']), (3, 2))
+        self.assertEqual([r['ok'] for r in datos['resultados']], [True, True, True, False, False])
+        self.assertEqual(datos['resultados'][4]['mensaje'], 'Pedido no encontrado')
+        self.assertEqual(
+            set(Pedido.objects.filter(estado=EstadoPedido.EN_CAMINO).values_list('pk', flat=True)),
+            {p.pk for p in listos}
+        )
+        pendiente.refresh_from_db()
+        self.assertEqual((pendiente.estado, pendiente.seguimientos.count()), (EstadoPedido.PENDIENTE, 1))
+        self.assertEqual(listos[0].seguimientos.filter(estado=EstadoPedido.EN_CAMINO).count(), 1)
+
+        call_command('enviar_correos', stdout=io.StringIO())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['c0@example.com', 'c1@example.com', 'c2@example.com'])
+        self.assertIn('Salió a reparto', mail.outbox[0].body)
+
+    def test_requiere_administrador(self):
+        self.cliente.force_authenticate(User.objects.create_user('cliente'))
+        self.assertEqual(self.actualizar([self.pedidos[0].pk]).status_code, 403)
+
+
+class EstadisticasPedidosTests(TestCase):
+    def setUp(self):
+        self.producto, = crear_productos(1, stock=100)
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(User.objects.create_user('admin', is_staff=True))
+
+    def crear_pedido(self, total):
+        serializer = CrearPedidoSerializer(data=datos_pedido([item(self.producto)], total=total))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            return serializer.save()
+
+    def estadisticas(self, **parametros):
+        return self.cliente.get(reverse('pedido-estadisticas'), parametros).json()
+
+    def test_rollup_incremental_coincide_con_los_pedidos(self):
+        pedidos = [self.crear_pedido(total) for total in ('1000', '2500', '4000', '700')]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente.post(reverse('pedido-actualizar-estado', args=[pedidos[0].pk]), {
+                'estado': EstadoPedido.CANCELADO, 'descripcion': 'Sin pago'
+            }, format='json')
+            self.cliente.post(reverse('pedido-actualizar-estado-masivo'), {
+                'pedido_ids': [pedidos[1].pk, pedidos[2].pk], 'estado': EstadoPedido.CONFIRMADO, 'descripcion': 'Pagado'
+            }, format='json')
+            pedidos[3].delete()
+
+        with self.assertNumQueries(1):
+            stats = self.estadisticas()
+        self.assertEqual(stats, self.estadisticas(fuente='pedidos'))
+        self.assertEqual(stats['total_pedidos'], 3)
+        self.assertEqual(stats['por_estado'], {'CONFIRMADO': 2, 'CANCELADO': 1})
+        self.assertEqual((stats['pendientes'], stats['cancelados']), (0, 1))
+        self.assertEqual(float(stats['ventas_totales']), 6500)
+
+        hoy = timezone.localdate().isoformat()
+        serie = self.estadisticas(por_dia=1, desde=hoy, hasta=hoy)['por_dia']
+        self.assertEqual([(d['fecha'], d['pedidos'], float(d['ventas'])) for d in serie], [(hoy, 3, 6500)])
+        self.assertEqual(self.estadisticas(desde='2000-01-01', hasta='2000-01-31')['total_pedidos'], 0)
+        self.assertEqual(self.cliente.get(reverse('pedido-estadisticas'), {'desde': 'ayer'}).status_code, 400)
+
+    def test_recalcular_corrige_el_rollup(self):
+        self.crear_pedido('1000')
+        # Escritura que no pasa por las señales
+        Pedido.objects.update(estado=EstadoPedido.ENTREGADO)
+        self.assertEqual(self.estadisticas()['pendientes'], 1)
+
+        call_command('recalcular_estadisticas_pedidos', stdout=io.StringIO())
+
+        stats = self.estadisticas()
+        self.assertEqual((stats['pendientes'], stats['entregados']), (0, 1))
+        self.assertEqual(stats, self.estadisticas(fuente='pedidos'))
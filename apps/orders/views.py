@@ -2,21 +2,32 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.parsers import MultiPartParser
 from django.shortcuts import get_object_or_404
-from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
 from django.conf import settings
 from apps.core.models import UserProfile, Persona, Direccion, Cliente
+from apps.core.paginacion import PaginacionCursor
+from apps.core.parametros import fecha_parametro
 from apps.orders.models import Pedido, DetallePedido, SeguimientoDespacho, EstadoPedido
+from .estadisticas import registrar_guardados, resumen_desde_pedidos, resumen_desde_rollup, serie_diaria
+from .inventario import StockInsuficiente
+from .notificaciones import encolar_actualizacion_estado, encolar_actualizaciones_estado
+from .archivos import ArchivoPedidoUploadHandler, ArchivoInvalido, guardar_cuerpo_crudo
+from apps.authentication.tokens import JWTAutenticacionSinConsulta
 from .serializers import (
     CrearPedidoSerializer, PedidoSerializer, PedidoConSeguimientoSerializer,
-    ActualizarEstadoPedidoSerializer, SeguimientoDespachoSerializer,
-    UserProfileSerializer, PersonaSerializer, DireccionSerializer
+    ActualizarEstadoPedidoSerializer, ActualizarEstadoMasivoSerializer, SeguimientoDespachoSerializer,
+    UserProfileSerializer, PersonaSerializer, DireccionSerializer, error_transicion
 )
 
 class PedidoViewSet(viewsets.ModelViewSet):
     queryset = Pedido.objects.all()
     serializer_class = PedidoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionCursor
+    ordenamiento_cursor = ('-fecha_creacion', '-pk')
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -50,17 +61,14 @@ class PedidoViewSet(viewsets.ModelViewSet):
         """Crear un nuevo pedido"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        pedido = serializer.save()
-        
-        # Crear primer seguimiento
-        SeguimientoDespacho.objects.create(
-            pedido=pedido,
-            estado=EstadoPedido.PENDIENTE,
-            descripcion='Pedido creado y en espera de confirmación de pago'
-        )
-        
-        # Enviar email de confirmación al cliente
-        self._enviar_email_confirmacion(pedido)
+        try:
+            pedido = serializer.save()
+        except StockInsuficiente as error:
+            return Response({
+                'error': True,
+                'mensaje': ' | '.join(error.mensajes()) or 'Stock insuficiente, intente nuevamente',
+                'reserva': error.resultados
+            }, status=status.HTTP_409_CONFLICT)
         
         response_data = {
             'pedido_id': pedido.pedido_id,
@@ -72,6 +80,43 @@ class PedidoViewSet(viewsets.ModelViewSet):
         
         return Response(response_data, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['post'], url_path='archivos', parser_classes=[MultiPartParser])
+    def subir_archivo(self, request):
+        """
+        Sube un archivo de diseño en bloques de 64 KB directo a disco y retorna un token
+        que el pedido referencia en 'archivo_cara1_token' / 'archivo_cara2_token'.
+        
+        POST /api/orders/pedidos/archivos/
+        - multipart/form-data con el campo 'archivo', o
+        - el archivo como cuerpo crudo (application/octet-stream, image/*, application/pdf)
+          con el nombre en ?nombre=diseno.pdf
+        
+        Response: {"token": "9f1c...", "nombre": "diseno.pdf", "tamano": 123456}
+        """
+        try:
+            if request.content_type.startswith('multipart/form-data'):
+                # Debe asignarse antes de que DRF lea el cuerpo
+                handler = ArchivoPedidoUploadHandler(request._request)
+                request._request.upload_handlers = [handler]
+                archivo = request.FILES.get(ArchivoPedidoUploadHandler.campo)
+                if handler.error:
+                    raise ArchivoInvalido(handler.error)
+                if archivo is None:
+                    raise ArchivoInvalido("Falta el campo 'archivo'")
+                token, nombre, tamano = archivo.token, archivo.name, archivo.size
+            else:
+                nombre = request.query_params.get('nombre', '')
+                destino = guardar_cuerpo_crudo(request._request, nombre)
+                token, tamano = destino.token, destino.tamano
+        except ArchivoInvalido as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'token': token,
+            'nombre': nombre,
+            'tamano': tamano
+        }, status=status.HTTP_201_CREATED)
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
     def actualizar_estado(self, request, pk=None):
         """Actualizar el estado de un pedido (solo admin)"""
@@ -92,21 +137,21 @@ class PedidoViewSet(viewsets.ModelViewSet):
         
         # Si se entregó, guardar fecha real de entrega
         if nuevo_estado == EstadoPedido.ENTREGADO:
-            from django.utils import timezone
             pedido.fecha_entrega_real = timezone.now()
         
-        pedido.save()
-        
-        # Crear registro de seguimiento
-        seguimiento = SeguimientoDespacho.objects.create(
-            pedido=pedido,
-            estado=nuevo_estado,
-            descripcion=descripcion,
-            ubicacion=ubicacion
-        )
-        
-        # Enviar notificación por email
-        self._enviar_email_actualizacion_estado(pedido, seguimiento)
+        with transaction.atomic():
+            pedido.save()
+            
+            # Crear registro de seguimiento
+            seguimiento = SeguimientoDespacho.objects.create(
+                pedido=pedido,
+                estado=nuevo_estado,
+                descripcion=descripcion,
+                ubicacion=ubicacion
+            )
+            
+            # Notificación por email (la envía el comando enviar_correos)
+            encolar_actualizacion_estado(pedido, seguimiento)
         
         return Response({
             'mensaje': f'Estado actualizado a {nuevo_estado}',
@@ -116,6 +161,64 @@ class PedidoViewSet(viewsets.ModelViewSet):
             'seguimiento': SeguimientoDespachoSerializer(seguimiento).data
         })
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def actualizar_estado_masivo(self, request):
+        """
+        Aplica el mismo cambio de estado a varios pedidos en una transacción (solo admin).
+        Los pedidos con una transición no permitida se informan y no se modifican.
+        """
+        serializer = ActualizarEstadoMasivoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        pedido_ids = serializer.validated_data['pedido_ids']
+        nuevo_estado = serializer.validated_data['estado']
+        descripcion = serializer.validated_data['descripcion']
+        ubicacion = serializer.validated_data.get('ubicacion', '')
+        ahora = timezone.now()
+        
+        resultados = []
+        actualizados = []
+        with transaction.atomic():
+            pedidos = Pedido.objects.select_for_update().in_bulk(pedido_ids)
+            for pedido_id in pedido_ids:
+                pedido = pedidos.get(pedido_id)
+                if pedido is None:
+                    resultados.append({'pedido_id': pedido_id, 'ok': False, 'mensaje': 'Pedido no encontrado'})
+                    continue
+                error = error_transicion(pedido.estado, nuevo_estado)
+                if error:
+                    resultados.append({
+                        'pedido_id': pedido_id, 'numero_pedido': pedido.numero_pedido, 'ok': False, 'mensaje': error
+                    })
+                    continue
+                pedido.estado = nuevo_estado
+                actualizados.append(pedido)
+                resultados.append({'pedido_id': pedido_id, 'numero_pedido': pedido.numero_pedido, 'ok': True})
+            
+            if actualizados:
+                campos = {'estado': nuevo_estado, 'fecha_modificacion': ahora}
+                # Si se entregó, guardar fecha real de entrega
+                if nuevo_estado == EstadoPedido.ENTREGADO:
+                    campos['fecha_entrega_real'] = ahora
+                Pedido.objects.filter(pedido_id__in=[p.pedido_id for p in actualizados]).update(**campos)
+                # update() no emite señales: las estadísticas diarias se ajustan aquí
+                registrar_guardados(actualizados)
+                
+                seguimientos = SeguimientoDespacho.objects.bulk_create([
+                    SeguimientoDespacho(pedido=pedido, estado=nuevo_estado, descripcion=descripcion, ubicacion=ubicacion)
+                    for pedido in actualizados
+                ])
+                # Un solo INSERT en la bandeja de salida; enviar_correos los envía por una conexión
+                encolar_actualizaciones_estado(zip(actualizados, seguimientos))
+        
+        return Response({
+            'error': False,
+            'estado': nuevo_estado,
+            'actualizados': len(actualizados),
+            'fallidos': len(resultados) - len(actualizados),
+            'resultados': resultados
+        })
+    
     @action(detail=True, methods=['get'])
     def seguimiento(self, request, pk=None):
         """Obtener el seguimiento completo de un pedido"""
@@ -130,13 +233,13 @@ class PedidoViewSet(viewsets.ModelViewSet):
             'seguimientos': serializer.data
         })
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], authentication_classes=[JWTAutenticacionSinConsulta])
     def mis_pedidos(self, request):
-        """Obtener pedidos del usuario actual"""
+        """Obtener pedidos del usuario actual (el perfil viene en el token, sin leer auth_user)"""
         try:
-            user_profile = UserProfile.objects.get(user=request.user)
+            user_profile_id = request.user.user_profile_id or request.user.perfil.pk
             pedidos = Pedido.objects.filter(
-                user_profile=user_profile
+                user_profile_id=user_profile_id
             ).select_related(
                 'cliente', 'user_profile', 'user_profile__persona'
             ).prefetch_related('detalles', 'seguimientos')
@@ -151,89 +254,27 @@ class PedidoViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
     def estadisticas(self, request):
-        """Obtener estadísticas de pedidos (solo admin)"""
-        from django.db.models import Count, Sum
+        """
+        Obtener estadísticas de pedidos (solo admin). Se leen de las estadísticas
+        diarias en una sola consulta; acepta ?desde= y ?hasta= (AAAA-MM-DD),
+        ?por_dia=1 para agregar la serie diaria y ?fuente=pedidos para calcularlas
+        sobre la tabla de pedidos.
+        """
+        try:
+            desde = fecha_parametro(request, 'desde')
+            hasta = fecha_parametro(request, 'hasta')
+        except ValueError as error:
+            return Response({'error': True, 'mensaje': str(error)}, status=status.HTTP_400_BAD_REQUEST)
         
-        stats = {
-            'total_pedidos': Pedido.objects.count(),
-            'por_estado': dict(
-                Pedido.objects.values('estado').annotate(
-                    total=Count('pedido_id')
-                ).values_list('estado', 'total')
-            ),
-            'pendientes': Pedido.objects.filter(estado=EstadoPedido.PENDIENTE).count(),
-            'en_preparacion': Pedido.objects.filter(estado=EstadoPedido.PREPARANDO).count(),
-            'en_camino': Pedido.objects.filter(estado=EstadoPedido.EN_CAMINO).count(),
-            'entregados': Pedido.objects.filter(estado=EstadoPedido.ENTREGADO).count(),
-            'cancelados': Pedido.objects.filter(estado=EstadoPedido.CANCELADO).count(),
-            'ventas_totales': Pedido.objects.exclude(
-                estado=EstadoPedido.CANCELADO
-            ).aggregate(total=Sum('total'))['total'] or 0
-        }
+        if request.query_params.get('fuente') == 'pedidos':
+            stats = resumen_desde_pedidos(desde, hasta)
+        else:
+            stats = resumen_desde_rollup(desde, hasta)
+        if request.query_params.get('por_dia') in ('1', 'true'):
+            stats['por_dia'] = serie_diaria(desde, hasta)
         
         return Response(stats)
     
-    def _enviar_email_confirmacion(self, pedido):
-        """Enviar email de confirmación de pedido"""
-        try:
-            asunto = f'Confirmación de Pedido #{pedido.numero_pedido}'
-            mensaje = f"""
-            Hola,
-            
-            Tu pedido ha sido creado exitosamente.
-            
-            Número de pedido: {pedido.numero_pedido}
-            Total: ${pedido.total}
-            Estado: {pedido.get_estado_display()}
-            
-            Puedes hacer seguimiento de tu pedido en nuestra plataforma.
-            
-            Gracias por tu compra.
-            Gráfica G&G
-            """
-            
-            send_mail(
-                asunto,
-                mensaje,
-                settings.DEFAULT_FROM_EMAIL,
-                [pedido.email_contacto],
-                fail_silently=True
-            )
-        except Exception as e:
-            print(f"Error enviando email de confirmación: {e}")
-    
-    def _enviar_email_actualizacion_estado(self, pedido, seguimiento):
-        """Enviar email cuando cambia el estado del pedido"""
-        try:
-            asunto = f'Actualización de Pedido #{pedido.numero_pedido}'
-            mensaje = f"""
-            Hola,
-            
-            Tu pedido ha sido actualizado.
-            
-            Número de pedido: {pedido.numero_pedido}
-            Nuevo estado: {pedido.get_estado_display()}
-            
-            {seguimiento.descripcion}
-            
-            {f"Ubicación: {seguimiento.ubicacion}" if seguimiento.ubicacion else ""}
-            
-            Puedes hacer seguimiento de tu pedido en nuestra plataforma.
-            
-            Gracias por tu compra.
-            Gráfica G&G
-            """
-            
-            send_mail(
-                asunto,
-                mensaje,
-                settings.DEFAULT_FROM_EMAIL,
-                [pedido.email_contacto],
-                fail_silently=True
-            )
-        except Exception as e:
-            print(f"Error enviando email de actualización: {e}")
-            
     @action(detail=True, methods=['DELETE'])
     def eliminar_pedido(self, request, pk=None):
         """Eliminar un pedido (solo admin)"""